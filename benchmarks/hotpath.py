@@ -0,0 +1,383 @@
+"""
+Host side benchmark of the key handling hot path, run against the
+simulator's devices:
+
+  checkButton            the original per key event check, 16 calls a scan
+  KeyStateMachine        its replacement, one `update` a scan
+  KeyScanner (INT)       reading the expander only after INT goes low
+  KeyScanner (polling)   reading the expander every scan
+  KeyScanner (debounced) INT, with the keys going through a Debouncer
+  Keyboard press/release pressing and letting go of a keycode per key
+  NkroKeyboard ...       the same on the N key rollover keyboard
+  handleEvent <config>   each keyconfig's dispatch of the events a trace makes
+  write / write fast     FastKeyboardLayout.write, one event a character
+
+Each trace in benchmarks/traces is scanned once a millisecond, as the main
+loop does, and the cost is given per event (a key going down or up in
+the trace) and per call. The cost of looping over the calls is measured
+separately and taken off.
+
+A short benchmark is at the mercy of the scheduler and CPU clock, so each
+one is run over and over until at least MIN_RUN_MILLIS have gone by, and
+that is repeated REPEATS times, in passes over all of the benchmarks so
+each one's repeats are spread over the whole run. The host's speed also
+drifts from one second to the next, so every repeat is timed against a
+fixed loop of REFERENCE_CALLS Python calls run just before and after it:
+`ref/event` is what an event costs in those calls. The median of the
+repeats is the result, and `noise %` is their median absolute deviation
+from it, as a percentage. --compare goes by `ref/event`, which holds
+still between runs far better than nanoseconds do.
+
+Allocations are measured in a second pass under tracemalloc: `alloc %` is
+the share of calls that allocated anything, and `B/event` the most
+memory the calls held at once, summed and divided by the events. CPython
+boxes every int over 256, so these are higher than on the Pico, but a
+change in them still means a change in what the code allocates. The
+KeyScanner numbers include the simulated expander.
+
+Run from the repository root:
+    python benchmarks/hotpath.py                       # print the table
+    python benchmarks/hotpath.py --save results.json   # and keep it
+    python benchmarks/hotpath.py --compare results.json
+
+--compare marks anything newly allocating, or slower by more than
+--threshold percent or NOISE_FACTOR times the noise of either run
+(whichever is more), as a REGRESSION and exits with status 1.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from sim import install
+from sim.trace import KeyTrace
+
+hardware = install(tickNs = 0)
+
+import busio
+import board
+from digitalio import DigitalInOut, Direction, Pull
+from adafruit_bus_device.i2c_device import I2CDevice
+from adafruit_hid.keyboard import Keyboard
+from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
+from fastlayout import FastKeyboardLayout
+from adafruit_hid.keycode import Keycode
+from adafruit_hid.consumer_control import ConsumerControl
+from constants import *
+from keystatemachine import *
+from keyscanner import *
+from debouncer import *
+from macroscheduler import *
+from keyconfigregistry import *
+from nkrokeyboard import *
+
+TRACES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
+KEYCONFIGS = [ ("keyconfig.adb", "AdbKeypad"), ("keyconfig.teams", "TeamsKeypad"), ("keyconfig.dota", "DotAKeypad") ]
+TEXT = "pkill scrcpy; sleep 0.1 && sh unlockWithSwipe -p 314159 && scrcpy -Sw &"
+KEYCODES = [ Keycode.A + key for key in range(BUTTON_COUNT) ]
+REPEATS = 7
+MIN_RUN_MILLIS = 20
+NOISE_FACTOR = 4
+REFERENCE_CALLS = 50000
+
+# a HID device that throws reports away, so only the library is timed
+class NullDevice():
+    def __init__(self, usagePage, usage):
+        self.usage_page = usagePage
+        self.usage = usage
+
+    def send_report(self, report):
+        pass
+
+def hidDevices():
+    return [ NullDevice(0x01, 0x06), NullDevice(0x0C, 0x01) ]
+
+# the clock is set from a precomputed value so setting it allocates nothing
+def setClock(nowNs):
+    hardware.clock.nowNs = nowNs
+
+def noop(*arguments):
+    pass
+
+#--- BENCHMARKS ---
+# each returns (calls, events): a list of (function, arguments) to run in
+# order, built fresh so every run starts from the same state
+# what doesn't change from run to run is worked out once a trace, so the
+# short benchmarks aren't slowed down by rebuilding it every run
+traceCache = {}
+
+def traceMasks(trace):
+    key = (id(trace), "masks")
+    if key not in traceCache:
+        trace.rewind()
+        traceCache[key] = [ trace.stateAt(millis)[0] for millis in range(trace.endMillis() + DOUBLE_GAP + 1) ]
+    return traceCache[key]
+
+def traceEvents(trace):
+    return len(trace.changes)
+
+def benchCheckButton(trace):
+    states = [ [-1] * BUTTON_COUNT, [-1] * BUTTON_COUNT, [False] * BUTTON_COUNT ]
+    def scan(nowNs, mask):
+        setClock(nowNs)
+        for index in range(BUTTON_COUNT):
+            checkButton(index, (mask >> index) & 1, states, noop)
+    return [ (scan, (millis * 1000000, mask)) for millis, mask in enumerate(traceMasks(trace)) ], traceEvents(trace)
+
+def benchKeyStateMachine(trace):
+    keys = KeyStateMachine(BUTTON_COUNT, noop)
+    def scan(nowNs, millis, mask):
+        setClock(nowNs)
+        keys.update(mask, millis)
+    return [ (scan, (millis * 1000000, millis, mask)) for millis, mask in enumerate(traceMasks(trace)) ], traceEvents(trace)
+
+def scannerBench(useInterrupt, debounce = False):
+    def bench(trace):
+        trace.rewind()
+        hardware.trace = trace
+        hardware.expander.latched = 0xFFFF
+        interrupt = None
+        if useInterrupt:
+            interrupt = DigitalInOut(board.GP3)
+            interrupt.direction = Direction.INPUT
+            interrupt.pull = Pull.UP
+        debouncer = Debouncer(DEBOUNCE_MILLIS) if debounce else None
+        scanner = KeyScanner(I2CDevice(busio.I2C(board.GP5, board.GP4), 0x20), interrupt, debouncer = debouncer)
+        def scan(nowNs, millis):
+            setClock(nowNs)
+            scanner.read(millis)
+        return [ (scan, (millis * 1000000, millis)) for millis in range(trace.endMillis() + 1) ], traceEvents(trace)
+    return bench
+
+def keyboardBench(makeKeyboard):
+    def bench(trace):
+        return pressCalls(makeKeyboard(), trace), traceEvents(trace)
+    return bench
+
+def pressCalls(keyboard, trace):
+    calls = []
+    mask = 0
+    for _, down, key, _ in trace.changes:
+        if key < 0:
+            continue
+        if down:
+            mask |= 1 << key
+            calls.append((keyboard.press, (KEYCODES[key],)))
+        else:
+            mask &= ~(1 << key)
+            if mask:
+                calls.append((keyboard.release, (KEYCODES[key],)))
+            else:
+                calls.append((keyboard.release_all, ()))
+    return calls
+
+def keyconfigBench(moduleName, className):
+    def makeKeyconfig():
+        keyboard = Keyboard(hidDevices())
+        layout = KeyboardLayoutUS(keyboard)
+        macros = MacroScheduler(keyboard, layout, consumerControl = ConsumerControl(hidDevices()))
+        registry = KeyconfigRegistry([ (moduleName, className) ], (keyboard, layout, noop, macros))
+        return registry.select(0)
+
+    # the (key, event) pairs the trace makes with this keyconfig
+    def keyEvents(trace):
+        key = (id(trace), className)
+        if key not in traceCache:
+            keys = KeyStateMachine(BUTTON_COUNT)
+            keys.configureFor(makeKeyconfig())
+            events = []
+            for millis, mask in enumerate(traceMasks(trace)):
+                eventMask = keys.update(mask, millis)
+                while eventMask:
+                    bit = eventMask & -eventMask
+                    eventMask ^= bit
+                    events.append((BIT_INDEX[bit], keys.events[BIT_INDEX[bit]]))
+            traceCache[key] = events
+        return traceCache[key]
+
+    def bench(trace):
+        keyconfig = makeKeyconfig()
+        return [ (keyconfig.handleEvent, event) for event in keyEvents(trace) ], traceEvents(trace)
+    return bench
+
+def writeBench(fast):
+    def bench(trace):
+        layout = FastKeyboardLayout(Keyboard(hidDevices()))
+        return [ (layout.write, (TEXT, fast)) ], len(TEXT)
+    return bench
+
+TRACE_BENCHMARKS = [
+    ("checkButton", benchCheckButton),
+    ("KeyStateMachine", benchKeyStateMachine),
+    ("KeyScanner (INT)", scannerBench(True)),
+    ("KeyScanner (polling)", scannerBench(False)),
+    ("KeyScanner (debounced)", scannerBench(True, True)),
+    ("Keyboard press/release", keyboardBench(lambda: Keyboard(hidDevices()))),
+    ("NkroKeyboard press/release", keyboardBench(lambda: NkroKeyboard(NullDevice(0x01, 0x06)))),
+] + [ ("handleEvent " + className, keyconfigBench(moduleName, className)) for moduleName, className in KEYCONFIGS ]
+
+TEXT_BENCHMARKS = [
+    ("write", writeBench(False)),
+    ("write fast", writeBench(True)),
+]
+#------------------
+
+def runCalls(calls):
+    start = time.perf_counter_ns()
+    for function, arguments in calls:
+        function(*arguments)
+    return time.perf_counter_ns() - start
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+# nanoseconds one run of the calls takes, averaged over runs adding up to
+# at least MIN_RUN_MILLIS
+def timeRun(bench, trace):
+    runs = 0
+    spent = 0
+    elapsed = 0
+    while elapsed < MIN_RUN_MILLIS * 1000000:
+        calls, events = bench(trace)
+        emptyCalls = [ (noop, arguments) for _, arguments in calls ]
+        callsNs = runCalls(calls)
+        emptyNs = runCalls(emptyCalls)
+        spent += callsNs - emptyNs
+        elapsed += callsNs + emptyNs
+        runs += 1
+    return max(0, spent / runs), len(calls), events
+
+def referenceStep(value):
+    return (value * 3 + 1) & 0xFFFF
+
+# nanoseconds the reference loop takes right now
+def timeReference():
+    value = 0
+    start = time.perf_counter_ns()
+    for _ in range(REFERENCE_CALLS):
+        value = referenceStep(value)
+    return time.perf_counter_ns() - start
+
+# one timing of a benchmark: nanoseconds a run, and what that is in calls
+# of the reference loop timed just before and after it
+def timeRepeat(bench, trace):
+    before = timeReference()
+    spent, callCount, events = timeRun(bench, trace)
+    reference = (before + timeReference()) / 2
+    return spent, REFERENCE_CALLS * spent / reference, callCount, events
+
+def measureAllocations(bench, trace):
+    calls, events = bench(trace)
+    allocating = 0
+    transient = 0
+    tracemalloc.start()
+    for function, arguments in calls:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function(*arguments)
+        peak = tracemalloc.get_traced_memory()[1] - before
+        if peak > 0:
+            allocating += 1
+            transient += peak
+    tracemalloc.stop()
+    return allocating, transient
+
+# `timings` are the timeRepeat results of one benchmark
+def summarise(bench, trace, timings):
+    middle = median([ timing[1] for timing in timings ])
+    noise = 100.0 * median([ abs(timing[1] - middle) for timing in timings ]) / max(1e-9, middle)
+    spent = median([ timing[0] for timing in timings ])
+    callCount, events = timings[0][2], max(1, timings[0][3])
+    allocating, transient = measureAllocations(bench, trace)
+    return {
+        "ns_per_event": round(spent / events),
+        "ns_per_call": round(spent / max(1, callCount)),
+        "ref_per_event": round(middle / events, 3),
+        "noise_pct": round(noise, 1),
+        "calls": callCount,
+        "events": events,
+        "alloc_pct": round(100.0 * allocating / max(1, callCount), 1),
+        "alloc_bytes_per_event": round(transient / events, 1),
+    }
+
+# every benchmark is timed once a pass, REPEATS passes, so the repeats of
+# each are spread over the whole run and its noise includes the drift
+def runAll(only = None):
+    benchmarks = []
+    for path in sorted(glob.glob(os.path.join(TRACES, "*.txt"))):
+        traceName = os.path.splitext(os.path.basename(path))[0]
+        trace = KeyTrace.load(path)
+        for name, bench in TRACE_BENCHMARKS:
+            benchmarks.append((traceName + " / " + name, bench, trace))
+    for name, bench in TEXT_BENCHMARKS:
+        benchmarks.append(("text / " + name, bench, None))
+    benchmarks = [ benchmark for benchmark in benchmarks if not only or only in benchmark[0] ]
+
+    timings = dict((name, []) for name, _, _ in benchmarks)
+    for _ in range(REPEATS):
+        for name, bench, trace in benchmarks:
+            timings[name].append(timeRepeat(bench, trace))
+    results = {}
+    for name, bench, trace in benchmarks:
+        results[name] = summarise(bench, trace, timings[name])
+    return results
+
+def printTable(results, baseline = None, threshold = 20.0):
+    regressions = 0
+    header = "%-42s %10s %10s %9s %8s %8s %9s" % ("benchmark", "ns/event", "ns/call", "ref/event", "noise %", "alloc %", "B/event")
+    if baseline is not None:
+        header += " %9s" % "change"
+    print(header)
+    for name, result in results.items():
+        line = "%-42s %10d %10d %9.2f %8.1f %8.1f %9.1f" % (name, result["ns_per_event"], result["ns_per_call"], result["ref_per_event"],
+                                                            result["noise_pct"], result["alloc_pct"], result["alloc_bytes_per_event"])
+        previous = None if baseline is None else baseline.get(name)
+        if previous is not None:
+            # results saved before the reference loop are compared in
+            # nanoseconds, and count as noiseless
+            unit = "ref_per_event" if "ref_per_event" in previous else "ns_per_event"
+            change = 100.0 * (result[unit] - previous[unit]) / max(1e-9, previous[unit])
+            line += " %+8.1f%%" % change
+            noise = max(result["noise_pct"], previous.get("noise_pct", 0.0))
+            if change > max(threshold, NOISE_FACTOR * noise) or (result["alloc_pct"] > 0 and previous["alloc_pct"] == 0):
+                line += "  REGRESSION"
+                regressions += 1
+        elif baseline is not None:
+            line += " %9s" % "new"
+        print(line)
+    return regressions
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description="Benchmark the key handling hot path")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved with --save")
+    parser.add_argument("--threshold", type=float, default=20.0, help="percent slower that counts as a regression")
+    parser.add_argument("--only", help="only run benchmarks whose name contains this")
+    options = parser.parse_args(arguments)
+
+    results = runAll(options.only)
+    baseline = None
+    if options.compare:
+        with open(options.compare) as baselineFile:
+            baseline = json.load(baselineFile)["results"]
+    regressions = printTable(results, baseline, options.threshold)
+    if options.save:
+        with open(options.save, "w") as resultsFile:
+            json.dump({ "python": platform.python_version(), "machine": platform.machine(), "results": results },
+                      resultsFile, indent=2, sort_keys=True)
+    if regressions:
+        print(regressions, "regression(s) over", options.threshold, "%")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
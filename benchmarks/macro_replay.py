@@ -0,0 +1,72 @@
+"""
+Host side benchmark: typing the ADB keyconfig's commands with
+`KeyboardLayoutUS.write` one character at a time, against replaying a
+stream compiled once with `compileMacro`.
+
+Run from the repository root with a normal Python 3:
+    python benchmarks/macro_replay.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# the simulator's stand-in modules cover `micropython` for adafruit_hid
+from sim import setupPath
+setupPath()
+
+from adafruit_hid.keyboard import Keyboard
+from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
+from macrocompiler import *
+
+COMMANDS = [
+    "terminal",
+    "pkill scrcpy; sleep 0.1 && sh unlockWithSwipe -p 314159 && scrcpy -Sw &",
+    "pkill scrcpy; sleep 0.1 && sh unlockWithSwipe -p 314159 && scrcpy -w &",
+    "pkill scrcpy",
+    "sh okDialog -c \"sh listElements -a id\"",
+    "sh talkback",
+    "sh talkback -o",
+]
+ROUNDS = 2000
+
+class CountingDevice():
+    usage_page = 0x1
+    usage = 0x06
+
+    def __init__(self):
+        self.reports = 0
+
+    def send_report(self, report):
+        self.reports += 1
+
+def timeIt(action):
+    start = time.perf_counter_ns()
+    for _ in range(ROUNDS):
+        action()
+    return (time.perf_counter_ns() - start) / ROUNDS
+
+def main():
+    device = CountingDevice()
+    keyboard = Keyboard(device)
+    layout = KeyboardLayoutUS(keyboard)
+
+    print("%-10s %8s %8s %12s %12s %12s %8s" % ("command", "chars", "reports", "write() ns", "compile ns", "replay ns", "speedup"))
+    for command in COMMANDS:
+        device.reports = 0
+        writeNs = timeIt(lambda: layout.write(command))
+        writeReports = device.reports // ROUNDS
+
+        compileNs = timeIt(lambda: compileMacro(command, layout))
+        stream = compileMacro(command, layout)
+        device.reports = 0
+        replayNs = timeIt(lambda: replayMacro(keyboard, stream))
+        replayReports = device.reports // ROUNDS
+
+        print("%-10s %8d %3d->%-4d %12.0f %12.0f %12.0f %7.1fx" % (
+            command[:10], len(command), writeReports, replayReports,
+            writeNs, compileNs, replayNs, writeNs / replayNs))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# Runs before code.py, and is the only place USB devices can be set up.
+#
+# On CircuitPython 7 and later this adds the N key rollover keyboard from
+# lib/nkrokeyboard.py. The boot keyboard stays as well, first and offered
+# as the boot device (boot_device = 1), for BIOS screens and for code.py if
+# USE_NKRO is turned off. When a host asks for the boot protocol,
+# makeKeyboard sees it through usb_hid.get_boot_device() and uses the boot
+# keyboard. CircuitPython 6 can't change its USB devices, so there code.py
+# falls back to the boot keyboard.
+#
+# It also turns on the second USB serial port lib/serialprotocol.py
+# listens on, so the host can talk to the keypad without going through
+# the REPL console.
+import usb_hid
+try:
+    import usb_cdc
+except ImportError:
+    usb_cdc = None
+from nkrokeyboard import nkroDevice
+
+ENABLE_NKRO = True
+ENABLE_SERIAL_PROTOCOL = True
+
+if ENABLE_NKRO and hasattr(usb_hid, "enable"):
+    usb_hid.enable((
+        usb_hid.Device.KEYBOARD,
+        nkroDevice(),
+        usb_hid.Device.CONSUMER_CONTROL,
+        usb_hid.Device.MOUSE,
+    ), boot_device = 1)
+
+if ENABLE_SERIAL_PROTOCOL and usb_cdc is not None and hasattr(usb_cdc, "enable"):
+    usb_cdc.enable(console = True, data = True)
@@ -7,7 +7,6 @@ from adafruit_bus_device.i2c_device import I2CDevice
 import adafruit_dotstar
 
 from adafruit_hid.keyboard import Keyboard
-from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
 from adafruit_hid.keycode import Keycode
 
 from adafruit_hid.consumer_control import ConsumerControl
@@ -20,19 +19,57 @@ if USE_DISPLAY:
     from picodisplay import *
     picoDisplay = PicoDisplay()
     picoDisplay.setBacklightPercent(10)
-    wallpapers = [ picoDisplay.getAndroid, picoDisplay.getTeams, picoDisplay.getDota ]
+    from wallpapercache import *
+    wallpapers = WallpaperCache([ picoDisplay.getAndroid, picoDisplay.getTeams, picoDisplay.getDota ])
 #------------------------------------
 from constants import *
 from keypad import *
-from keyconfig.adb import *
-from keyconfig.teams import *
-from keyconfig.dota import *
+from keyscanner import *
+from debouncer import *
+from keystatemachine import *
+from comboengine import *
+from macroscheduler import *
+from keyconfigregistry import *
+from ledframe import *
+from nkrokeyboard import *
+from fastlayout import *
+from serialprotocol import *
+#------------------------------------
+# times each key from the expander read to the USB report. Hold the
+# display's second button for a long press to print the histograms.
+TRACE_LATENCY = False
+if TRACE_LATENCY:
+    from latencytrace import *
+# prints loops per second and the time spent in each part of the main
+# loop every few seconds. A double press on the display's second button
+# turns it on and off while running.
+from loopprofiler import *
+PROFILE_LOOP = False
+PHASE_KEYCONFIG = 0
+PHASE_MACROS    = 1
+PHASE_DISPLAY   = 2
+PHASE_SCAN      = 3
+PHASE_DETECT    = 4
+PHASE_DISPATCH  = 5
+PHASE_LEDS      = 6
+PHASE_SERIAL    = 7
+loopProfiler = LoopProfiler(("keyconfig", "macros", "display", "scan", "detect", "dispatch", "leds", "serial"), PROFILE_LOOP)
+if USE_DISPLAY:
+    loopProfiler.addStats(wallpapers)
+# loops per second for the serial stats reply, counted even with the
+# profiler off
+loopCount = 0
+loopCountStart = 0
+loopsPerSecond = 0
 #------------------------------------
 for _ in range(10):
     print(" ")
 print("  ============ NEW EXECUTION ============  ")
 #------------------------------------
-interfaces = [ AdbKeypad, TeamsKeypad, DotAKeypad ]
+# keyconfigs are built once and kept. With LAZY_KEYCONFIGS a keyconfig
+# isn't imported until it is first swapped to, which saves RAM at boot.
+LAZY_KEYCONFIGS = False
+interfaces = [ ("keyconfig.adb", "AdbKeypad"), ("keyconfig.teams", "TeamsKeypad"), ("keyconfig.dota", "DotAKeypad") ]
 currentInterface = -1
 #------------------------------------
 
@@ -40,89 +77,211 @@ currentInterface = -1
 # SCLK: GP18 - 24
 # MOSI: GP19 - 25
 # ----- I2C -----
-# INT : GP3  - 05 ? Not used!
+# INT : GP3  - 05
 # SDA : GP4  - 06
 # SCL : GP5  - 07
 cs = DigitalInOut(board.GP17)
 cs.direction = Direction.OUTPUT
 cs.value = 0
-pixels = adafruit_dotstar.DotStar(board.GP18, board.GP19, BUTTON_COUNT, brightness=0.2, auto_write=True)
+pixels = adafruit_dotstar.DotStar(board.GP18, board.GP19, BUTTON_COUNT, brightness=0.2, auto_write=False)
+ledFrame = LedFrame(pixels)
+loopProfiler.addStats(ledFrame)
 i2c = busio.I2C(board.GP5, board.GP4)
 device = I2CDevice(i2c, 0x20)
-kbd = Keyboard(usb_hid.devices)
-layout = KeyboardLayoutUS(kbd)
+keypadInterrupt = DigitalInOut(board.GP3)
+keypadInterrupt.direction = Direction.INPUT
+keypadInterrupt.pull = Pull.UP
+scanner = KeyScanner(device, keypadInterrupt, debouncer = Debouncer(DEBOUNCE_MILLIS))
+kbd = makeKeyboard(usb_hid.devices)
+layout = FastKeyboardLayout(kbd)
+consumerControl = ConsumerControl(usb_hid.devices)
+macros = MacroScheduler(kbd, layout, consumerControl = consumerControl)
+loopProfiler.addStats(macros)
+if TRACE_LATENCY:
+    latencyTrace = LatencyTrace(macros)
+    latencyTrace.wrapDevices(kbd, consumerControl)
 #------------------------------------
 picoLED = DigitalInOut(board.GP25)
 picoLED.direction = Direction.OUTPUT
 picoLED.value = 0
 #------------------------------------
-timeDown = [-1] * BUTTON_COUNT
-timeUp = [-1] * BUTTON_COUNT
-waiting = [False] * BUTTON_COUNT
-keypadButtonStates = [ timeDown, timeUp, waiting ]
-#------------------------------------
 def setKeyColour(pixel, colour):
-    pixels[pixel] = (((colour >> 16) & 255), (colour >> 8) & 255, colour & 255)
+    ledFrame.setKeyColour(pixel, colour)
+
+keyconfigs = KeyconfigRegistry(interfaces, (kbd, layout, setKeyColour, macros), LAZY_KEYCONFIGS)
 
 def swapLayout():
+    selectLayout((currentInterface + 1) % len(interfaces))
+
+def selectLayout(index):
     global currentKeypadConfiguration
     global currentInterface
-    currentInterface = (currentInterface + 1) % len(interfaces)
-    currentKeypadConfiguration = interfaces[currentInterface](kbd, layout, setKeyColour)
+    currentInterface = index
+    # a macro from the old layout shouldn't go on typing into the new one
+    macros.cancel()
+    currentKeypadConfiguration = keyconfigs.select(currentInterface)
+    keypadKeys.configureFor(currentKeypadConfiguration)
+    comboEngine.configureFor(currentKeypadConfiguration)
     currentKeypadConfiguration.introduce()
     if USE_DISPLAY:
-        picoDisplay.render(wallpapers[currentInterface](), 270)
-
-def read_button_states(x, y):
-    pressed = [0] * BUTTON_COUNT
-    with device:
-        device.write(bytes([0x0]))
-        result = bytearray(2)
-        device.readinto(result)
-        b = result[0] | result[1] << 8
-        for i in range(x, y):
-            if not (1 << i) & b:
-                pressed[i] = 1
-            else:
-                pressed[i] = 0
-    return pressed
+        picoDisplay.render(wallpapers.get(currentInterface), 270)
+
 #------------------------------------
-def checkHeldForFlash(heldDownStartMillis):
+# flashes as the held key reaches its long and extra long hold times, a 0
+# time being one the key has no press for
+def checkHeldForFlash(heldDownStartMillis, longHold = LONG_HOLD, extraLongHold = EXTRA_LONG_HOLD):
     if heldDownStartMillis > 0:
         downTime = timeInMillis() - heldDownStartMillis
-        picoLED.value = (downTime >= LONG_HOLD and downTime <= LONG_HOLD + 100) or (downTime >= EXTRA_LONG_HOLD and downTime <= EXTRA_LONG_HOLD + 100)
+        picoLED.value = (longHold > 0 and downTime >= longHold and downTime <= longHold + 100) or \
+                        (extraLongHold > 0 and downTime >= extraLongHold and downTime <= extraLongHold + 100)
     else:
         picoLED.value = 0
 #------------------------------------
+keypadKeys = KeyStateMachine(BUTTON_COUNT, checkHeldForFlash)
+# picks keys pressed together out before keypadKeys sees them
+comboEngine = ComboEngine()
+if USE_DISPLAY:
+    displayKeys = KeyStateMachine(DISPLAY_BUTTON_COUNT, checkHeldForFlash)
+    # swapping layouts doesn't need to wait to see if it is a double press
+    displayKeys.setPolicy(0, POLICY_ON_DOWN)
+
+def readDisplayButtons():
+    mask = 0
+    for displayKeyIndex in range(DISPLAY_BUTTON_COUNT):
+        if not picoDisplay.Buttons[displayKeyIndex].value:
+            mask |= 1 << displayKeyIndex
+    return mask
+#------------------------------------
+# commands from the host over the USB data serial port, see
+# lib/serialprotocol.py and host/keypadclient.py
+def serialSetColours(payload):
+    colours = decodeColours(payload)
+    for key, colour in colours:
+        if key >= BUTTON_COUNT:
+            raise ValueError("No key " + str(key))
+    for key, colour in colours:
+        setKeyColour(key, colour)
+
+def serialSelectLayout(payload):
+    if len(payload) != 1 or payload[0] >= len(interfaces):
+        raise ValueError("No layout " + str(payload[0] if payload else ""))
+    if payload[0] != currentInterface:
+        selectLayout(payload[0])
+
+# compiled here so text the layout can't type is refused with a NAK,
+# rather than failing later in the middle of the main loop
+def serialPushMacro(payload):
+    try:
+        text = str(bytes(payload), "utf-8")
+    except UnicodeError:
+        raise ValueError("Macro is not utf-8")
+    macros.replay(compileMacro(text, layout))
+
+def serialStats(payload):
+    return (RSP_STATS, packStats(max(0, currentInterface), macros.queueDepth(), loopsPerSecond,
+                                 scanner.busReads, scanner.skippedReads, comboEngine.combosFired))
+
+def serialLatency(payload):
+    if not TRACE_LATENCY:
+        raise ValueError("TRACE_LATENCY is off")
+    return (RSP_LATENCY, packLatency(latencyTrace.counts, latencyTrace.totals, latencyTrace.worst))
+
+serialProtocol = SerialProtocol(findSerialPort(), {
+    CMD_SET_COLOURS: serialSetColours,
+    CMD_SELECT_LAYOUT: serialSelectLayout,
+    CMD_PUSH_MACRO: serialPushMacro,
+    CMD_QUERY_STATS: serialStats,
+    CMD_QUERY_LATENCY: serialLatency,
+})
+#------------------------------------
 if USE_DISPLAY:
     rainbow = picoDisplay.createRainbow()
     rainbow.append(picoDisplay.createText("Welcome", COLOUR_BLACK, 30, 40))
     picoDisplay.render(rainbow, 270)
 #------------------------------------
-currentKeypadConfiguration = KeypadInterface(kbd, layout, setKeyColour)
+currentKeypadConfiguration = KeypadInterface(kbd, layout, setKeyColour, macros)
 currentKeypadConfiguration.introduce()
 #------------------------------------
 helpMode=False
+# the key help was asked for, kept from the keyconfig until it is let go
+helpKey = -1
+# the first loops/sec window starts with the loop, not at boot
+loopCountStart = timeInMillis()
 while True:
+    profiling = loopProfiler.enabled
+    if profiling:
+        loopProfiler.start()
     currentKeypadConfiguration.loop()
+    if profiling:
+        loopProfiler.mark(PHASE_KEYCONFIG)
+    currentTime = timeInMillis()
+    macros.loop(currentTime)
+    if profiling:
+        loopProfiler.mark(PHASE_MACROS)
+    serialProtocol.poll(currentTime)
+    if profiling:
+        loopProfiler.mark(PHASE_SERIAL)
     if USE_DISPLAY:
-        for displayKeyIndex in range(DISPLAY_BUTTON_COUNT):
-            buttonValue = checkButton(displayKeyIndex,
-                                not picoDisplay.Buttons[displayKeyIndex].value,
-                                picoDisplay.ButtonStates,
-                                checkHeldForFlash)
-            if displayKeyIndex == 0 and buttonValue & EVENT_SINGLE_PRESS:
+        if displayKeys.update(readDisplayButtons(), currentTime):
+            if displayKeys.events[0] & EVENT_SINGLE_PRESS:
                 swapLayout()
-            if displayKeyIndex == 1 and buttonValue & EVENT_SINGLE_PRESS:
+            if displayKeys.events[1] & EVENT_SINGLE_PRESS:
                 helpMode = True
                 # displayHelpMode()
+            if displayKeys.events[1] & EVENT_DOUBLE_PRESS:
+                loopProfiler.toggle()
+            if TRACE_LATENCY and displayKeys.events[1] & EVENT_LONG_PRESS:
+                latencyTrace.dump()
+        if profiling:
+            loopProfiler.mark(PHASE_DISPLAY)
 
-    pressed = read_button_states(0, BUTTON_COUNT)
-
-    for keyIndex in range(BUTTON_COUNT):
-        event = checkButton(keyIndex, pressed[keyIndex], keypadButtonStates, checkHeldForFlash)
-        if helpMode:
-            print(currentKeypadConfiguration.helpForKey(keyIndex))
-            helpMode = False
+    if TRACE_LATENCY:
+        scanStart = latencyTrace.now()
+        keyState = scanner.read(currentTime)
+        if scanner.changed:
+            latencyTrace.scanned(scanner.changed, scanStart)
+    else:
+        keyState = scanner.read(currentTime)
+    if profiling:
+        loopProfiler.mark(PHASE_SCAN)
+    keyState = comboEngine.update(keyState, currentTime)
+    eventMask = keypadKeys.update(keyState, currentTime)
+    if profiling:
+        loopProfiler.mark(PHASE_DETECT)
+    # tap-hold keys that just became holds go first, so a key pressed
+    # under one is sent with its modifier or layer already on
+    holdMask = keypadKeys.holdMask
+    while eventMask:
+        if holdMask:
+            keyBit = holdMask & -holdMask
+            holdMask ^= keyBit
         else:
-            currentKeypadConfiguration.handleEvent(keyIndex, event)
+            keyBit = eventMask & -eventMask
+        eventMask ^= keyBit
+        keyIndex = BIT_INDEX[keyBit]
+        if helpMode or keyIndex == helpKey:
+            if helpMode:
+                helpForKey = getattr(currentKeypadConfiguration, "helpForKey", None)
+                print(helpForKey(keyIndex) if helpForKey else "No help for key " + str(keyIndex))
+                helpMode = False
+                helpKey = keyIndex
+            if keypadKeys.isIdle(keyIndex):
+                helpKey = -1
+        elif TRACE_LATENCY:
+            latencyTrace.dispatching(keyIndex)
+            currentKeypadConfiguration.handleEvent(keyIndex, keypadKeys.events[keyIndex])
+            latencyTrace.dispatched(keyIndex)
+        else:
+            currentKeypadConfiguration.handleEvent(keyIndex, keypadKeys.events[keyIndex])
+    if profiling:
+        loopProfiler.mark(PHASE_DISPATCH)
+
+    ledFrame.commit(currentTime)
+    if profiling:
+        loopProfiler.mark(PHASE_LEDS)
+        loopProfiler.end(currentTime)
+    loopCount += 1
+    if currentTime - loopCountStart >= 1000:
+        loopsPerSecond = loopCount * 1000 // (currentTime - loopCountStart)
+        loopCount = 0
+        loopCountStart = currentTime
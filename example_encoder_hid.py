@@ -0,0 +1,32 @@
+import board
+import usb_hid
+from digitalio import DigitalInOut, Direction, Pull
+from adafruit_hid.consumer_control import ConsumerControl
+from adafruit_hid.mouse import Mouse
+
+from rgbled import *
+from rotaryencoder import *
+from encoderhid import *
+
+rotaryEncoder = RotaryEncoder()
+rgbLed = RgbLed()
+encoderHid = EncoderHid(rotaryEncoder, ConsumerControl(usb_hid.devices), Mouse(usb_hid.devices))
+
+switchPin = DigitalInOut(board.GP15)
+switchPin.direction = Direction.INPUT
+switchPin.pull = Pull.DOWN
+
+# green for volume, blue for scrolling
+MODE_COLOURS = { ENCODER_VOLUME: 0x00ff00, ENCODER_SCROLL: 0x0000ff }
+
+switchWasDown = False
+rgbLed.setColour(MODE_COLOURS[encoderHid.mode])
+while True:
+    encoderHid.loop()
+
+    # pressing the knob swaps between volume and scrolling
+    if switchPin.value and not switchWasDown:
+        encoderHid.setMode(ENCODER_SCROLL if encoderHid.mode == ENCODER_VOLUME else ENCODER_VOLUME)
+        rgbLed.setColour(MODE_COLOURS[encoderHid.mode])
+        print("    ~~> encoder mode", encoderHid.mode)
+    switchWasDown = switchPin.value
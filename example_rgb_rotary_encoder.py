@@ -1,3 +1,4 @@
+import board
 from digitalio import DigitalInOut, Direction, Pull
 
 from rgbled import *
@@ -12,21 +13,19 @@ switchPin.pull = Pull.DOWN
 
 currentValue = 0
 while True:
-    rotaryValue = rotaryEncoder.read()
-    if rotaryValue == ROTARY_CW:
-        print("    ~~> rotary increase [clockwise]")
-        currentValue = currentValue + 1
-    elif rotaryValue == ROTARY_CCW:
-        print("    ~~> rotary decrease [counter clockwise]")
-        currentValue = currentValue - 1
-
-    if currentValue > 255:
-        currentValue = 0
-    if currentValue < 0:
-        currentValue = 255
-    colour = rgbLed.colourWheel(currentValue)
-    rgbLed.setColour(colour[0], colour[1], colour[2])
+    direction = rotaryEncoder.update()
+    if direction > 0:
+        print("    ~~> rotary increase [clockwise]", rotaryEncoder.velocity, "detents/s")
+    elif direction < 0:
+        print("    ~~> rotary decrease [counter clockwise]", rotaryEncoder.velocity, "detents/s")
 
+    # a fast spin moves further than a slow one
+    currentValue = (currentValue + rotaryEncoder.takeDelta()) % 256
 
+    # the wheel is a lookup, and the LED is only written to when the
+    # colour changes, so this is cheap to do every loop
     if switchPin.value:
         rgbLed.setColour(0xffffff)
+    else:
+        colour = rgbLed.colourWheel(currentValue)
+        rgbLed.setColour(colour[0], colour[1], colour[2])
@@ -0,0 +1,173 @@
+"""
+Talks to the keypad over its USB data serial port with the protocol in
+lib/serialprotocol.py, which is imported from there so both ends share
+one encoding.
+
+    python host/keypadclient.py PORT ping
+    python host/keypadclient.py PORT colours 0=ff0000 1=00ff00
+    python host/keypadclient.py PORT layout 1
+    python host/keypadclient.py PORT macro "hello world"
+    python host/keypadclient.py PORT stats
+    python host/keypadclient.py PORT latency
+
+PORT is the keypad's second serial device (e.g. /dev/ttyACM1 or COM4).
+pyserial is used when it is installed; otherwise the port is opened as a
+raw tty, which also works against a pty standing in for the keypad.
+
+From other code:
+
+    client = KeypadClient.open("/dev/ttyACM1")
+    client.setColours({ 0: 0xFF0000 })   # mic muted
+    client.selectLayout(1)
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from serialprotocol import *
+from latencytrace import STAGE_NAMES
+
+REPLY_TIMEOUT = 1.0
+
+class KeypadError(Exception):
+    pass
+
+# a raw tty for when pyserial isn't there
+class TtyPort():
+    def __init__(self, path):
+        import termios
+        import tty
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        if os.isatty(self.fd):
+            tty.setraw(self.fd, termios.TCSANOW)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self.fd, view)
+            except BlockingIOError:
+                time.sleep(0.001)
+                continue
+            view = view[written:]
+
+    def read(self, size):
+        try:
+            return os.read(self.fd, size)
+        except (BlockingIOError, OSError):
+            return b""
+
+    def close(self):
+        os.close(self.fd)
+
+class KeypadClient():
+    def __init__(self, port, timeout = REPLY_TIMEOUT):
+        self.port = port
+        self.timeout = timeout
+        self.parser = FrameParser()
+        # bytes read but not parsed yet
+        self.leftover = b""
+
+    @staticmethod
+    def open(path, timeout = REPLY_TIMEOUT):
+        try:
+            import serial
+            port = serial.Serial(path, 115200, timeout = 0)
+        except ImportError:
+            port = TtyPort(path)
+        return KeypadClient(port, timeout)
+
+    def close(self):
+        self.port.close()
+
+    # sends a command and returns the (command, payload) the keypad replies
+    # with, raising KeypadError for a NAK or no reply. Bytes read past the
+    # end of the reply are kept for the next request.
+    def request(self, command, payload = b""):
+        self.port.write(encodeFrame(command, payload))
+        deadline = time.monotonic() + self.timeout
+        found = self.parser.next(self.millis())
+        while not found:
+            if time.monotonic() >= deadline:
+                raise KeypadError("No reply to command 0x%02x" % command)
+            data = self.leftover or self.port.read(MAX_PAYLOAD)
+            self.leftover = b""
+            if not data:
+                found = self.parser.next(self.millis())
+                if not found:
+                    time.sleep(0.001)
+                continue
+            for index, byte in enumerate(data):
+                if self.parser.feed(byte, self.millis()):
+                    self.leftover = data[index + 1:]
+                    found = True
+                    break
+        reply = self.parser.command
+        replyPayload = bytes(self.parser.payloadView())
+        if reply == RSP_NAK:
+            raise KeypadError("Command 0x%02x refused: %s" % (replyPayload[0], replyPayload[1:].decode("utf-8", "replace")))
+        return reply, replyPayload
+
+    def millis(self):
+        return int(time.monotonic() * 1000)
+
+    def ping(self):
+        self.request(CMD_PING)
+
+    # colours is a dict of {key: 0xRRGGBB}
+    def setColours(self, colours):
+        self.request(CMD_SET_COLOURS, encodeColours(sorted(colours.items())))
+
+    def selectLayout(self, index):
+        self.request(CMD_SELECT_LAYOUT, bytes((index,)))
+
+    def pushMacro(self, text):
+        self.request(CMD_PUSH_MACRO, text.encode("utf-8"))
+
+    def stats(self):
+        return unpackStats(self.request(CMD_QUERY_STATS)[1])
+
+    # [(events, mean micros, worst micros)] per latency stage
+    def latency(self):
+        return unpackLatency(self.request(CMD_QUERY_LATENCY)[1])
+
+def parseColour(argument):
+    key, colour = argument.split("=")
+    return int(key), int(colour, 16)
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description="Control the keypad over USB serial")
+    parser.add_argument("port")
+    parser.add_argument("command", choices=("ping", "colours", "layout", "macro", "stats", "latency"))
+    parser.add_argument("values", nargs="*")
+    options = parser.parse_args(arguments)
+
+    client = KeypadClient.open(options.port)
+    try:
+        if options.command == "ping":
+            client.ping()
+            print("ok")
+        elif options.command == "colours":
+            client.setColours(dict(parseColour(value) for value in options.values))
+        elif options.command == "layout":
+            client.selectLayout(int(options.values[0]))
+        elif options.command == "macro":
+            client.pushMacro(" ".join(options.values))
+        elif options.command == "stats":
+            for name, value in client.stats().items():
+                print("%-16s %d" % (name, value))
+        else:
+            for name, (events, mean, worst) in zip(STAGE_NAMES, client.latency()):
+                print("%-10s %6d events, mean %6d us, worst %6d us" % (name, events, mean, worst))
+    except KeypadError as error:
+        print(error)
+        return 1
+    finally:
+        client.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
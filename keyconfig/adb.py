@@ -1,6 +1,9 @@
 import time
 from constants import *
 from adafruit_hid.keycode import Keycode
+from macrocompiler import *
+from macroscheduler import STEP_SEND, STEP_DELAY, STEP_REPLAY
+from keymap import *
 
 class AdbKeypad():
     #--- OPTIONAL METHODS ---
@@ -12,13 +15,30 @@ class AdbKeypad():
     toggleTalkBack="sh talkback"
     openTalkBackSettings="sh talkback -o"
 
-    def goTerminal(self):
-        self.keyboard.send(Keycode.COMMAND, Keycode.SPACE)
-        time.sleep(KEYBOARD_DELAY)
-        self.keyboardLayout.write("terminal")
-        time.sleep(KEYBOARD_DELAY)
-        self.keyboard.send(Keycode.RETURN)
-        time.sleep(KEYBOARD_DELAY)
+    # after a single press, go back to the window that was in use before
+    SWITCH_BACK = (
+        (STEP_DELAY, KEYBOARD_DELAY_MILLIS * 2),
+        (STEP_SEND, (Keycode.COMMAND, Keycode.TAB)),
+        (STEP_DELAY, KEYBOARD_DELAY_MILLIS)
+    )
+
+    # opens a terminal through spotlight and runs the command in it. The
+    # text is compiled to HID reports once, when the keymap is built.
+    def terminalSteps(self, command, switchBack = False):
+        steps = (
+            (STEP_SEND, (Keycode.COMMAND, Keycode.SPACE)),
+            (STEP_DELAY, KEYBOARD_DELAY_MILLIS),
+            (STEP_REPLAY, self.terminalReports),
+            (STEP_DELAY, KEYBOARD_DELAY_MILLIS),
+            (STEP_SEND, (Keycode.RETURN,)),
+            (STEP_DELAY, KEYBOARD_DELAY_MILLIS),
+            (STEP_REPLAY, compileMacro(command, self.keyboardLayout)),
+            (STEP_DELAY, KEYBOARD_DELAY_MILLIS),
+            (STEP_SEND, (Keycode.RETURN,))
+        )
+        if switchBack:
+            steps += self.SWITCH_BACK
+        return macro(steps)
 
     def androidAdbIntro(self, frame):
         if frame >= 4:
@@ -26,6 +46,9 @@ class AdbKeypad():
         for row in range(4):
             index = (row * 4) + frame
             self.setKeyColour(index, self.IMAGE[index])
+
+    def suspend(self):
+        self.keymap.suspend()
     #------------------------
     #--- REQUIRED METHODS ---
     IMAGE = [
@@ -68,10 +91,26 @@ class AdbKeypad():
             (darkVersion(self.IMAGE[15]), COLOUR_YELLOW)
         )
 
-    def __init__(self, keyboard, keyboardLayout, setKeyColour):
+    def __init__(self, keyboard, keyboardLayout, setKeyColour, macros = None):
         self.setKeyColour = setKeyColour
         self.keyboard = keyboard
         self.keyboardLayout= keyboardLayout
+        self.macros = macros
+        self.terminalReports = compileMacro("terminal", keyboardLayout)
+        self.keymap = Keymap(keyboard, keyboardLayout, macros, self.getKeymap())
+
+    def getKeymap(self):
+        keymap = [
+            (0, EVENT_LONG_PRESS,   self.terminalSteps(self.loadDeviceButAllowTouch)),
+            (0, EVENT_DOUBLE_PRESS, self.terminalSteps(self.killConnection)),
+            (0, EVENT_SINGLE_PRESS, self.terminalSteps(self.loadDevice, True)),
+            (1, EVENT_SINGLE_PRESS, self.terminalSteps(self.listElementIdDialog, True)),
+            (2, EVENT_SINGLE_PRESS, self.terminalSteps(self.toggleTalkBack, True)),
+            (3, EVENT_SINGLE_PRESS, self.terminalSteps(self.openTalkBackSettings, True))
+        ]
+        for index in range(4, BUTTON_COUNT):
+            keymap.append((index, EVENT_SINGLE_PRESS, macro(self.SWITCH_BACK)))
+        return keymap
 
     def introduce(self):
         self.resetColours(COLOUR_OFF)
@@ -87,43 +126,11 @@ class AdbKeypad():
             elif len(colours) == BUTTON_COUNT:
                 self.setKeyColour(key, colours[key][0])
 
-    def handleEvent(self, index, event):
-        if event & EVENT_LONG_PRESS:
-            if index == 0:
-                self.goTerminal()
-                self.keyboardLayout.write(self.loadDeviceButAllowTouch)
-                time.sleep(KEYBOARD_DELAY)
-                self.keyboard.send(Keycode.RETURN)
-        if event & EVENT_DOUBLE_PRESS:
-            if index == 0:
-                self.goTerminal()
-                self.keyboardLayout.write(self.killConnection)
-                time.sleep(KEYBOARD_DELAY)
-                self.keyboard.send(Keycode.RETURN)
+    # lets the key engine fire single presses without waiting on keys
+    # that have no double press
+    def handledEvents(self, index):
+        return self.keymap.handledEvents(index)
 
-        if event & EVENT_SINGLE_PRESS:
-            if index == 0:
-                self.goTerminal()
-                self.keyboardLayout.write(self.loadDevice)
-                time.sleep(KEYBOARD_DELAY)
-                self.keyboard.send(Keycode.RETURN)
-            elif index == 1:
-                self.goTerminal()
-                self.keyboardLayout.write(self.listElementIdDialog)
-                time.sleep(KEYBOARD_DELAY)
-                self.keyboard.send(Keycode.RETURN)
-            elif index == 2:
-                self.goTerminal()
-                self.keyboardLayout.write(self.toggleTalkBack)
-                time.sleep(KEYBOARD_DELAY)
-                self.keyboard.send(Keycode.RETURN)
-            elif index == 3:
-                self.goTerminal()
-                self.keyboardLayout.write(self.openTalkBackSettings)
-                time.sleep(KEYBOARD_DELAY)
-                self.keyboard.send(Keycode.RETURN)
-            time.sleep(KEYBOARD_DELAY)
-            time.sleep(KEYBOARD_DELAY)
-            self.keyboard.send(Keycode.COMMAND, Keycode.TAB)
-            time.sleep(KEYBOARD_DELAY)
+    def handleEvent(self, index, event):
+        self.keymap.handleEvent(index, event)
     #------------------------
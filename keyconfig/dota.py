@@ -1,6 +1,8 @@
 import time
 from constants import *
 from adafruit_hid.keycode import Keycode
+from keymap import *
+from macroscheduler import STEP_PRESS, STEP_RELEASE, STEP_DELAY
 
 class DotAKeypad():
     #--- OPTIONAL METHODS ---
@@ -12,12 +14,40 @@ class DotAKeypad():
         index = frameArray[frameIndex]
         self.setKeyColour(index, self.IMAGE[index])
 
+    # key 8 holds SHIFT when held, don't leave it stuck down in another layout
+    def suspend(self):
+        self.keyboard.release(Keycode.SHIFT)
+        self.keymap.suspend()
+
     #------------------------
     #----- PICO DISPLAY -----
     def getDisplaySettings(self):
         return ("dota", "images/dota.bmp")
     #------------------------
     #--- REQUIRED METHODS ---
+    KEYMAP = (
+        (0,  EVENT_SINGLE_PRESS, keys(Keycode.Q)),
+        (1,  EVENT_SINGLE_PRESS, keys(Keycode.W)),
+        (2,  EVENT_SINGLE_PRESS, keys(Keycode.E)),
+        (3,  EVENT_SINGLE_PRESS, keys(Keycode.R)),
+        (4,  EVENT_SINGLE_PRESS, keys(Keycode.ONE)),
+        (5,  EVENT_SINGLE_PRESS, keys(Keycode.TWO)),
+        (6,  EVENT_SINGLE_PRESS, keys(Keycode.THREE)),
+        # press and release rather than send, whose release_all would let
+        # go of the SHIFT key 8 may be holding
+        (7,  EVENT_SINGLE_PRESS, macro(((STEP_PRESS, (Keycode.T,)), (STEP_RELEASE, (Keycode.T,)), (STEP_DELAY, 10),
+                                        (STEP_PRESS, (Keycode.T,)), (STEP_RELEASE, (Keycode.T,))))),
+        (8,  EVENT_SINGLE_PRESS, keys(Keycode.FOUR)),      # tapped: item 4
+        (8,  EVENT_HOLD,         press(Keycode.SHIFT)),    # held: queue orders
+        (8,  EVENT_HOLD_RELEASE, release(Keycode.SHIFT)),
+        (9,  EVENT_SINGLE_PRESS, keys(Keycode.FIVE)),
+        (10, EVENT_SINGLE_PRESS, keys(Keycode.SIX)),
+        (11, EVENT_SINGLE_PRESS, keys(Keycode.F4)), # Shop for now, Get next item and add to
+        (12, EVENT_SINGLE_PRESS, keys(Keycode.F5)), # QuickBuy
+        (13, EVENT_SINGLE_PRESS, keys(Keycode.F1)), # Focus Hero
+        (14, EVENT_SINGLE_PRESS, keys(Keycode.F2))  # Controlled Units
+    )
+
     IMAGE = [
         COLOUR_WHITE, COLOUR_RED, COLOUR_RED, COLOUR_RED,
         COLOUR_RED, COLOUR_RED, COLOUR_WHITE, COLOUR_RED,
@@ -57,10 +87,12 @@ class DotAKeypad():
             (darkVersion(self.IMAGE[15]), COLOUR_YELLOW)
         )
 
-    def __init__(self, keyboard, keyboardLayout, setKeyColour):
+    def __init__(self, keyboard, keyboardLayout, setKeyColour, macros = None):
         self.setKeyColour = setKeyColour
         self.keyboard = keyboard
         self.keyboardLayout= keyboardLayout
+        self.macros = macros
+        self.keymap = Keymap(keyboard, keyboardLayout, macros, self.KEYMAP)
 
     def introduce(self):
         self.resetColours(COLOUR_OFF)
@@ -76,46 +108,11 @@ class DotAKeypad():
             elif len(colours) == BUTTON_COUNT:
                 self.setKeyColour(key, colours[key][0])
 
-    def handleEvent(self, index, event):
-        if index == 8:
-            if event & EVENT_KEY_DOWN:
-                self.keyboard.press(Keycode.SHIFT)
-            elif event & EVENT_KEY_UP:
-                self.keyboard.release(Keycode.SHIFT)
-
-        if not event & EVENT_SINGLE_PRESS:
-            return
+    # lets the key engine fire single presses without waiting on keys
+    # that have no double press
+    def handledEvents(self, index):
+        return self.keymap.handledEvents(index)
 
-        if index == 0:
-            self.keyboard.send(Keycode.Q)
-        elif index == 1:
-            self.keyboard.send(Keycode.W)
-        elif index == 2:
-            self.keyboard.send(Keycode.E)
-        elif index == 3:
-            self.keyboard.send(Keycode.R)
-        elif index == 4:
-            self.keyboard.send(Keycode.ONE)
-        elif index == 5:
-            self.keyboard.send(Keycode.TWO)
-        elif index == 6:
-            self.keyboard.send(Keycode.THREE)
-        elif index == 7:
-            self.keyboard.send(Keycode.T)
-            time.sleep(0.01)
-            self.keyboard.send(Keycode.T)
-        # elif index == 8:
-        #     self.keyboard.send(Keycode.FOUR)
-        elif index == 9:
-            self.keyboard.send(Keycode.FIVE)
-        elif index == 10:
-            self.keyboard.send(Keycode.SIX)
-        elif index == 11:
-            self.keyboard.send(Keycode.F4) #Shop for now, Get next item and add to
-        elif index == 12:
-            self.keyboard.send(Keycode.F5) #QuickBuy
-        elif index == 13:
-            self.keyboard.send(Keycode.F1) #Focus Hero
-        elif index == 14:
-            self.keyboard.send(Keycode.F2) #Controlled Units
+    def handleEvent(self, index, event):
+        self.keymap.handleEvent(index, event)
     #------------------------
@@ -1,6 +1,7 @@
 import time
 from constants import *
 from adafruit_hid.keycode import Keycode
+from keymap import *
 
 class TeamsKeypad():
     #--- OPTIONAL METHODS ---
@@ -12,15 +13,17 @@ class TeamsKeypad():
             index = (frame * 4) + row
             self.setKeyColour(index, self.IMAGE[index])
 
-    def teamsMicToggle(self):
-        self.keyboard.send(Keycode.COMMAND, Keycode.SHIFT, Keycode.M)
-    def teamsCameraToggle(self):
-        self.keyboard.send(Keycode.COMMAND, Keycode.SHIFT, Keycode.O)
-    def teamsHangUp(self):
-        self.keyboard.send(Keycode.COMMAND, Keycode.SHIFT, Keycode.B)
+    def suspend(self):
+        self.keymap.suspend()
 
     #------------------------
     #--- REQUIRED METHODS ---
+    KEYMAP = (
+        (0, EVENT_SINGLE_PRESS, keys(Keycode.COMMAND, Keycode.SHIFT, Keycode.M)), # mic toggle
+        (1, EVENT_SINGLE_PRESS, keys(Keycode.COMMAND, Keycode.SHIFT, Keycode.O)), # camera toggle
+        (2, EVENT_SINGLE_PRESS, keys(Keycode.COMMAND, Keycode.SHIFT, Keycode.B))  # hang up
+    )
+
     IMAGE = [
             COLOUR_WHITE, COLOUR_WHITE, COLOUR_WHITE, COLOUR_WHITE,
             COLOUR_WHITE, COLOUR_INDIGO, COLOUR_INDIGO, COLOUR_INDIGO,
@@ -60,10 +63,12 @@ class TeamsKeypad():
             (darkVersion(self.IMAGE[15]), COLOUR_YELLOW)
         )
 
-    def __init__(self, keyboard, keyboardLayout, setKeyColour):
+    def __init__(self, keyboard, keyboardLayout, setKeyColour, macros = None):
         self.setKeyColour = setKeyColour
         self.keyboard = keyboard
         self.keyboardLayout= keyboardLayout
+        self.macros = macros
+        self.keymap = Keymap(keyboard, keyboardLayout, macros, self.KEYMAP)
 
     def introduce(self):
         self.resetColours(COLOUR_OFF)
@@ -79,14 +84,11 @@ class TeamsKeypad():
             elif len(colours) == BUTTON_COUNT:
                 self.setKeyColour(key, colours[key][0])
 
-    def handleEvent(self, index, event):
-        if not event & EVENT_SINGLE_PRESS:
-            return
+    # lets the key engine fire single presses without waiting on keys
+    # that have no double press
+    def handledEvents(self, index):
+        return self.keymap.handledEvents(index)
 
-        if index == 0:
-            self.teamsMicToggle()
-        elif index == 1:
-            self.teamsCameraToggle()
-        elif index == 2:
-            self.teamsHangUp()
+    def handleEvent(self, index, event):
+        self.keymap.handleEvent(index, event)
     #------------------------
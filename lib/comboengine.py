@@ -0,0 +1,135 @@
+from constants import *
+
+# Turns keys pressed together into combos. Sits between the KeyScanner and
+# the KeyStateMachine and works on the same bitmask of keys that are down:
+#
+#   keys = comboEngine.update(scanner.read(currentTime), currentTime)
+#   eventMask = keypadKeys.update(keys, currentTime)
+#
+# A keyconfig lists its combos as bitmasks through `comboMasks()` (a
+# Keymap with combos does this) and is told about them through
+# `handleCombo(mask, event)`: EVENT_KEY_DOWN | EVENT_SINGLE_PRESS once all
+# of a combo's keys are down, and EVENT_KEY_UP once they are all up again.
+#
+# A key that is part of some combo is held back for up to `window`
+# milliseconds after it goes down. If the keys held back make a combo they
+# are hidden from the KeyStateMachine until released, so they don't also
+# fire their own actions. If not, they are let through as ordinary
+# presses, late by at most the window. A combo fires as soon as its keys
+# are down unless a bigger combo could still be made from them, in which
+# case the window is waited out. Keys that are in no combo are never held
+# back, and with no combos at all `update` hands the mask straight back.
+#
+# The combos are kept in dicts keyed by mask, along with every part of
+# each combo, so working out what the held keys can still become is a
+# lookup however many combos there are.
+class ComboEngine():
+    def __init__(self, window = COMBO_WINDOW_MILLIS):
+        self.window = window
+        self.handler = None
+        self.combos = {}
+        # every non empty part of a combo, and the parts that are smaller
+        # than some combo they belong to
+        self.submasks = {}
+        self.extendable = {}
+        # keys that are in at least one combo
+        self.comboKeys = 0
+        self.lastDown = 0
+        # keys being held back, and when the first of them went down
+        self.pending = 0
+        self.windowStart = -1
+        # keys of fired combos, hidden until they are released
+        self.consumed = 0
+        # keys let go of while held back, shown as down for one scan
+        self.flash = 0
+        self.active = []
+        self.combosFired = 0
+
+    def setCombos(self, masks):
+        self.combos = {}
+        self.submasks = {}
+        self.extendable = {}
+        self.comboKeys = 0
+        for mask in masks:
+            self.combos[mask] = True
+            self.comboKeys |= mask
+            part = (mask - 1) & mask
+            while part:
+                self.submasks[part] = True
+                self.extendable[part] = True
+                part = (part - 1) & mask
+        for mask in masks:
+            self.submasks[mask] = True
+        self.pending = 0
+        self.active = []
+
+    # takes the combos of a keyconfig that has `comboMasks()` and
+    # `handleCombo(mask, event)`, or turns combos off for one that doesn't.
+    # Keys still hidden by a combo stay hidden until they are released.
+    def configureFor(self, keyconfig):
+        comboMasks = getattr(keyconfig, "comboMasks", None)
+        self.handler = getattr(keyconfig, "handleCombo", None)
+        if comboMasks is None or self.handler is None:
+            self.setCombos(())
+        else:
+            self.setCombos(comboMasks())
+
+    # returns the keys the KeyStateMachine should see as down
+    def update(self, downMask, currentTime):
+        if not self.comboKeys and not self.consumed:
+            self.lastDown = downMask
+            return downMask
+        changed = downMask ^ self.lastDown
+        if not changed and not self.pending and not self.flash:
+            return downMask & ~self.consumed
+        self.lastDown = downMask
+        self.flash = 0
+
+        released = changed & ~downMask
+        if released & self.consumed:
+            self.consumed &= ~released
+            self.finishCombos()
+        pressed = changed & downMask & self.comboKeys & ~self.consumed
+        if pressed:
+            if not self.pending:
+                self.windowStart = currentTime
+            self.pending |= pressed
+        if self.pending:
+            self.resolve(downMask, currentTime)
+        return (downMask & ~self.pending & ~self.consumed) | self.flash
+
+    def resolve(self, downMask, currentTime):
+        pending = self.pending
+        if pending & ~downMask or pending not in self.submasks:
+            # let go of too early, or can't be a combo any more
+            self.letThrough(downMask)
+        elif pending in self.combos and pending not in self.extendable:
+            self.fire(pending)
+        elif currentTime - self.windowStart >= self.window:
+            if pending in self.combos:
+                self.fire(pending)
+            else:
+                self.letThrough(downMask)
+
+    def letThrough(self, downMask):
+        self.flash |= self.pending & ~downMask
+        self.pending = 0
+
+    def fire(self, mask):
+        self.pending = 0
+        self.consumed |= mask
+        self.active.append(mask)
+        self.combosFired += 1
+        if self.handler is not None:
+            self.handler(mask, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS)
+
+    # combos whose keys have all been released
+    def finishCombos(self):
+        index = len(self.active) - 1
+        while index >= 0:
+            mask = self.active[index]
+            if not mask & self.consumed:
+                self.active.pop(index)
+                if self.handler is not None:
+                    self.handler(mask, EVENT_KEY_UP)
+            index -= 1
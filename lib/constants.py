@@ -1,11 +1,24 @@
 import time
 
 BUTTON_COUNT = 16
+KEY_MASK = (1 << BUTTON_COUNT) - 1
 
 DOUBLE_GAP = 250
 LONG_HOLD = 1000
 EXTRA_LONG_HOLD = 3000
 
+# how often the keypad expander is read even if its INT line stays quiet
+SCAN_WATCHDOG_MILLIS = 100
+# how many milliseconds a key has to read up before it is let go. Presses
+# go through at once.
+DEBOUNCE_MILLIS = 5
+# how long a key that is part of a combo waits for the rest of the combo
+COMBO_WINDOW_MILLIS = 50
+# how long a tap-hold key has to be held before it counts as held
+TAPPING_TERM = 200
+# a tap-hold key counts as held as soon as another key goes down under it
+HOLD_ON_OTHER_KEY_PRESS = True
+
 EVENT_NONE             = 0x00
 EVENT_SINGLE_PRESS     = 0x01
 EVENT_DOUBLE_PRESS     = 0x02
@@ -13,8 +26,22 @@ EVENT_LONG_PRESS       = 0x04
 EVENT_EXTRA_LONG_PRESS = 0x08
 EVENT_KEY_DOWN         = 0x10
 EVENT_KEY_UP           = 0x20
+# tap-hold keys only: held past the tapping term, and let go of after that
+EVENT_HOLD             = 0x40
+EVENT_HOLD_RELEASE     = 0x80
 
 KEYBOARD_DELAY = 0.2
+KEYBOARD_DELAY_MILLIS = 200
+MACRO_CHARS_PER_LOOP = 8
+# share HID reports between typed characters, see FastKeyboardLayout
+# and compileMacro. Off unless the host is known to read a report's keys
+# in slot order (Linux and Windows do, macOS isn't known to).
+MACRO_FAST_TYPE = False
+# use the N key rollover keyboard when boot.py has set it up
+USE_NKRO = True
+# RAM the display may spend keeping built wallpapers around
+WALLPAPER_CACHE_BYTES = 40000
+
 ANIMATION_FRAME = 0.15
 ANIMATION_WAIT = 0.25
 ANIMATION_FRAME_MILLIS = 50
@@ -0,0 +1,83 @@
+from constants import *
+
+# Debounces every key of the keypad at once with vertical counters, working
+# on the bitmask of keys a scan read rather than key by key.
+#
+#   debouncer = Debouncer(DEBOUNCE_MILLIS)
+#   keys = debouncer.update(rawKeys, currentTime)
+#
+# A switch only bounces once it has started to move, so a key that reads
+# down is taken as pressed straight away and a press costs no latency. It
+# is only let go once it has read up for `millis` milliseconds in a row,
+# by the clock rather than by the number of scans, so a slow loop doesn't
+# stretch it. A key that bounces back down before then stays pressed, so
+# bounce can't make a KEY_DOWN / KEY_UP pair or a double press. With
+# `millis` of 0 keys are let go as soon as they read up.
+#
+# Each key reading up has a counter of the milliseconds since it was first
+# read up. The counters are stored sideways: `planes[n]` holds bit n of
+# every key's counter, so adding the time since the last scan to all of
+# them and finding those that reached `millis` is a few bitwise operations
+# per plane, the same every scan whatever the number of keys.
+class Debouncer():
+    def __init__(self, millis = DEBOUNCE_MILLIS):
+        self.millis = millis
+        # a counter is below `millis` before a scan adds at most `millis`
+        self.planes = [0] * (2 * millis).bit_length()
+        # -1 for the planes whose bit of `millis` is set, 0 for the others
+        self.target = [ -((millis >> plane) & 1) for plane in range(len(self.planes)) ]
+        self.state = 0
+        # keys that are pressed in `state` but read up
+        self.releasing = 0
+        self.lastMillis = 0
+
+    def reset(self, state = 0):
+        for plane in range(len(self.planes)):
+            self.planes[plane] = 0
+        self.state = state
+        self.releasing = 0
+
+    # true while some key is yet to settle on what was last read for it
+    def isSettling(self, raw):
+        return bool(raw ^ self.state)
+
+    # returns the debounced keys for the raw bitmask read on this scan
+    def update(self, raw, currentTime):
+        elapsed = currentTime - self.lastMillis
+        self.lastMillis = currentTime
+        state = self.state | raw
+        releasing = state & ~raw
+        if not releasing and not self.releasing:
+            self.state = state
+            return state
+
+        planes = self.planes
+        target = self.target
+        # keys that read up on the last scan too count on, the others start
+        # again from 0
+        counting = releasing & self.releasing
+        if elapsed > self.millis:
+            elapsed = self.millis
+        # add `elapsed` to the counting keys' counters, carrying from plane
+        # to plane, and compare them with `millis` from the top plane down
+        carry = 0
+        for plane in range(len(planes)):
+            bits = planes[plane] & counting
+            add = -((elapsed >> plane) & 1) & counting
+            planes[plane] = bits ^ add ^ carry
+            carry = (bits & add) | (carry & (bits ^ add))
+        above = 0
+        equal = -1
+        for plane in range(len(planes) - 1, -1, -1):
+            bits = planes[plane]
+            above |= equal & bits & ~target[plane]
+            equal &= ~(bits ^ target[plane])
+        reached = releasing & (above | equal)
+
+        state &= ~reached
+        releasing &= ~reached
+        for plane in range(len(planes)):
+            planes[plane] &= releasing
+        self.releasing = releasing
+        self.state = state
+        return state
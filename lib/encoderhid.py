@@ -0,0 +1,102 @@
+from adafruit_hid.consumer_control_code import ConsumerControlCode
+
+# Turns a RotaryEncoder into volume or scroll wheel input. The encoder is
+# read on every call to `loop`, and what it turned is added up and sent as
+# at most one report a loop and one every `reportMillis`, so a fast spin
+# doesn't flood the USB bus with a report per detent:
+#
+#   ENCODER_VOLUME : one VOLUME_INCREMENT / VOLUME_DECREMENT a loop. A
+#                    consumer report has no size, so the steps still go
+#                    one at a time; the rest wait for the next loops, up
+#                    to `maxBacklog` of them in all.
+#   ENCODER_SCROLL : one Mouse.move(wheel = n) a loop, with n held to the
+#                    report's -127 to 127. Anything over that is sent on
+#                    the next loops, up to `maxScroll` wheel clicks in all.
+#
+#   encoderHid = EncoderHid(RotaryEncoder(), consumerControl, mouse)
+#   while True:
+#       encoderHid.loop()
+#
+# The encoder's acceleration applies, so a flick scrolls further than the
+# same number of slow clicks.
+ENCODER_VOLUME = 0
+ENCODER_SCROLL = 1
+
+WHEEL_MAX = 127
+VOLUME_BACKLOG = 16
+# four reports' worth of wheel clicks
+SCROLL_BACKLOG = 4 * WHEEL_MAX
+# about the host's polling interval, sending faster only queues reports
+ENCODER_REPORT_MILLIS = 8
+
+class EncoderHid():
+    def __init__(self, encoder, consumerControl = None, mouse = None, mode = ENCODER_VOLUME,
+                 scrollScale = -1, maxBacklog = VOLUME_BACKLOG, reportMillis = ENCODER_REPORT_MILLIS,
+                 maxScroll = SCROLL_BACKLOG):
+        self.encoder = encoder
+        self.consumerControl = consumerControl
+        self.mouse = mouse
+        # wheel clicks a step, negative so clockwise scrolls down
+        self.scrollScale = scrollScale
+        self.maxBacklog = maxBacklog
+        self.maxScroll = maxScroll
+        self.reportMillis = reportMillis
+        self.lastReportMillis = -reportMillis
+        # volume steps, or wheel clicks, turned but not sent yet
+        self.pending = 0
+        self.reports = 0
+        self.setMode(mode)
+
+    def setMode(self, mode):
+        if mode == ENCODER_VOLUME and self.consumerControl is None:
+            raise ValueError("Volume needs a ConsumerControl")
+        if mode == ENCODER_SCROLL and self.mouse is None:
+            raise ValueError("Scrolling needs a Mouse")
+        self.mode = mode
+        self.pending = 0
+
+    # reads the encoder and sends at most one report
+    def loop(self, currentTime = None):
+        if currentTime is None:
+            currentTime = self.encoder.timeInMillis()
+        self.encoder.update(currentTime)
+        delta = self.encoder.takeDelta()
+        if self.mode == ENCODER_VOLUME:
+            # capped as it is turned, so steps piling up between reports
+            # can't get past it either
+            pending = self.pending + delta
+            if pending > self.maxBacklog:
+                pending = self.maxBacklog
+            elif pending < -self.maxBacklog:
+                pending = -self.maxBacklog
+            if currentTime - self.lastReportMillis < self.reportMillis:
+                self.pending = pending
+                return
+            if pending > 0:
+                self.consumerControl.send(ConsumerControlCode.VOLUME_INCREMENT)
+                pending -= 1
+            elif pending < 0:
+                self.consumerControl.send(ConsumerControlCode.VOLUME_DECREMENT)
+                pending += 1
+            else:
+                return
+        else:
+            # capped the same way as the volume backlog
+            pending = self.pending + delta * self.scrollScale
+            if pending > self.maxScroll:
+                pending = self.maxScroll
+            elif pending < -self.maxScroll:
+                pending = -self.maxScroll
+            if not pending or currentTime - self.lastReportMillis < self.reportMillis:
+                self.pending = pending
+                return
+            wheel = pending
+            if wheel > WHEEL_MAX:
+                wheel = WHEEL_MAX
+            elif wheel < -WHEEL_MAX:
+                wheel = -WHEEL_MAX
+            self.mouse.move(wheel = wheel)
+            pending -= wheel
+        self.pending = pending
+        self.lastReportMillis = currentTime
+        self.reports += 1
@@ -0,0 +1,76 @@
+from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
+from adafruit_hid.keycode import Keycode
+
+# a boot keyboard report has room for six regular keys
+MAX_BATCH = 6
+
+# KeyboardLayoutUS with a fast mode for `write`. Normally each character is
+# sent as its own press and release, with an extra report to press SHIFT
+# for shifted characters. With `fast` up to six consecutive characters
+# with the same shift state and no repeated keys are pressed in a single
+# report, in the order they appear in the string, and SHIFT stays held
+# across a run of shifted characters.
+#
+# Hosts that read a report's key slots in order (Linux and Windows do) type
+# the same text with far fewer reports. Others may type the characters of
+# a report in any order, so only use it for a host known to read them in
+# order (MACRO_FAST_TYPE). `reportsSaved` counts the reports fast mode has
+# not had to send.
+class FastKeyboardLayout(KeyboardLayoutUS):
+    def __init__(self, keyboard):
+        super().__init__(keyboard)
+        self.reportsSaved = 0
+        # reused to collect the keys for one report
+        self.batch = bytearray(MAX_BATCH)
+
+    def write(self, string, fast = False):
+        if fast:
+            self.writeBatched(string)
+        else:
+            super().write(string)
+
+    def writeBatched(self, string):
+        batch = self.batch
+        count = 0
+        shifted = False
+        reports = 0
+        unbatched = 0
+        for char in string:
+            keycode = self._char_to_keycode(char)
+            charShifted = bool(keycode & self.SHIFT_FLAG)
+            keycode &= ~self.SHIFT_FLAG
+            unbatched += 3 if charShifted else 2
+            if count and (count == MAX_BATCH or charShifted != shifted or self.inBatch(keycode, count)):
+                reports += self.sendBatch(count, shifted, charShifted)
+                count = 0
+            batch[count] = keycode
+            count += 1
+            shifted = charShifted
+        if count:
+            reports += self.sendBatch(count, shifted, False)
+        self.reportsSaved += unbatched - reports
+
+    # whether `keycode` is one of the first `count` keys in the batch. Not
+    # `in`, which CircuitPython can't do on a bytearray, and no slice
+    # allocated every character.
+    def inBatch(self, keycode, count):
+        batch = self.batch
+        for index in range(count):
+            if batch[index] == keycode:
+                return True
+        return False
+
+    # presses and lets go of the first `count` keys in the batch, and
+    # returns the number of reports sent
+    def sendBatch(self, count, shifted, keepShift):
+        keys = self.batch[:count]
+        if shifted:
+            self.keyboard.press(Keycode.SHIFT, *keys)
+        else:
+            self.keyboard.press(*keys)
+        if shifted and keepShift:
+            # the next batch is shifted too, so leave SHIFT down
+            self.keyboard.release(*keys)
+        else:
+            self.keyboard.release_all()
+        return 2
@@ -0,0 +1,62 @@
+from constants import *
+
+# Builds each keyconfig once and keeps it, so swapping layouts hands back
+# the same instance (with whatever state it had) instead of a new one.
+#
+#   interfaces : a list of keyconfig classes, or of ("module", "ClassName")
+#                pairs such as ("keyconfig.dota", "DotAKeypad")
+#   arguments  : the arguments every keyconfig is constructed with
+#   lazy       : when True, a keyconfig given by name is not imported or
+#                built until it is first selected, so configurations that
+#                are never used cost no RAM. Otherwise everything is built
+#                straight away and the first swap is as quick as the rest.
+#
+# Keyconfigs can optionally define `suspend()`, called when another one is
+# selected (let go of held keys here), and `resume()`, called when they
+# are selected again.
+class KeyconfigRegistry():
+    def __init__(self, interfaces, arguments, lazy = False):
+        self.interfaces = list(interfaces)
+        self.arguments = arguments
+        self.instances = [None] * len(self.interfaces)
+        self.current = -1
+        if not lazy:
+            for index in range(len(self.interfaces)):
+                self.get(index)
+
+    def __len__(self):
+        return len(self.interfaces)
+
+    # the keyconfig at index, built the first time it is asked for
+    def get(self, index):
+        instance = self.instances[index]
+        if instance is None:
+            interface = self.interfaces[index]
+            if isinstance(interface, tuple):
+                interface = self.load(interface[0], interface[1])
+                self.interfaces[index] = interface
+            instance = interface(*self.arguments)
+            self.instances[index] = instance
+        return instance
+
+    def load(self, moduleName, className):
+        module = __import__(moduleName)
+        for part in moduleName.split(".")[1:]:
+            module = getattr(module, part)
+        return getattr(module, className)
+
+    def select(self, index):
+        if index == self.current:
+            return self.instances[index]
+        if self.current >= 0:
+            previous = self.instances[self.current]
+            if hasattr(previous, "suspend"):
+                previous.suspend()
+        instance = self.get(index)
+        self.current = index
+        if hasattr(instance, "resume"):
+            instance.resume()
+        return instance
+
+    def selectNext(self):
+        return self.select((self.current + 1) % len(self.interfaces))
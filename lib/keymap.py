@@ -0,0 +1,347 @@
+from constants import *
+from keystatemachine import BIT_INDEX
+from macrocompiler import *
+
+# A keymap is a table of actions indexed by key and event type, so a
+# keyconfig's behaviour can be written down as data instead of a ladder of
+# `if index == N` checks in `handleEvent`:
+#
+#   KEYMAP = (
+#       (0, EVENT_SINGLE_PRESS, keys(Keycode.COMMAND, Keycode.SHIFT, Keycode.M)),
+#       (8, EVENT_KEY_DOWN,     press(Keycode.SHIFT)),
+#       (8, EVENT_KEY_UP,       release(Keycode.SHIFT)),
+#   )
+#   self.keymap = Keymap(keyboard, keyboardLayout, macros, KEYMAP)
+#   ...
+#   def handleEvent(self, index, event):
+#       self.keymap.handleEvent(index, event)
+#
+# Every EVENT_* bit has its own slot, so dispatching an event is a few
+# table lookups however many keys are bound.
+#
+# Bindings can also go on layers above the base layer (0), QMK style. A
+# key takes its actions from the highest active layer that binds anything
+# on it, and falls through to the layers below otherwise. Layers are
+# turned on by keys bound to `momentary(layer)` (on while the key is held,
+# bind it to EVENT_KEY_DOWN | EVENT_KEY_UP) or `toggle(layer)`:
+#
+#   (15, EVENT_KEY_DOWN | EVENT_KEY_UP, momentary(1)),
+#   (0,  EVENT_SINGLE_PRESS,            keys(Keycode.F1), 1),
+#
+# A key bound on EVENT_HOLD or EVENT_HOLD_RELEASE becomes a tap-hold key
+# (see POLICY_TAP_HOLD): one action when tapped, another while held. The
+# hold can be a modifier or a layer:
+#
+#   (8, EVENT_SINGLE_PRESS, keys(Keycode.FOUR)),
+#   (8, EVENT_HOLD,         press(Keycode.SHIFT)),
+#   (8, EVENT_HOLD_RELEASE, release(Keycode.SHIFT)),
+#   (9, EVENT_HOLD | EVENT_HOLD_RELEASE, momentary(1)),
+#
+# Changing layers only refreshes a small per key lookup of which layer
+# answers for it; nothing is built and nothing is redrawn. The layer a key
+# was pressed on keeps answering for it until it is pressed again, so a
+# key released after its layer turns off still lets go of what it held.
+#
+# Keys pressed together can be bound as combos, which a ComboEngine picks
+# out of the scanned keys before they reach the KeyStateMachine. A combo
+# gets EVENT_KEY_DOWN and EVENT_SINGLE_PRESS when its keys are all down
+# and EVENT_KEY_UP when they are all released. Every press of a key in a
+# combo waits up to COMBO_WINDOW_MILLIS for the rest, so keep combos off
+# keys that have to answer at once:
+#
+#   COMBOS = (
+#       ((0, 1), EVENT_SINGLE_PRESS, keys(Keycode.ESCAPE)),
+#   )
+#   self.keymap = Keymap(keyboard, keyboardLayout, macros, KEYMAP, combos = COMBOS)
+#   ...
+#   def comboMasks(self):
+#       return self.keymap.comboMasks()
+#
+#   def handleCombo(self, mask, event):
+#       self.keymap.handleCombo(mask, event)
+
+ACTION_KEYS     = 0 # press and release keycodes together, leaving other held keys down
+ACTION_PRESS    = 1 # press and hold keycodes
+ACTION_RELEASE  = 2 # let go of held keycodes
+ACTION_CONSUMER = 3 # a ConsumerControlCode
+ACTION_MACRO    = 4 # text, a compiled stream, or a tuple of MacroScheduler steps
+ACTION_CALL     = 5 # any function taking no arguments
+ACTION_MOMENTARY = 6 # a layer that is on while the key is held
+ACTION_TOGGLE    = 7 # a layer that is switched on and off
+
+MAX_LAYERS = 8
+
+# one slot per bit of an EVENT_* byte
+EVENT_SLOTS = 8
+
+def keys(*keycodes):
+    return (ACTION_KEYS, keycodes)
+
+def press(*keycodes):
+    return (ACTION_PRESS, keycodes)
+
+def release(*keycodes):
+    return (ACTION_RELEASE, keycodes)
+
+def consumer(consumerCode):
+    return (ACTION_CONSUMER, consumerCode)
+
+def macro(value):
+    return (ACTION_MACRO, value)
+
+def call(function):
+    return (ACTION_CALL, function)
+
+def momentary(layer):
+    return (ACTION_MOMENTARY, layer)
+
+def toggle(layer):
+    return (ACTION_TOGGLE, layer)
+
+# the bitmask of a combo's keys
+def comboMask(comboKeys):
+    mask = 0
+    for key in comboKeys:
+        mask |= 1 << key
+    return mask
+
+class Keymap():
+    def __init__(self, keyboard, keyboardLayout, macros, bindings = (), keyCount = BUTTON_COUNT, combos = ()):
+        self.keyboard = keyboard
+        self.keyboardLayout = keyboardLayout
+        self.macros = macros
+        self.keyCount = keyCount
+        # per layer: the action table, the EVENT_* bits each key handles and
+        # a bitmask of the keys with any binding
+        self.layerActions = []
+        self.layerMasks = []
+        self.layerKeys = []
+        # masks[key] holds the EVENT_* bits the key handles on any layer
+        self.masks = bytearray(keyCount)
+        self.momentaryLayers = 0
+        self.toggledLayers = 0
+        self.activeLayers = 1
+        # the layer answering for each key now, and when it was last pressed
+        self.keyLayer = bytearray(keyCount)
+        self.pressLayer = bytearray(keyCount)
+        # called with the active layer mask whenever it changes
+        self.onLayerChange = None
+        # per combo mask: its action table and the EVENT_* bits it handles
+        self.comboActions = {}
+        self.comboEvents = {}
+        self.addLayer()
+        self.load(bindings)
+        self.loadCombos(combos)
+
+    def addLayer(self):
+        if len(self.layerActions) >= MAX_LAYERS:
+            raise ValueError("A keymap can have at most " + str(MAX_LAYERS) + " layers")
+        self.layerActions.append([None] * (self.keyCount * EVENT_SLOTS))
+        self.layerMasks.append(bytearray(self.keyCount))
+        self.layerKeys.append(0)
+        return len(self.layerActions) - 1
+
+    # replaces every binding with the (key, event, action) or
+    # (key, event, action, layer) entries given
+    def load(self, bindings):
+        del self.layerActions[1:]
+        del self.layerMasks[1:]
+        del self.layerKeys[1:]
+        actions = self.layerActions[0]
+        for slot in range(len(actions)):
+            actions[slot] = None
+        for key in range(self.keyCount):
+            self.masks[key] = 0
+            self.layerMasks[0][key] = 0
+            self.pressLayer[key] = 0
+        self.layerKeys[0] = 0
+        self.momentaryLayers = 0
+        self.toggledLayers = 0
+        for binding in bindings:
+            layer = binding[3] if len(binding) > 3 else 0
+            self.bind(binding[0], binding[1], binding[2], layer)
+        self.resolveLayers()
+
+    # binds an action to one or more EVENT_* bits of a key. Macro text is
+    # compiled to HID reports here rather than when the key is pressed.
+    #
+    # bind and unbind are meant for building the keymap. The KeyStateMachine
+    # picks each key's policy from `handledEvents` when the keyconfig is
+    # selected, so a binding changed after that only takes effect with
+    # `keypadKeys.configureFor(keyconfig)` run again.
+    def bind(self, key, event, action, layer = 0):
+        self.validate(key, event, action)
+        self.checkLayer(key, layer)
+        if action[0] == ACTION_MACRO and isinstance(action[1], str):
+            action = (ACTION_MACRO, compileMacro(action[1], self.keyboardLayout))
+        while layer >= len(self.layerActions):
+            self.addLayer()
+        actions = self.layerActions[layer]
+        self.masks[key] |= event
+        self.layerMasks[layer][key] |= event
+        self.layerKeys[layer] |= 1 << key
+        while event:
+            bit = event & -event
+            event ^= bit
+            actions[key * EVENT_SLOTS + BIT_INDEX[bit]] = action
+        self.resolveLayers()
+
+    def unbind(self, key, event, layer = 0):
+        self.checkLayer(key, layer)
+        if layer >= len(self.layerMasks):
+            return
+        masks = self.layerMasks[layer]
+        masks[key] &= ~event
+        if not masks[key]:
+            self.layerKeys[layer] &= ~(1 << key)
+        self.masks[key] = 0
+        for layerMasks in self.layerMasks:
+            self.masks[key] |= layerMasks[key]
+        actions = self.layerActions[layer]
+        while event:
+            bit = event & -event
+            event ^= bit
+            actions[key * EVENT_SLOTS + BIT_INDEX[bit]] = None
+        self.resolveLayers()
+
+    # raises ValueError for a binding that could never work
+    def validate(self, key, event, action):
+        if key < 0 or key >= self.keyCount:
+            raise ValueError("Key " + str(key) + " is not between 0 and " + str(self.keyCount - 1))
+        if event <= 0 or event >= 1 << EVENT_SLOTS:
+            raise ValueError("Key " + str(key) + " has an unknown event " + str(event))
+        if not isinstance(action, tuple) or len(action) != 2:
+            raise ValueError("Key " + str(key) + " action must be made with keys(), press(), macro() etc.")
+        kind = action[0]
+        if kind == ACTION_CONSUMER and getattr(self.macros, "consumerControl", None) is None:
+            raise ValueError("Key " + str(key) + " sends a consumer code but there is no ConsumerControl")
+        if kind == ACTION_MACRO and self.macros is None:
+            raise ValueError("Key " + str(key) + " plays a macro but there is no MacroScheduler")
+        if kind == ACTION_CALL and not callable(action[1]):
+            raise ValueError("Key " + str(key) + " action is not callable")
+        if (kind == ACTION_MOMENTARY or kind == ACTION_TOGGLE) and not 0 < action[1] < MAX_LAYERS:
+            raise ValueError("Key " + str(key) + " switches to layer " + str(action[1]) + " which can't exist")
+        if kind < ACTION_KEYS or kind > ACTION_TOGGLE:
+            raise ValueError("Key " + str(key) + " has an unknown action type " + str(kind))
+
+    def checkLayer(self, key, layer):
+        if layer < 0 or layer >= MAX_LAYERS:
+            raise ValueError("Key " + str(key) + " is bound on layer " + str(layer) + " which can't exist")
+
+    # the EVENT_* bits a key does something with, on any layer
+    def handledEvents(self, key):
+        return self.masks[key]
+
+    #--- COMBOS ---
+    # replaces every combo with the (keys, event, action) entries given
+    def loadCombos(self, combos):
+        self.comboActions = {}
+        self.comboEvents = {}
+        for combo in combos:
+            self.bindCombo(combo[0], combo[1], combo[2])
+
+    def bindCombo(self, comboKeys, event, action):
+        if len(comboKeys) < 2:
+            raise ValueError("A combo needs at least two keys, not " + str(len(comboKeys)))
+        for key in comboKeys:
+            self.validate(key, event, action)
+        if action[0] == ACTION_MACRO and isinstance(action[1], str):
+            action = (ACTION_MACRO, compileMacro(action[1], self.keyboardLayout))
+        mask = comboMask(comboKeys)
+        if mask not in self.comboActions:
+            self.comboActions[mask] = [None] * EVENT_SLOTS
+            self.comboEvents[mask] = 0
+        actions = self.comboActions[mask]
+        self.comboEvents[mask] |= event
+        while event:
+            bit = event & -event
+            event ^= bit
+            actions[BIT_INDEX[bit]] = action
+
+    def comboMasks(self):
+        return tuple(self.comboActions)
+
+    def handleCombo(self, mask, event):
+        actions = self.comboActions.get(mask)
+        if actions is None:
+            return
+        event &= self.comboEvents[mask]
+        while event:
+            bit = event & -event
+            event ^= bit
+            self.run(actions[BIT_INDEX[bit]], bit)
+    #--------------
+
+    #--- LAYERS ---
+    def setLayer(self, layer, on, momentary = False):
+        bit = 1 << layer
+        if momentary:
+            self.momentaryLayers = (self.momentaryLayers | bit) if on else (self.momentaryLayers & ~bit)
+        else:
+            self.toggledLayers = (self.toggledLayers | bit) if on else (self.toggledLayers & ~bit)
+        self.resolveLayers()
+
+    def toggleLayer(self, layer):
+        self.setLayer(layer, not self.toggledLayers & (1 << layer))
+
+    # drops any momentary layers, for when the keyconfig is swapped out
+    # while a layer key is still held
+    def suspend(self):
+        self.momentaryLayers = 0
+        self.resolveLayers()
+
+    def isLayerActive(self, layer):
+        return bool(self.activeLayers & (1 << layer))
+
+    # works out which layer answers for each key
+    def resolveLayers(self):
+        active = 1 | self.momentaryLayers | self.toggledLayers
+        changed = active != self.activeLayers
+        self.activeLayers = active
+        layerKeys = self.layerKeys
+        for key in range(self.keyCount):
+            bit = 1 << key
+            layer = len(layerKeys) - 1
+            while layer > 0 and not ((active >> layer) & 1 and layerKeys[layer] & bit):
+                layer -= 1
+            self.keyLayer[key] = layer
+        if changed and self.onLayerChange is not None:
+            self.onLayerChange(active)
+    #--------------
+
+    def handleEvent(self, key, event):
+        if event & EVENT_KEY_DOWN:
+            self.pressLayer[key] = self.keyLayer[key]
+        layer = self.pressLayer[key]
+        event &= self.layerMasks[layer][key]
+        actions = self.layerActions[layer]
+        base = key * EVENT_SLOTS
+        while event:
+            bit = event & -event
+            event ^= bit
+            self.run(actions[base + BIT_INDEX[bit]], bit)
+
+    def run(self, action, event = EVENT_NONE):
+        kind, value = action
+        if kind == ACTION_KEYS:
+            # not `send`, whose release_all would let go of a held modifier
+            self.keyboard.press(*value)
+            self.keyboard.release(*value)
+        elif kind == ACTION_PRESS:
+            self.keyboard.press(*value)
+        elif kind == ACTION_RELEASE:
+            self.keyboard.release(*value)
+        elif kind == ACTION_CONSUMER:
+            self.macros.consumerControl.send(value)
+        elif kind == ACTION_MACRO:
+            if isinstance(value, tuple):
+                for step in value:
+                    self.macros.queue(step[0], step[1])
+            else:
+                self.macros.replay(value)
+        elif kind == ACTION_CALL:
+            value()
+        elif kind == ACTION_MOMENTARY:
+            self.setLayer(value, not event & (EVENT_KEY_UP | EVENT_HOLD_RELEASE), True)
+        elif kind == ACTION_TOGGLE:
+            self.toggleLayer(value)
@@ -17,6 +17,15 @@ class KeypadInterface():
                     self.setKeyColour(button, currentColour)
                 currentIndex-=1
                 currentColourIndex+=1
+
+    # called when another configuration is swapped in. Let go of anything
+    # this configuration is holding down.
+    def suspend(self):
+        pass
+
+    # called when this configuration is swapped back in
+    def resume(self):
+        pass
     #------------------------
     #--- REQUIRED METHODS ---
 
@@ -53,10 +62,11 @@ class KeypadInterface():
                     self.startAnimationTime = -1
                     self.resetColours(self.getKeyColours())
 
-    def __init__(self, keyboard, keyboardLayout, setKeyColour):
+    def __init__(self, keyboard, keyboardLayout, setKeyColour, macros = None):
         self.setKeyColour = setKeyColour
         self.keyboard = keyboard
         self.keyboardLayout= keyboardLayout
+        self.macros = macros
         self.startAnimationTime = -1
 
     # does the animation for the keys
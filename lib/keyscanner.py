@@ -0,0 +1,71 @@
+from constants import *
+
+# Reads the keypad's I2C IO expander (the TCA9555 at 0x20).
+#
+# The expander pulls its INT line low whenever one of its inputs changes
+# and releases it again once the input registers have been read. When an
+# interrupt pin is given the bus is only read after such an edge, so an
+# idle keypad costs one pin read per loop instead of a full I2C
+# transaction. A watchdog read every `watchdogMillis` covers a missed edge.
+#
+#   device       : anything with write() / readinto() that can be used in
+#                  a `with` block (an I2CDevice, or a simulated expander)
+#   interruptPin : an input with a pull up wired to INT, or None to read
+#                  the expander on every call (the old polling behaviour)
+#   debouncer    : a Debouncer the keys go through, or None for raw keys
+#
+# The expander raises INT on every change, bounces included, so between
+# edges the last bus read is still what the keys read. While the debouncer
+# is settling it is fed that instead of reading the bus again.
+class KeyScanner():
+    def __init__(self, device, interruptPin = None, watchdogMillis = SCAN_WATCHDOG_MILLIS, debouncer = None):
+        self.device = device
+        self.interruptPin = interruptPin
+        self.watchdogMillis = watchdogMillis
+        self.debouncer = debouncer
+        self.lastReadMillis = -1
+        # bitmask of the pressed keys, bit n set when key n is down
+        self.state = 0
+        # the keys as last read from the bus, before debouncing
+        self.raw = 0
+        # bits that flipped on the last bus read
+        self.changed = 0
+        # reused for every read so scanning allocates nothing
+        self.command = bytes([0x0])
+        self.buffer = bytearray(2)
+        # counters so the saving can be seen on the serial console
+        self.busReads = 0
+        self.skippedReads = 0
+
+    # INT is active low and stays low until the inputs are read
+    def hasInterrupt(self):
+        return self.interruptPin is None or not self.interruptPin.value
+
+    def readDevice(self):
+        with self.device:
+            self.device.write(self.command)
+            self.device.readinto(self.buffer)
+        self.busReads += 1
+        return self.buffer[0] | self.buffer[1] << 8
+
+    # returns the pressed keys as a bitmask, bit n set when key n is down
+    def read(self, currentTime = None):
+        if currentTime is None:
+            currentTime = timeInMillis()
+        debouncer = self.debouncer
+        if not self.hasInterrupt() and self.lastReadMillis >= 0 \
+                and currentTime - self.lastReadMillis < self.watchdogMillis:
+            self.skippedReads += 1
+            if debouncer is None or not debouncer.isSettling(self.raw):
+                self.changed = 0
+                return self.state
+        else:
+            self.lastReadMillis = currentTime
+            # the inputs are pulled up, so a pressed key reads as 0
+            self.raw = ~self.readDevice() & KEY_MASK
+        state = self.raw
+        if debouncer is not None:
+            state = debouncer.update(state, currentTime)
+        self.changed = state ^ self.state
+        self.state = state
+        return state
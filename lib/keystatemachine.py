@@ -0,0 +1,283 @@
+from array import array
+from constants import *
+
+# maps a single set bit to its key index, so the set bits of a mask can
+# be walked without looping over every key
+BIT_INDEX = {}
+for _bit in range(32):
+    BIT_INDEX[1 << _bit] = _bit
+
+# Table driven replacement for `checkButton`. Instead of being called once
+# per key, `update` is called once per scan with a bitmask of the keys that
+# are down and the time of the scan. All state lives in preallocated
+# arrays and bitmasks, and only keys that changed or are waiting to be
+# resolved (single press vs double press) are looked at, so an idle keypad
+# costs a couple of integer operations.
+#
+# With the default POLICY_WAIT_DOUBLE the events produced are exactly the
+# EVENT_* bitmasks `checkButton` gives, which tests/test_keystatemachine.py
+# checks on random traces.
+# Times are stored in an array('l'), so they need to fit in 31 bits of
+# milliseconds (about 24 days of uptime).
+#
+# Each key also has a timing policy, which decides when its single press
+# fires:
+#   POLICY_WAIT_DOUBLE : DOUBLE_GAP after the key goes up, unless a second
+#                        press makes it a double press (checkButton's way)
+#   POLICY_ON_UP       : as soon as the key goes up; long and extra long
+#                        presses still work
+#   POLICY_ON_DOWN     : with EVENT_KEY_DOWN, for keys that only have a
+#                        single press. No double or long presses.
+#   POLICY_TAP_HOLD    : a tap-hold key. Let go of within the tapping term
+#                        it is a tap, EVENT_SINGLE_PRESS with EVENT_KEY_UP.
+#                        Held past it, or while another key goes down when
+#                        `holdOnOtherKeyPress` is set, it gets EVENT_HOLD,
+#                        and EVENT_HOLD_RELEASE with its EVENT_KEY_UP. The
+#                        keys that turned into holds on a scan are in
+#                        `holdMask`; dispatch them first so a key pressed
+#                        under a modifier gets the modifier.
+# `usePoliciesFor(keyconfig)` picks the fastest policy that still gives
+# each key every event its keyconfig handles.
+#
+# The double press gap and the long and extra long hold times are kept
+# per key as well. A keyconfig can set its own with a TIMINGS tuple of
+# (doubleGap, longHold, extraLongHold) in milliseconds, and override
+# single keys with a KEY_TIMINGS dict of {key: (doubleGap, longHold,
+# extraLongHold)}. Anything not given uses DOUBLE_GAP, LONG_HOLD and
+# EXTRA_LONG_HOLD. `configureFor(keyconfig)` applies both. A fourth value,
+# the tapping term, is only used by tap-hold keys and defaults to
+# TAPPING_TERM; HOLD_ON_OTHER_KEY_PRESS can be set on the keyconfig too.
+#
+# `longHoldFeedback(downMillis, longHold, extraLongHold)` is called every
+# scan with when the lowest held key that has a long or extra long press
+# went down, and that key's hold times, 0 for one it has no press for.
+# Keys with neither, and scans with no such key held, get (0, 0, 0).
+POLICY_WAIT_DOUBLE = 0
+POLICY_ON_UP       = 1
+POLICY_ON_DOWN     = 2
+POLICY_TAP_HOLD    = 3
+
+class KeyStateMachine():
+    def __init__(self, keyCount = BUTTON_COUNT, longHoldFeedback = None):
+        self.keyCount = keyCount
+        self.longHoldFeedback = longHoldFeedback
+        self.downMillis = array('l', [-1] * keyCount)
+        self.lastUpMillis = array('l', [-1] * keyCount)
+        # events[key] is the EVENT_* bitmask for the last scan
+        self.events = bytearray(keyCount)
+        self.downMask = 0
+        self.waitingMask = 0
+        self.eventMask = 0
+        # keys using POLICY_ON_DOWN / POLICY_ON_UP, everything else waits
+        self.onDownMask = 0
+        self.onUpMask = 0
+        # tap-hold keys, those down and not yet a tap or a hold, those held,
+        # and those that became holds on the last scan
+        self.tapHoldMask = 0
+        self.undecidedMask = 0
+        self.heldMask = 0
+        self.holdMask = 0
+        # keys that have a long / extra long press, for longHoldFeedback
+        self.longPressMask = (1 << keyCount) - 1
+        self.extraLongPressMask = (1 << keyCount) - 1
+        self.holdOnOtherKeyPress = HOLD_ON_OTHER_KEY_PRESS
+        self.doubleGap = array('l', [DOUBLE_GAP] * keyCount)
+        self.longHold = array('l', [LONG_HOLD] * keyCount)
+        self.extraLongHold = array('l', [EXTRA_LONG_HOLD] * keyCount)
+        self.tappingTerm = array('l', [TAPPING_TERM] * keyCount)
+
+    def configureFor(self, keyconfig):
+        self.usePoliciesFor(keyconfig)
+        self.useTimingsFor(keyconfig)
+
+    def setTimings(self, key, timings):
+        self.doubleGap[key] = timings[0]
+        self.longHold[key] = timings[1]
+        self.extraLongHold[key] = timings[2]
+        self.tappingTerm[key] = timings[3] if len(timings) > 3 else TAPPING_TERM
+
+    def useTimingsFor(self, keyconfig):
+        timings = getattr(keyconfig, "TIMINGS", (DOUBLE_GAP, LONG_HOLD, EXTRA_LONG_HOLD))
+        keyTimings = getattr(keyconfig, "KEY_TIMINGS", {})
+        for key in range(self.keyCount):
+            self.setTimings(key, keyTimings.get(key, timings))
+        self.holdOnOtherKeyPress = getattr(keyconfig, "HOLD_ON_OTHER_KEY_PRESS", HOLD_ON_OTHER_KEY_PRESS)
+
+    def setPolicy(self, key, policy):
+        bit = 1 << key
+        self.onDownMask &= ~bit
+        self.onUpMask &= ~bit
+        self.tapHoldMask &= ~bit
+        self.undecidedMask &= ~bit
+        self.heldMask &= ~bit
+        self.longPressMask |= bit
+        self.extraLongPressMask |= bit
+        if policy == POLICY_ON_DOWN or policy == POLICY_TAP_HOLD:
+            self.longPressMask &= ~bit
+            self.extraLongPressMask &= ~bit
+        if policy == POLICY_ON_DOWN:
+            self.onDownMask |= bit
+        elif policy == POLICY_ON_UP:
+            self.onUpMask |= bit
+        elif policy == POLICY_TAP_HOLD:
+            self.tapHoldMask |= bit
+
+    def getPolicy(self, key):
+        bit = 1 << key
+        if self.onDownMask & bit:
+            return POLICY_ON_DOWN
+        if self.onUpMask & bit:
+            return POLICY_ON_UP
+        if self.tapHoldMask & bit:
+            return POLICY_TAP_HOLD
+        return POLICY_WAIT_DOUBLE
+
+    # keyconfigs that can say which events each key handles, through
+    # `handledEvents(key)`, get the quickest policy for each key. Anything
+    # else keeps waiting for double presses everywhere.
+    def usePoliciesFor(self, keyconfig):
+        handledEvents = getattr(keyconfig, "handledEvents", None)
+        for key in range(self.keyCount):
+            if handledEvents is None:
+                self.setPolicy(key, POLICY_WAIT_DOUBLE)
+                continue
+            handled = handledEvents(key)
+            self.setPolicy(key, policyFor(handled))
+            if not handled & EVENT_LONG_PRESS:
+                self.longPressMask &= ~(1 << key)
+            if not handled & EVENT_EXTRA_LONG_PRESS:
+                self.extraLongPressMask &= ~(1 << key)
+
+    # whether the key is up with no events still to come
+    def isIdle(self, key):
+        return not (self.downMask | self.waitingMask | self.undecidedMask) & (1 << key)
+
+    # returns a mask of the keys that have an event in `events`. Only the
+    # bits that differ from the previous scan's `downMask` are processed.
+    def update(self, downMask, currentTime):
+        events = self.events
+        mask = self.eventMask
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            events[BIT_INDEX[bit]] = EVENT_NONE
+        self.eventMask = 0
+        self.holdMask = 0
+
+        changed = downMask ^ self.downMask
+        pending = changed | self.waitingMask | self.undecidedMask
+        if not pending:
+            if downMask and self.longHoldFeedback is not None:
+                self.feedback()
+            return 0
+
+        downMillis = self.downMillis
+        lastUpMillis = self.lastUpMillis
+        waiting = self.waitingMask
+        eventMask = 0
+        tapHold = self.tapHoldMask
+        undecided = self.undecidedMask
+        # keys going down now, which turn undecided tap-hold keys into holds
+        pressed = (changed & downMask) if undecided and self.holdOnOtherKeyPress else 0
+        while pending:
+            bit = pending & -pending
+            pending ^= bit
+            index = BIT_INDEX[bit]
+            event = EVENT_NONE
+            lengthDown = -1
+
+            if tapHold & bit:
+                if changed & bit:
+                    if downMask & bit:
+                        downMillis[index] = currentTime
+                        undecided |= bit
+                        event |= EVENT_KEY_DOWN
+                    else:
+                        downMillis[index] = -1
+                        event |= EVENT_KEY_UP
+                        if undecided & bit:
+                            undecided &= ~bit
+                            event |= EVENT_SINGLE_PRESS
+                        elif self.heldMask & bit:
+                            self.heldMask &= ~bit
+                            event |= EVENT_HOLD_RELEASE
+                elif undecided & bit and (pressed & ~bit or currentTime - downMillis[index] >= self.tappingTerm[index]):
+                    undecided &= ~bit
+                    self.heldMask |= bit
+                    self.holdMask |= bit
+                    event |= EVENT_HOLD
+            elif changed & bit:
+                if downMask & bit:
+                    downMillis[index] = currentTime
+                    event |= EVENT_KEY_DOWN
+                    if self.onDownMask & bit:
+                        event |= EVENT_SINGLE_PRESS
+                else:
+                    event |= EVENT_KEY_UP
+                    if self.onDownMask & bit:
+                        # fast path: nothing to time on this key
+                        downMillis[index] = -1
+                    else:
+                        lengthDown = currentTime - downMillis[index]
+                        lengthUp = currentTime - lastUpMillis[index]
+                        lastUpMillis[index] = currentTime
+                        downMillis[index] = -1
+                        if self.onUpMask & bit:
+                            if lengthDown >= self.extraLongHold[index]:
+                                event |= EVENT_EXTRA_LONG_PRESS
+                            elif lengthDown >= self.longHold[index]:
+                                event |= EVENT_LONG_PRESS
+                            else:
+                                event |= EVENT_SINGLE_PRESS
+                        elif lengthUp < self.doubleGap[index]:
+                            # double press
+                            waiting &= ~bit
+                            event |= EVENT_DOUBLE_PRESS
+                        else:
+                            waiting |= bit
+
+            if waiting & bit:
+                if lengthDown >= self.extraLongHold[index]:
+                    waiting &= ~bit
+                    event |= EVENT_EXTRA_LONG_PRESS
+                elif lengthDown >= self.longHold[index]:
+                    waiting &= ~bit
+                    event |= EVENT_LONG_PRESS
+                elif currentTime - lastUpMillis[index] >= self.doubleGap[index]:
+                    waiting &= ~bit
+                    event |= EVENT_SINGLE_PRESS
+
+            if event:
+                events[index] = event
+                eventMask |= bit
+
+        self.waitingMask = waiting
+        self.undecidedMask = undecided
+        self.downMask = downMask
+        self.eventMask = eventMask
+        if self.longHoldFeedback is not None:
+            self.feedback()
+        return eventMask
+
+    # reports when the lowest held key with a long or extra long press went
+    # down and its hold times, or zeros when no such key is held
+    def feedback(self):
+        held = self.downMask & (self.longPressMask | self.extraLongPressMask)
+        if not held:
+            self.longHoldFeedback(0, 0, 0)
+            return
+        bit = held & -held
+        index = BIT_INDEX[bit]
+        self.longHoldFeedback(self.downMillis[index],
+                              self.longHold[index] if self.longPressMask & bit else 0,
+                              self.extraLongHold[index] if self.extraLongPressMask & bit else 0)
+
+# the quickest policy that still produces every event in `handled`
+def policyFor(handled):
+    if handled & (EVENT_HOLD | EVENT_HOLD_RELEASE):
+        return POLICY_TAP_HOLD
+    if handled & EVENT_DOUBLE_PRESS:
+        return POLICY_WAIT_DOUBLE
+    if handled & (EVENT_LONG_PRESS | EVENT_EXTRA_LONG_PRESS):
+        return POLICY_ON_UP
+    return POLICY_ON_DOWN
@@ -0,0 +1,196 @@
+import time
+from array import array
+from constants import *
+from keystatemachine import BIT_INDEX
+from nkrokeyboard import NkroKeyboard
+
+# Times how long it takes a key change to turn into a USB report, split
+# into the stages it passes through in the main loop:
+#
+#   STAGE_SCAN     : reading the expander on the pass that saw the change
+#   STAGE_DETECT   : from that read until KeyStateMachine gives the key an
+#                    event (includes waiting out a double press on purpose)
+#   STAGE_DISPATCH : the keyconfig's handleEvent for that event
+#   STAGE_REPORT   : from the key change until the first report after its
+#                    event leaves send_report, i.e. key to USB. An event
+#                    that neither sends a report nor queues a macro step
+#                    isn't counted.
+#
+# Each measurement goes into a histogram for its stage, with a bucket per
+# power of two microseconds, and into a ring buffer of the last
+# `size` measurements. The histograms roll: once a stage has
+# ROLLING_SAMPLES samples every count is halved, so old samples fade out.
+# Everything is preallocated, so tracing a key costs a few clock reads and
+# array writes. `dump()` prints both.
+#
+#   trace = LatencyTrace(macros)
+#   trace.wrapDevices(kbd, consumerControl)
+#   ...
+#   start = trace.now()
+#   keys = scanner.read(currentTime)
+#   if scanner.changed:
+#       trace.scanned(scanner.changed, start)
+#
+# Times are microseconds kept to 31 bits, so a single measurement can't be
+# longer than about 35 minutes.
+STAGE_SCAN     = 0
+STAGE_DETECT   = 1
+STAGE_DISPATCH = 2
+STAGE_REPORT   = 3
+STAGE_NAMES = ("scan", "detect", "dispatch", "key->usb")
+STAGE_COUNT = 4
+
+# bucket n holds measurements of less than 2^n microseconds
+HISTOGRAM_BUCKETS = 24
+TRACE_SIZE = 64
+ROLLING_SAMPLES = 512
+MICROS_MASK = 0x7FFFFFFF
+
+# sits in front of a HID device so sending a report can be timed
+class ReportProbe():
+    def __init__(self, device, trace):
+        self.device = device
+        self.trace = trace
+        self.usage_page = device.usage_page
+        self.usage = device.usage
+
+    def send_report(self, report, report_id = None):
+        if report_id is None:
+            self.device.send_report(report)
+        else:
+            self.device.send_report(report, report_id)
+        self.trace.reportSent()
+
+class LatencyTrace():
+    def __init__(self, macros = None, size = TRACE_SIZE, keyCount = BUTTON_COUNT):
+        self.macros = macros
+        self.size = size
+        self.histograms = array('l', [0] * (STAGE_COUNT * HISTOGRAM_BUCKETS))
+        self.counts = array('l', [0] * STAGE_COUNT)
+        self.totals = array('l', [0] * STAGE_COUNT)
+        self.worst = array('l', [0] * STAGE_COUNT)
+        # the ring buffer: stage, key, when it ended and how long it took
+        self.stages = bytearray(size)
+        self.keys = bytearray(size)
+        self.stamps = array('l', [0] * size)
+        self.durations = array('l', [0] * size)
+        self.head = 0
+        self.recorded = 0
+        # when each key last changed, and the key waiting on its first report
+        self.changedMicros = array('l', [0] * keyCount)
+        self.dispatchMicros = 0
+        self.queuedSteps = 0
+        self.reportKey = -1
+
+    def now(self):
+        return (time.monotonic_ns() // 1000) & MICROS_MASK
+
+    # puts the HID device of the given keyboard and consumer control behind
+    # a ReportProbe. A boot Keyboard sends everything through
+    # `_keyboard_device`. An NkroKeyboard sends every report it makes,
+    # those turned from a compiled macro's boot reports included, through
+    # `device`, so the probe goes there.
+    def wrapDevices(self, keyboard = None, consumerControl = None):
+        if isinstance(keyboard, NkroKeyboard):
+            keyboard.device = ReportProbe(keyboard.device, self)
+        elif keyboard is not None:
+            keyboard._keyboard_device = ReportProbe(keyboard._keyboard_device, self)
+        if consumerControl is not None:
+            consumerControl._consumer_device = ReportProbe(consumerControl._consumer_device, self)
+
+    def record(self, stage, key, duration):
+        duration &= MICROS_MASK
+        bucket = 0
+        value = duration
+        while value and bucket < HISTOGRAM_BUCKETS - 1:
+            value >>= 1
+            bucket += 1
+        self.histograms[stage * HISTOGRAM_BUCKETS + bucket] += 1
+        self.counts[stage] += 1
+        self.totals[stage] = (self.totals[stage] + duration) & MICROS_MASK
+        if duration > self.worst[stage]:
+            self.worst[stage] = duration
+        if self.counts[stage] >= ROLLING_SAMPLES:
+            self.halve(stage)
+        head = self.head
+        self.stages[head] = stage
+        self.keys[head] = key
+        self.stamps[head] = self.now()
+        self.durations[head] = duration
+        self.head = (head + 1) % self.size
+        self.recorded += 1
+
+    def halve(self, stage):
+        base = stage * HISTOGRAM_BUCKETS
+        for bucket in range(HISTOGRAM_BUCKETS):
+            self.histograms[base + bucket] >>= 1
+        self.counts[stage] >>= 1
+        self.totals[stage] >>= 1
+
+    #--- STAGES ---
+    # `changed` is the bitmask of keys that flipped on a read which
+    # started at `startMicros`
+    def scanned(self, changed, startMicros):
+        now = self.now()
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            key = BIT_INDEX[bit]
+            self.changedMicros[key] = now
+            self.record(STAGE_SCAN, key, now - startMicros)
+
+    def dispatching(self, key):
+        now = self.now()
+        self.record(STAGE_DETECT, key, now - self.changedMicros[key])
+        self.dispatchMicros = now
+        self.reportKey = key
+        if self.macros is not None:
+            self.queuedSteps = self.macros.queueDepth()
+
+    def dispatched(self, key):
+        self.record(STAGE_DISPATCH, key, self.now() - self.dispatchMicros)
+        # nothing sent and nothing queued, so no report to wait for
+        if self.reportKey == key and (self.macros is None or self.macros.queueDepth() <= self.queuedSteps):
+            self.reportKey = -1
+
+    def reportSent(self):
+        key = self.reportKey
+        if key >= 0:
+            self.reportKey = -1
+            self.record(STAGE_REPORT, key, self.now() - self.changedMicros[key])
+    #--------------
+
+    def reset(self):
+        for index in range(len(self.histograms)):
+            self.histograms[index] = 0
+        for stage in range(STAGE_COUNT):
+            self.counts[stage] = 0
+            self.totals[stage] = 0
+            self.worst[stage] = 0
+        self.head = 0
+        self.recorded = 0
+
+    def printHistograms(self):
+        for stage in range(STAGE_COUNT):
+            count = self.counts[stage]
+            if not count:
+                print("  ~~>", STAGE_NAMES[stage], ": nothing recorded")
+                continue
+            print("  ~~>", STAGE_NAMES[stage], ":", count, "samples, mean",
+                  self.totals[stage] // count, "us, worst", self.worst[stage], "us")
+            base = stage * HISTOGRAM_BUCKETS
+            for bucket in range(HISTOGRAM_BUCKETS):
+                samples = self.histograms[base + bucket]
+                if samples:
+                    print("        <", 1 << bucket, "us :", samples)
+
+    def printRecent(self):
+        count = min(self.recorded, self.size)
+        print("  ~~> last", count, "measurements (stage, key, took us, at us)")
+        for offset in range(count):
+            index = (self.head - count + offset) % self.size
+            print("       ", STAGE_NAMES[self.stages[index]], self.keys[index], self.durations[index], self.stamps[index])
+
+    def dump(self):
+        self.printHistograms()
+        self.printRecent()
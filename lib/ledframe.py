@@ -0,0 +1,48 @@
+from array import array
+from constants import *
+
+# Sits between the keyconfigs and a DotStar strip created with
+# auto_write=False. Colour changes made during a pass of the main loop are
+# recorded, and `commit()` at the end of the pass sends them in a single
+# SPI frame. Setting a key to the colour it already has doesn't count as a
+# change, and a pass with no changes sends nothing.
+class LedFrame():
+    def __init__(self, pixels, pixelCount = BUTTON_COUNT):
+        self.pixels = pixels
+        self.colours = array('l', [-1] * pixelCount)
+        self.dirty = False
+        self.framesPushed = 0
+        self.framesSkipped = 0
+        # frames sent during the last whole second
+        self.framesPerSecond = 0
+        self.secondStart = -1
+        self.secondFrames = 0
+
+    def setKeyColour(self, pixel, colour):
+        if self.colours[pixel] != colour:
+            self.colours[pixel] = colour
+            self.pixels[pixel] = colour
+            self.dirty = True
+
+    def commit(self, currentTime = None):
+        # close the last second before counting this frame, which belongs
+        # to the next one
+        if currentTime is None:
+            currentTime = timeInMillis()
+        if self.secondStart < 0:
+            self.secondStart = currentTime
+        elif currentTime - self.secondStart >= 1000:
+            self.framesPerSecond = self.secondFrames
+            self.secondFrames = 0
+            self.secondStart = currentTime
+        if self.dirty:
+            self.pixels.show()
+            self.dirty = False
+            self.framesPushed += 1
+            self.secondFrames += 1
+        else:
+            self.framesSkipped += 1
+
+    def printStats(self):
+        print("  ~~> leds:", self.framesPerSecond, "frames/s, pushed", self.framesPushed,
+              "skipped", self.framesSkipped)
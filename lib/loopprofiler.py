@@ -0,0 +1,112 @@
+import time
+from array import array
+from constants import *
+
+# Counts how often the main loop goes round and where its time goes. Each
+# pass is split into phases by calling `mark(phase)` at the end of each
+# one; every `reportMillis` a one line summary is printed with the loops
+# per second, the slowest pass, how many passes were slow enough to
+# matter (longer than `slowMicros`) and the mean time per phase:
+#
+#   ~~> loop: 2210 loops/s, worst 5120 us, 3 slow | keyconfig 41 macros 3 scan 96 ...
+#
+# Anything with a `printStats()` method passed to `addStats` prints its own
+# line after each summary.
+#
+# Profiling can be switched on and off while running with `toggle()`.
+# While it is off each call returns straight away; the main loop can also
+# check `enabled` once per pass and skip the calls altogether.
+#
+#   profiler = LoopProfiler(("keyconfig", "scan", "dispatch"))
+#   ...
+#   profiler.start()
+#   currentKeypadConfiguration.loop()
+#   profiler.mark(0)
+#   ...
+#   profiler.end(currentTime)
+PROFILE_REPORT_MILLIS = 5000
+# a pass this long can make a quick double press look like two singles
+SLOW_LOOP_MICROS = 10000
+
+class LoopProfiler():
+    def __init__(self, phaseNames, enabled = False, reportMillis = PROFILE_REPORT_MILLIS, slowMicros = SLOW_LOOP_MICROS):
+        self.phaseNames = phaseNames
+        self.enabled = enabled
+        self.reportMillis = reportMillis
+        self.slowMicros = slowMicros
+        # microseconds spent in each phase since the last summary
+        self.phaseMicros = array('l', [0] * len(phaseNames))
+        self.phaseWorst = array('l', [0] * len(phaseNames))
+        self.loopStart = 0
+        self.lastMark = 0
+        self.loops = 0
+        self.slowLoops = 0
+        self.worstMicros = 0
+        self.windowStart = -1
+        # loops per second over the last summary
+        self.loopsPerSecond = 0
+        self.statsSources = []
+
+    def addStats(self, source):
+        self.statsSources.append(source)
+
+    def now(self):
+        return time.monotonic_ns() // 1000
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.reset()
+        print("  ~~> loop profiler", "on" if self.enabled else "off")
+
+    def reset(self, currentTime = -1):
+        for phase in range(len(self.phaseNames)):
+            self.phaseMicros[phase] = 0
+            self.phaseWorst[phase] = 0
+        self.loops = 0
+        self.slowLoops = 0
+        self.worstMicros = 0
+        self.windowStart = currentTime
+
+    def start(self):
+        if self.enabled:
+            self.loopStart = self.lastMark = self.now()
+
+    def mark(self, phase):
+        if self.enabled:
+            now = self.now()
+            spent = now - self.lastMark
+            self.phaseMicros[phase] += spent
+            if spent > self.phaseWorst[phase]:
+                self.phaseWorst[phase] = spent
+            self.lastMark = now
+
+    def end(self, currentTime = None):
+        if not self.enabled:
+            return
+        if currentTime is None:
+            currentTime = timeInMillis()
+        # the first pass only opens the window, as it started before it
+        if self.windowStart < 0:
+            self.reset(currentTime)
+            return
+        spent = self.now() - self.loopStart
+        self.loops += 1
+        if spent > self.worstMicros:
+            self.worstMicros = spent
+        if spent > self.slowMicros:
+            self.slowLoops += 1
+        if currentTime - self.windowStart >= self.reportMillis:
+            self.loopsPerSecond = self.loops * 1000 // (currentTime - self.windowStart)
+            self.printSummary()
+            self.reset(currentTime)
+
+    def printSummary(self):
+        loops = max(1, self.loops)
+        line = "  ~~> loop: " + str(self.loopsPerSecond) + " loops/s, worst " + str(self.worstMicros) \
+            + " us, " + str(self.slowLoops) + " slow |"
+        for phase in range(len(self.phaseNames)):
+            line += " " + self.phaseNames[phase] + " " + str(self.phaseMicros[phase] // loops) \
+                + "/" + str(self.phaseWorst[phase])
+        print(line + " us (mean/worst)")
+        for source in self.statsSources:
+            source.printStats()
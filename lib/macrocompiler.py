@@ -0,0 +1,89 @@
+from adafruit_hid.keycode import Keycode
+from constants import *
+
+# Turns a constant string into a ready made stream of 8 byte boot keyboard
+# reports, so typing it later is a loop of `send_report` calls with none of
+# the per character keycode lookups or SHIFT handling.
+#
+# With `fast` (MACRO_FAST_TYPE) characters are packed into reports the same
+# way `FastKeyboardLayout.write` does in fast mode: up to six keys per
+# report, no repeats, and SHIFT held across a run of shifted characters.
+# That relies on the host reading a report's keys in slot order, so it is
+# off by default and every character gets a report of its own. Every
+# stream ends with an empty report so no keys are left held.
+#
+# Replaying sends the reports to `keyboard._keyboard_device`. An
+# NkroKeyboard turns them into its own reports on the way, so the same
+# streams work with either keyboard.
+#
+# Streams can be compiled when a keyconfig is built, or ahead of time on a
+# computer and copied onto the board:
+#   python lib/macrocompiler.py "pkill scrcpy" macros/killscrcpy.bin
+# and loaded with `loadMacro("macros/killscrcpy.bin")`.
+
+REPORT_LENGTH = 8
+MAX_REPORT_KEYS = 6
+
+SHIFT_BIT = Keycode.modifier_bit(Keycode.SHIFT)
+
+def compileMacro(text, keyboardLayout, fast = MACRO_FAST_TYPE):
+    maxKeys = MAX_REPORT_KEYS if fast else 1
+    stream = bytearray()
+    keys = []
+    shifted = False
+    for char in text:
+        keycodes = keyboardLayout.keycodes(char)
+        keycode = keycodes[-1]
+        charShifted = len(keycodes) > 1
+        if keys and (len(keys) == maxKeys or charShifted != shifted or keycode in keys):
+            appendReports(stream, keys, shifted, shifted and charShifted)
+            keys = []
+        keys.append(keycode)
+        shifted = charShifted
+    if keys:
+        appendReports(stream, keys, shifted, False)
+    return bytes(stream)
+
+# adds the report pressing `keys` and the one letting them go again
+def appendReports(stream, keys, shifted, keepShift):
+    modifier = SHIFT_BIT if shifted else 0
+    stream.append(modifier)
+    stream.append(0)
+    for slot in range(MAX_REPORT_KEYS):
+        stream.append(keys[slot] if slot < len(keys) else 0)
+    stream.append(modifier if keepShift else 0)
+    stream.extend(bytes(REPORT_LENGTH - 1))
+
+def reportCount(stream):
+    return len(stream) // REPORT_LENGTH
+
+# sends reports [start, start + count) of a compiled stream straight to the
+# keyboard device and returns the index of the next report. Any keys held
+# through `keyboard.press` are not part of the stream and will be let go.
+def replayMacro(keyboard, stream, start = 0, count = None):
+    total = len(stream) // REPORT_LENGTH
+    end = total if count is None else min(total, start + count)
+    view = memoryview(stream)
+    device = keyboard._keyboard_device
+    for index in range(start, end):
+        offset = index * REPORT_LENGTH
+        device.send_report(view[offset:offset + REPORT_LENGTH])
+    return end
+
+def saveMacro(fileName, stream):
+    with open(fileName, "wb") as macroFile:
+        macroFile.write(stream)
+
+def loadMacro(fileName):
+    with open(fileName, "rb") as macroFile:
+        return macroFile.read()
+
+if __name__ == "__main__":
+    import sys
+    from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
+    if len(sys.argv) != 3:
+        print("usage: python macrocompiler.py TEXT OUTPUT_FILE")
+        sys.exit(1)
+    compiled = compileMacro(sys.argv[1], KeyboardLayoutUS(None))
+    saveMacro(sys.argv[2], compiled)
+    print(len(sys.argv[1]), "characters ->", reportCount(compiled), "reports")
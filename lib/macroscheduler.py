@@ -0,0 +1,151 @@
+from constants import *
+from macrocompiler import *
+
+STEP_PRESS       = 0
+STEP_RELEASE     = 1
+STEP_RELEASE_ALL = 2
+STEP_SEND        = 3
+STEP_TYPE        = 4
+STEP_DELAY       = 5
+STEP_REPLAY      = 6
+
+# A cooperative replacement for chains of `keyboard.send(...)` and
+# `time.sleep(KEYBOARD_DELAY)`. Keyconfigs queue up HID steps and the main
+# loop calls `loop()` once per pass, which runs whatever steps are due and
+# returns straight away. Scanning and animations keep going while a macro
+# plays out.
+#
+# The queueing methods return the scheduler so steps can be chained:
+#   macros.send(Keycode.COMMAND, Keycode.SPACE).delay(200).write("terminal")
+#
+# Typing is spread over several passes, `charsPerLoop` characters at a time.
+# With `fastType` the characters are packed into shared HID reports, unless
+# the keyboard can't keep the keys of one report in order (NkroKeyboard).
+# Streams from `compileMacro` are replayed `charsPerLoop` reports at a time.
+class MacroScheduler():
+    def __init__(self, keyboard, keyboardLayout, charsPerLoop = MACRO_CHARS_PER_LOOP, fastType = MACRO_FAST_TYPE, consumerControl = None):
+        self.keyboard = keyboard
+        self.keyboardLayout = keyboardLayout
+        # shared with keymaps so media keys go through one ConsumerControl
+        self.consumerControl = consumerControl
+        self.charsPerLoop = charsPerLoop
+        self.fastType = fastType and getattr(keyboard, "keepsKeyOrder", True)
+        self.steps = []
+        self.head = 0
+        self.typeOffset = 0
+        self.dueMillis = -1
+        # how late a step ran compared to when it was due, and how long
+        # running it took, in milliseconds
+        self.lastLatency = 0
+        self.maxLatency = 0
+        self.lastStepMillis = 0
+        self.maxStepMillis = 0
+        self.stepsRun = 0
+
+    #--- QUEUEING ---
+    def press(self, *keycodes):
+        return self.queue(STEP_PRESS, keycodes)
+
+    def release(self, *keycodes):
+        return self.queue(STEP_RELEASE, keycodes)
+
+    def releaseAll(self):
+        return self.queue(STEP_RELEASE_ALL, None)
+
+    def send(self, *keycodes):
+        return self.queue(STEP_SEND, keycodes)
+
+    def write(self, text):
+        return self.queue(STEP_TYPE, text)
+
+    # queues a stream built by `compileMacro`
+    def replay(self, stream):
+        return self.queue(STEP_REPLAY, stream)
+
+    def delay(self, millis):
+        return self.queue(STEP_DELAY, millis)
+
+    def queue(self, step, value):
+        self.steps.append((step, value))
+        return self
+
+    # drops anything still waiting to run and lets go of every key
+    def cancel(self):
+        self.steps = []
+        self.head = 0
+        self.typeOffset = 0
+        self.dueMillis = -1
+        self.keyboard.release_all()
+    #----------------
+
+    def queueDepth(self):
+        return len(self.steps) - self.head
+
+    def isIdle(self):
+        return self.head >= len(self.steps)
+
+    def printStats(self):
+        print("  ~~> macros: queued", self.queueDepth(),
+              "run", self.stepsRun,
+              "latency", self.lastLatency, "/", self.maxLatency, "ms",
+              "step", self.lastStepMillis, "/", self.maxStepMillis, "ms",
+              "reports saved", getattr(self.keyboardLayout, "reportsSaved", 0))
+
+    # runs the steps that are due. Call once per pass of the main loop.
+    def loop(self, currentTime = None):
+        if self.head >= len(self.steps):
+            return
+        if currentTime is None:
+            currentTime = timeInMillis()
+        if self.dueMillis < 0:
+            self.dueMillis = currentTime
+        if currentTime < self.dueMillis:
+            return
+
+        step, value = self.steps[self.head]
+        if step == STEP_DELAY:
+            self.finishStep(currentTime, currentTime + value)
+            return
+
+        if self.typeOffset == 0:
+            self.lastLatency = currentTime - self.dueMillis
+            if self.lastLatency > self.maxLatency:
+                self.maxLatency = self.lastLatency
+
+        if step == STEP_PRESS:
+            self.keyboard.press(*value)
+        elif step == STEP_RELEASE:
+            self.keyboard.release(*value)
+        elif step == STEP_RELEASE_ALL:
+            self.keyboard.release_all()
+        elif step == STEP_SEND:
+            self.keyboard.send(*value)
+        elif step == STEP_TYPE:
+            end = self.typeOffset + self.charsPerLoop
+            self.keyboardLayout.write(value[self.typeOffset:end], self.fastType)
+            if end < len(value):
+                self.typeOffset = end
+                return
+            self.typeOffset = 0
+        elif step == STEP_REPLAY:
+            end = replayMacro(self.keyboard, value, self.typeOffset, self.charsPerLoop)
+            if end < reportCount(value):
+                self.typeOffset = end
+                return
+            self.typeOffset = 0
+
+        stepMillis = timeInMillis() - currentTime
+        self.lastStepMillis = stepMillis
+        if stepMillis > self.maxStepMillis:
+            self.maxStepMillis = stepMillis
+        self.finishStep(currentTime, currentTime)
+
+    def finishStep(self, currentTime, nextDue):
+        self.stepsRun += 1
+        self.head += 1
+        if self.head >= len(self.steps):
+            self.steps = []
+            self.head = 0
+            self.dueMillis = -1
+        else:
+            self.dueMillis = nextDue
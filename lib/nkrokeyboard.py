@@ -0,0 +1,198 @@
+import usb_hid
+from adafruit_hid.keyboard import Keyboard
+from constants import *
+
+# An N key rollover keyboard. Instead of the boot keyboard's six key slots
+# the report has one bit for every keycode, so any number of keys can be
+# held at once and pressing or letting go of one is a single bit set or
+# cleared, with no searching through slots.
+#
+#   report[0]     : modifiers, as in the boot report
+#   report[1:17]  : a bit per keycode 0 - 127, keycode k is bit k & 7 of
+#                   byte 1 + (k >> 3)
+#
+# The host only knows about this report if boot.py has added
+# NKRO_DESCRIPTOR as a HID device, which needs CircuitPython 7 or later.
+# `makeKeyboard` hands back an NkroKeyboard when that device is there and
+# an ordinary boot protocol Keyboard otherwise, or when the host asked for
+# the boot protocol, so code.py works either way. Both have press /
+# release / release_all / send, so keyconfigs, KeyboardLayoutUS and the
+# MacroScheduler can't tell them apart.
+#
+# Streams from `compileMacro` are 8 byte boot reports. They go to
+# `_keyboard_device`, which here turns each one into bitmap reports, so
+# compiled macros replay the same on both. A bitmap has no slot order, so
+# a boot report that presses several keys at once is sent as one report a
+# key, tapped in slot order, or typed text would come out scrambled. For
+# the same reason `keepsKeyOrder` is False, which stops the MacroScheduler
+# packing typed characters into shared reports.
+
+NKRO_REPORT_ID = 4
+NKRO_KEY_COUNT = 128
+NKRO_REPORT_LENGTH = 1 + NKRO_KEY_COUNT // 8
+BOOT_REPORT_LENGTH = 8
+
+NKRO_DESCRIPTOR = bytes((
+    0x05, 0x01,             # Usage Page (Generic Desktop)
+    0x09, 0x06,             # Usage (Keyboard)
+    0xA1, 0x01,             # Collection (Application)
+    0x85, NKRO_REPORT_ID,   #   Report ID
+    0x05, 0x07,             #   Usage Page (Keyboard)
+    0x19, 0xE0,             #   Usage Minimum (Left Control)
+    0x29, 0xE7,             #   Usage Maximum (Right GUI)
+    0x15, 0x00,             #   Logical Minimum (0)
+    0x25, 0x01,             #   Logical Maximum (1)
+    0x75, 0x01,             #   Report Size (1)
+    0x95, 0x08,             #   Report Count (8)
+    0x81, 0x02,             #   Input (Data, Variable, Absolute) modifiers
+    0x19, 0x00,             #   Usage Minimum (0)
+    0x29, 0x7F,             #   Usage Maximum (127)
+    0x95, 0x80,             #   Report Count (128)
+    0x81, 0x02,             #   Input (Data, Variable, Absolute) key bitmap
+    0x05, 0x08,             #   Usage Page (LEDs)
+    0x19, 0x01,             #   Usage Minimum (Num Lock)
+    0x29, 0x05,             #   Usage Maximum (Kana)
+    0x95, 0x05,             #   Report Count (5)
+    0x91, 0x02,             #   Output (Data, Variable, Absolute) LEDs
+    0x95, 0x01,             #   Report Count (1)
+    0x75, 0x03,             #   Report Size (3)
+    0x91, 0x01,             #   Output (Constant) padding
+    0xC0,                   # End Collection
+))
+
+# for boot.py
+def nkroDevice():
+    return usb_hid.Device(
+        report_descriptor = NKRO_DESCRIPTOR,
+        usage_page = 0x01,
+        usage = 0x06,
+        report_ids = (NKRO_REPORT_ID,),
+        in_report_lengths = (NKRO_REPORT_LENGTH,),
+        out_report_lengths = (1,))
+
+# the NKRO keyboard boot.py added, or None. CircuitPython 6 can't add
+# devices, and its one keyboard is the boot keyboard.
+def findNkroDevice(devices):
+    if not hasattr(usb_hid, "enable"):
+        return None
+    bootKeyboard = getattr(getattr(usb_hid, "Device", None), "KEYBOARD", None)
+    for device in devices:
+        if device.usage_page == 0x01 and device.usage == 0x06 and device is not bootKeyboard:
+            return device
+    return None
+
+# whether the host asked for the boot protocol when it set up the USB
+# devices, as a BIOS does. It then only reads the boot keyboard.
+def hostWantsBootKeyboard():
+    getBootDevice = getattr(usb_hid, "get_boot_device", None)
+    return getBootDevice is not None and getBootDevice() == 1
+
+def makeKeyboard(devices, useNkro = USE_NKRO):
+    device = findNkroDevice(devices)
+    if device is not None and useNkro and not hostWantsBootKeyboard():
+        return NkroKeyboard(device)
+    # Keyboard takes the first keyboard it finds, which would be the NKRO
+    # one if boot.py added it
+    return Keyboard([ other for other in devices if other is not device ])
+
+# whether `keycode` is in `keys`. CircuitPython can't do `int in bytearray`.
+def holdsKey(keys, keycode):
+    for index in range(len(keys)):
+        if keys[index] == keycode:
+            return True
+    return False
+
+# what NkroKeyboard sends its reports through. Bitmap reports go straight
+# to the keyboard's device, boot reports from a compiled macro are
+# converted first.
+class NkroReportSender():
+    def __init__(self, keyboard, device):
+        self.keyboard = keyboard
+        self.usage_page = device.usage_page
+        self.usage = device.usage
+
+    def send_report(self, report):
+        if len(report) == BOOT_REPORT_LENGTH:
+            self.keyboard.sendBootReport(report)
+        else:
+            self.keyboard.device.send_report(report)
+
+class NkroKeyboard():
+    keepsKeyOrder = False
+
+    def __init__(self, device):
+        self.report = bytearray(NKRO_REPORT_LENGTH)
+        # the keys of the last boot report that are still held down
+        self.bootKeys = bytearray(BOOT_REPORT_LENGTH - 2)
+        # every bitmap report leaves through `device`, so something timing
+        # reports (LatencyTrace) can stand in front of it
+        self.device = device
+        self._keyboard_device = NkroReportSender(self, device)
+        self.release_all()
+
+    def press(self, *keycodes):
+        report = self.report
+        for keycode in keycodes:
+            if keycode >= 0xE0:
+                report[0] |= 1 << (keycode - 0xE0)
+            elif keycode < NKRO_KEY_COUNT:
+                report[1 + (keycode >> 3)] |= 1 << (keycode & 7)
+            else:
+                raise ValueError("Keycode " + str(keycode) + " is not in the NKRO report")
+        self._keyboard_device.send_report(report)
+
+    def release(self, *keycodes):
+        report = self.report
+        for keycode in keycodes:
+            if keycode >= 0xE0:
+                report[0] &= ~(1 << (keycode - 0xE0))
+            elif keycode < NKRO_KEY_COUNT:
+                report[1 + (keycode >> 3)] &= ~(1 << (keycode & 7))
+        self._keyboard_device.send_report(report)
+
+    def release_all(self):
+        report = self.report
+        for index in range(NKRO_REPORT_LENGTH):
+            report[index] = 0
+        bootKeys = self.bootKeys
+        for index in range(len(bootKeys)):
+            bootKeys[index] = 0
+        self._keyboard_device.send_report(report)
+
+    def send(self, *keycodes):
+        self.press(*keycodes)
+        self.release_all()
+
+    # sends an 8 byte boot report. Keys it holds from the last one stay
+    # down, keys it adds are tapped one report each in slot order except the
+    # last, which is held until a later report lets go of it.
+    def sendBootReport(self, bootReport):
+        report = self.report
+        device = self.device
+        bootKeys = self.bootKeys
+        for index in range(1, NKRO_REPORT_LENGTH):
+            report[index] = 0
+        report[0] = bootReport[0]
+        for slot in range(2, BOOT_REPORT_LENGTH):
+            keycode = bootReport[slot]
+            if keycode and keycode < NKRO_KEY_COUNT and holdsKey(bootKeys, keycode):
+                report[1 + (keycode >> 3)] |= 1 << (keycode & 7)
+        last = 0
+        for slot in range(2, BOOT_REPORT_LENGTH):
+            keycode = bootReport[slot]
+            if not keycode or keycode >= NKRO_KEY_COUNT or holdsKey(bootKeys, keycode):
+                continue
+            if last:
+                report[1 + (last >> 3)] |= 1 << (last & 7)
+                device.send_report(report)
+                report[1 + (last >> 3)] &= ~(1 << (last & 7))
+                device.send_report(report)
+            last = keycode
+        # the report still only has the keys that were already down
+        for slot in range(2, BOOT_REPORT_LENGTH):
+            keycode = bootReport[slot]
+            held = keycode < NKRO_KEY_COUNT and report[1 + (keycode >> 3)] & (1 << (keycode & 7))
+            bootKeys[slot - 2] = keycode if keycode and (held or keycode == last) else 0
+        if last:
+            report[1 + (last >> 3)] |= 1 << (last & 7)
+        device.send_report(report)
@@ -162,7 +162,9 @@ class PicoDisplay():
 
 
     def render(self, spriteGroup, rotation):
-        self.display.rotation = rotation
+        # changing the rotation redraws the whole screen, so only do it when needed
+        if self.display.rotation != rotation:
+            self.display.rotation = rotation
         self.display.show(spriteGroup)
 
     def createText(self, displayText, fontColour, xCoord, yCoord):
@@ -11,34 +11,58 @@
 """
 import time
 import board
+from array import array
 from pwmio import PWMOut
 
 PWM_FREQ  = 5000
 COLOUR_MAX = 65535
+# LEDs look much brighter than their duty cycle at the low end, so levels
+# are raised to this power to make equal steps look equal
+GAMMA = 2.2
 
-class RgbLed:
-    # Converts a value that exists within a range to a value in another range
-    def convertScale(self, value, originMin=0, originMax=255, destinationMin=0, destinationMax=COLOUR_MAX):
-        originSpan = originMax - originMin
-        destinationSpan = destinationMax - destinationMin
-        scaledValue = float(value - originMin) / float(originSpan)
-        return destinationMin + (scaledValue * destinationSpan)
+# The float maths is done once, here. DUTY_CYCLES[level] is the duty cycle
+# for a colour level of 0 - 255, gamma corrected and inverted because the
+# LED is common anode (a duty cycle of COLOUR_MAX is off).
+DUTY_CYCLES = array('H', [ COLOUR_MAX - int(((level / 255) ** GAMMA) * COLOUR_MAX + 0.5) for level in range(256) ])
+
+# Input a value 0 to 255 to get a color value.
+# The colours are a transition r - g - b - back to r.
+def wheelColour(pos):
+    if pos < 85:
+        return 255 - pos * 3, pos * 3, 0
+    if pos < 170:
+        pos -= 85
+        return 0, 255 - pos * 3, pos * 3
+    pos -= 170
+    return pos * 3, 0, 255 - pos * 3
 
-    # This method ensures the value is in the range [0-255]
-    # it then maps the value to a number between [0-65535]
-    # it then inverts the value
+WHEEL = tuple(wheelColour(pos) for pos in range(256))
+
+class RgbLed:
+    # This method ensures the value is a whole number in the range [0-255]
+    # it then looks up its gamma corrected, inverted duty cycle
     def normalise(self, colourElement):
-        value = colourElement
+        value = int(colourElement)
         if value > 255:
             value = 255
         if value < 0:
             value = 0
-        return COLOUR_MAX - int(self.convertScale(value))
+        return DUTY_CYCLES[value]
 
+    # only the channels whose duty cycle changes are written to
     def setColourRGB(self, red, green, blue):
-         self.rPin.duty_cycle = self.normalise(red)
-         self.gPin.duty_cycle = self.normalise(green)
-         self.bPin.duty_cycle = self.normalise(blue)
+        duty = self.normalise(red)
+        if duty != self.duty[0]:
+            self.duty[0] = duty
+            self.rPin.duty_cycle = duty
+        duty = self.normalise(green)
+        if duty != self.duty[1]:
+            self.duty[1] = duty
+            self.gPin.duty_cycle = duty
+        duty = self.normalise(blue)
+        if duty != self.duty[2]:
+            self.duty[2] = duty
+            self.bPin.duty_cycle = duty
 
     def setColour(self, colour, x = None, y = None):
         if x != None and y != None:
@@ -50,19 +74,13 @@ class RgbLed:
                 colour & 255)
 
     def colourWheel(self, pos):
-        # Input a value 0 to 255 to get a color value.
-        # The colours are a transition r - g - b - back to r.
         if pos < 0 or pos > 255:
             return 0, 0, 0
-        if pos < 85:
-            return int(255 - pos * 3), int(pos * 3), 0
-        if pos < 170:
-            pos -= 85
-            return 0, int(255 - pos * 3), int(pos * 3)
-        pos -= 170
-        return int(pos * 3), 0, int(255 - (pos * 3))
+        return WHEEL[pos]
 
     def __init__(self, redPin=board.GP11, greenPin=board.GP13, bluePin=board.GP14):
         self.rPin = PWMOut(redPin,   frequency=PWM_FREQ, duty_cycle = COLOUR_MAX)
         self.gPin = PWMOut(greenPin, frequency=PWM_FREQ, duty_cycle = COLOUR_MAX)
         self.bPin = PWMOut(bluePin,  frequency=PWM_FREQ, duty_cycle = COLOUR_MAX)
+        # the duty cycles last written, starting off
+        self.duty = array('H', [COLOUR_MAX] * 3)
@@ -1,4 +1,3 @@
-
 import time
 import board
 from digitalio import DigitalInOut, Direction, Pull
@@ -7,11 +6,41 @@ ROTARY_NO_MOTION = 0
 ROTARY_CCW       = 1
 ROTARY_CW        = 2
 
+# Quadrature decoding: A and B are read as a two bit state (A << 1 | B)
+# and the previous state and the new one index a table of the step that
+# move is. Clockwise the states go 3 -> 1 -> 0 -> 2 -> 3, one Gray code
+# step at a time, so every transition is counted; a jump of two steps
+# (both pins changing between reads) can't be told apart either way and
+# counts as nothing, as does contact bounce back and forth.
+TRANSITIONS = (
+#   to:  0   1   2   3
+         0, -1,  1,  0, # from 0
+         1,  0,  0, -1, # from 1
+        -1,  0,  0,  1, # from 2
+         0,  1, -1,  0, # from 3
+)
+# the knob clicks into place with both pins open, pulled up. A detent is
+# counted on getting back there at least half a cycle (two transitions)
+# from where it was last time, so a missed transition doesn't put the
+# count out of step with the clicks.
+REST_STATE = 3
+
+# Acceleration curve: (milliseconds since the last detent, steps it is
+# worth). A detent slower than all of them is worth one step, so slow
+# turns stay precise while a fast flick covers a lot of ground.
+ACCELERATION = (
+    (15, 8),
+    (30, 4),
+    (60, 2),
+)
+# detents further apart than this don't count towards the velocity
+VELOCITY_TIMEOUT_MILLIS = 250
+
 class RotaryEncoder:
     def timeInMillis(self):
         return int(time.monotonic() * 1000)
 
-    def __init__(self, aPin=board.GP12, bPin=board.GP10, bluePin=board.GP14):
+    def __init__(self, aPin=board.GP12, bPin=board.GP10, bluePin=board.GP14, acceleration=ACCELERATION):
         self.encoderAPin = DigitalInOut(aPin)
         self.encoderAPin.direction = Direction.INPUT
         self.encoderAPin.pull = Pull.UP
@@ -20,27 +49,67 @@ class RotaryEncoder:
         self.encoderBPin.direction = Direction.INPUT
         self.encoderBPin.pull = Pull.UP
 
-        self.loopTime = self.timeInMillis()
-        self.encoderA_prev = 0
+        self.acceleration = acceleration
+        self.state = self.readState()
+        # transitions since the knob was last at rest
+        self.steps = 0
+        # detents turned since starting, clockwise positive
+        self.position = 0
+        # accelerated steps not yet taken by `takeDelta`
+        self.delta = 0
+        self.lastDetentMillis = -1
+        # detents per second at the last detent, 0 if it came after a pause
+        self.velocity = 0
+
+    def readState(self):
+        return (2 if self.encoderAPin.value else 0) | (1 if self.encoderBPin.value else 0)
+
+    # reads the pins, returns the detents turned since the last call
+    # (clockwise positive) and adds them, accelerated, to `delta`. Call it
+    # as often as possible; every transition has to be seen.
+    def update(self, currentTime = None):
+        state = self.readState()
+        if state == self.state:
+            return 0
+        self.steps += TRANSITIONS[(self.state << 2) | state]
+        self.state = state
+        if state != REST_STATE:
+            return 0
+        steps = self.steps
+        self.steps = 0
+        if -2 < steps < 2:
+            return 0
+        direction = 1 if steps > 0 else -1
+        self.position += direction
+
+        if currentTime is None:
+            currentTime = self.timeInMillis()
+        interval = currentTime - self.lastDetentMillis
+        self.lastDetentMillis = currentTime
+        self.velocity = 1000 // max(1, interval) if interval < VELOCITY_TIMEOUT_MILLIS else 0
+        self.delta += direction * self.stepsFor(interval)
+        return direction
+
+    # what a detent is worth this long after the previous one
+    def stepsFor(self, interval):
+        for limit, steps in self.acceleration:
+            if interval < limit:
+                return steps
+        return 1
+
+    # the accelerated steps turned since the last call, so a consumer can
+    # act on them once a loop instead of once a detent
+    def takeDelta(self):
+        delta = self.delta
+        self.delta = 0
+        return delta
 
-    # https://www.hobbytronics.co.uk/arduino-tutorial6-rotary-encoder
+    # one ROTARY_* event a call, as before: the direction of the last
+    # detent completed since the previous call
     def read(self):
-        event = ROTARY_NO_MOTION
-        # get the current elapsed time
-        currentTime = self.timeInMillis()
-        if currentTime >= (self.loopTime + 5):
-            # 5ms since last check of encoder = 200Hz
-            encoderA = self.encoderAPin.value
-            encoderB = self.encoderBPin.value
-            if (not encoderA) and (self.encoderA_prev):
-                # encoder A has gone from high to low
-                # CW and CCW determined
-                if encoderB:
-                    # B is low so counter-clockwise
-                    event = ROTARY_CW
-                else:
-                    # encoder B is high so clockwise
-                    event = ROTARY_CCW
-            self.encoderA_prev = encoderA # Store value of A for next time
-            self.loopTime = currentTime
-        return event
+        direction = self.update()
+        if direction > 0:
+            return ROTARY_CW
+        if direction < 0:
+            return ROTARY_CCW
+        return ROTARY_NO_MOTION
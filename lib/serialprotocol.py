@@ -0,0 +1,299 @@
+import struct
+try:
+    import usb_cdc
+except ImportError:
+    usb_cdc = None
+
+# A small binary protocol the host can use to talk to the keypad over USB
+# serial, and the keypad to answer. Every message is a frame:
+#
+#   SYNC | command | length | payload (length bytes) | crc
+#
+# where `crc` is a CRC-8 of the command, length and payload. A frame that
+# fails its CRC, or stops arriving for FRAME_TIMEOUT_MILLIS, is dropped and
+# the parser looks for the next SYNC, see FrameParser.
+#
+# The keypad side polls once a main loop pass and only ever reads the bytes
+# that have already arrived, so a slow host can't stall scanning:
+#
+#   protocol = SerialProtocol(findSerialPort())
+#   protocol.handlers[CMD_SELECT_LAYOUT] = selectLayoutFromHost
+#   while True:
+#       protocol.poll(currentTime)
+#
+# A handler gets the payload and returns None, answered with RSP_ACK, or a
+# (command, payload) reply of its own. A ValueError is answered with
+# RSP_NAK and its message. This file doesn't touch any hardware when
+# imported, so host/keypadclient.py uses it for the same encoding.
+SYNC = 0xA5
+MAX_PAYLOAD = 255
+FRAME_TIMEOUT_MILLIS = 200
+# bytes handled per poll, so a burst from the host is spread over passes
+MAX_READ = 64
+
+# host -> keypad
+CMD_PING          = 0x01
+CMD_SET_COLOURS   = 0x10 # (key, red, green, blue) per key
+CMD_SELECT_LAYOUT = 0x11 # (index)
+CMD_PUSH_MACRO    = 0x12 # utf-8 text to type
+CMD_QUERY_STATS   = 0x13
+CMD_QUERY_LATENCY = 0x14
+# keypad -> host
+RSP_ACK     = 0x80 # (command)
+RSP_NAK     = 0x81 # (command) + utf-8 reason
+RSP_STATS   = 0x93 # packStats
+RSP_LATENCY = 0x94 # packLatency
+
+STATS_FIELDS = ("layout", "macroQueue", "loopsPerSecond", "busReads", "skippedReads", "combosFired")
+STATS_FORMAT = "<BHHIIH"
+# per latency stage: events, mean and worst in microseconds
+LATENCY_FORMAT = "<III"
+
+def crcTable():
+    table = bytearray(256)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[byte] = crc
+    return table
+
+CRC_TABLE = crcTable()
+
+def crc8(data, crc = 0):
+    for byte in data:
+        crc = CRC_TABLE[crc ^ byte]
+    return crc
+
+def encodeFrame(command, payload = b""):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError("Payload of " + str(len(payload)) + " bytes is over " + str(MAX_PAYLOAD))
+    header = bytes((command, len(payload)))
+    return bytes((SYNC,)) + header + bytes(payload) + bytes((crc8(payload, crc8(header)),))
+
+#--- PAYLOADS ---
+# colours is a sequence of (key, 0xRRGGBB)
+def encodeColours(colours):
+    payload = bytearray()
+    for key, colour in colours:
+        payload += bytes((key, (colour >> 16) & 0xFF, (colour >> 8) & 0xFF, colour & 0xFF))
+    return payload
+
+def decodeColours(payload):
+    if len(payload) % 4:
+        raise ValueError("Colours come in 4 bytes a key, not " + str(len(payload)))
+    return [ (payload[offset], payload[offset + 1] << 16 | payload[offset + 2] << 8 | payload[offset + 3])
+             for offset in range(0, len(payload), 4) ]
+
+def packStats(layout, macroQueue, loopsPerSecond, busReads, skippedReads, combosFired):
+    return struct.pack(STATS_FORMAT, layout & 0xFF, min(macroQueue, 0xFFFF), min(loopsPerSecond, 0xFFFF),
+                       busReads & 0xFFFFFFFF, skippedReads & 0xFFFFFFFF, min(combosFired, 0xFFFF))
+
+def unpackStats(payload):
+    return dict(zip(STATS_FIELDS, struct.unpack(STATS_FORMAT, bytes(payload))))
+
+# counts, totals and worst are per stage, as kept by LatencyTrace
+def packLatency(counts, totals, worst):
+    payload = bytearray()
+    for stage in range(len(counts)):
+        mean = totals[stage] // counts[stage] if counts[stage] else 0
+        payload += struct.pack(LATENCY_FORMAT, counts[stage], mean, worst[stage])
+    return payload
+
+def unpackLatency(payload):
+    size = struct.calcsize(LATENCY_FORMAT)
+    return [ struct.unpack(LATENCY_FORMAT, bytes(payload[offset:offset + size]))
+             for offset in range(0, len(payload), size) ]
+#----------------
+
+# Finds frames in a stream of bytes handed to it one at a time. The bytes
+# from the SYNC of the frame being parsed on are kept in a buffer that is
+# allocated once. A SYNC byte can turn up inside a payload or in line
+# noise, so when a frame fails its CRC the parser goes back to the byte
+# after its SYNC and looks again, and a real frame that started inside the
+# bad one is still found. The same happens to a frame that is still
+# incomplete FRAME_TIMEOUT_MILLIS after its SYNC, as a false SYNC with a
+# long length would otherwise hold up the real frames behind it.
+#
+# Going back over the buffer can turn up more than one frame for a byte,
+# so after `feed` returns True call `next` until it returns False:
+#
+#   found = parser.feed(byte, currentTime)
+#   while found:
+#       handle(parser.command, parser.payloadView())
+#       found = parser.next(currentTime)
+PARSE_SYNC    = 0
+PARSE_COMMAND = 1
+PARSE_LENGTH  = 2
+PARSE_PAYLOAD = 3
+PARSE_CRC     = 4
+
+# SYNC, command, length and crc
+FRAME_OVERHEAD = 4
+MAX_FRAME = MAX_PAYLOAD + FRAME_OVERHEAD
+
+class FrameParser():
+    def __init__(self):
+        self.buffer = bytearray(2 * MAX_FRAME)
+        # where the frame being parsed starts, the next byte to parse and
+        # the end of the bytes fed so far
+        self.start = 0
+        self.position = 0
+        self.end = 0
+        self.state = PARSE_SYNC
+        self.command = 0
+        self.length = 0
+        self.received = 0
+        self.crc = 0
+        self.frameStart = 0
+        self.badFrames = 0
+
+    # returns True when `byte` completes a good frame, which is then in
+    # `command` and `payloadView()` until the next call
+    def feed(self, byte, currentTime = 0):
+        if self.end == len(self.buffer):
+            self.compact()
+        self.buffer[self.end] = byte
+        self.end += 1
+        return self.next(currentTime)
+
+    # parses on through the bytes already fed, returning True at the end of
+    # each good frame. Call it now and then with nothing new fed, so a
+    # stalled frame times out.
+    def next(self, currentTime = 0):
+        if self.state != PARSE_SYNC and currentTime - self.frameStart > FRAME_TIMEOUT_MILLIS:
+            self.resync()
+        buffer = self.buffer
+        while self.position < self.end:
+            byte = buffer[self.position]
+            self.position += 1
+            state = self.state
+            if state == PARSE_SYNC:
+                if byte == SYNC:
+                    self.start = self.position - 1
+                    self.frameStart = currentTime
+                    self.crc = 0
+                    self.state = PARSE_COMMAND
+                continue
+            if state == PARSE_CRC:
+                if byte == self.crc:
+                    self.state = PARSE_SYNC
+                    return True
+                self.resync()
+                continue
+            self.crc = CRC_TABLE[self.crc ^ byte]
+            if state == PARSE_COMMAND:
+                self.command = byte
+                self.state = PARSE_LENGTH
+            elif state == PARSE_LENGTH:
+                if byte > MAX_PAYLOAD:
+                    self.resync()
+                    continue
+                self.length = byte
+                self.received = 0
+                self.state = PARSE_PAYLOAD if byte else PARSE_CRC
+            elif state == PARSE_PAYLOAD:
+                self.received += 1
+                if self.received == self.length:
+                    self.state = PARSE_CRC
+        if self.state == PARSE_SYNC:
+            # nothing worth keeping
+            self.start = self.position = self.end = 0
+        return False
+
+    # the frame's SYNC was a false one, or the frame was cut short. Look for
+    # the next SYNC from the byte after it.
+    def resync(self):
+        self.badFrames += 1
+        self.position = self.start + 1
+        self.start = self.position
+        self.state = PARSE_SYNC
+
+    # moves the bytes still needed to the front of the buffer
+    def compact(self):
+        buffer = self.buffer
+        start = self.start
+        if start == 0:
+            # only when `next` wasn't called after a frame; drop it all
+            self.badFrames += 1
+            self.start = self.position = self.end = 0
+            self.state = PARSE_SYNC
+            return
+        for index in range(self.end - start):
+            buffer[index] = buffer[start + index]
+        self.position -= start
+        self.end -= start
+        self.start = 0
+
+    def payloadView(self):
+        offset = self.start + 3
+        return memoryview(self.buffer)[offset:offset + self.length]
+
+# the USB serial channel that isn't the REPL console, if boot.py turned it
+# on. Console bytes can't be used: the REPL takes ctrl-C (0x03) for itself.
+def findSerialPort():
+    if usb_cdc is None:
+        return None
+    port = getattr(usb_cdc, "data", None)
+    if port is None:
+        serials = getattr(usb_cdc, "serials", ())
+        if len(serials) > 1:
+            port = serials[1]
+    if port is not None:
+        port.timeout = 0
+    return port
+
+class SerialProtocol():
+    def __init__(self, port, handlers = None):
+        self.port = port
+        self.parser = FrameParser()
+        # command -> function(payload)
+        self.handlers = handlers if handlers is not None else {}
+        if CMD_PING not in self.handlers:
+            self.handlers[CMD_PING] = self.ping
+        self.frames = 0
+
+    # handles whatever has arrived since the last call and returns at once
+    def poll(self, currentTime = 0):
+        port = self.port
+        if port is None:
+            return
+        parser = self.parser
+        if not port.in_waiting:
+            # times out a stalled frame, which may have been a false SYNC
+            # in front of a real one
+            if parser.state != PARSE_SYNC:
+                self.dispatchFrames(parser.next(currentTime), currentTime)
+            return
+        data = port.read(min(port.in_waiting, MAX_READ))
+        for byte in data:
+            self.dispatchFrames(parser.feed(byte, currentTime), currentTime)
+
+    def dispatchFrames(self, found, currentTime):
+        parser = self.parser
+        while found:
+            self.frames += 1
+            self.dispatch(parser.command, parser.payloadView())
+            found = parser.next(currentTime)
+
+    def ping(self, payload):
+        return None
+
+    def dispatch(self, command, payload):
+        handler = self.handlers.get(command)
+        if handler is None:
+            self.send(RSP_NAK, bytes((command,)) + b"unknown command")
+            return
+        try:
+            reply = handler(payload)
+        except ValueError as error:
+            self.send(RSP_NAK, bytes((command,)) + str(error).encode("utf-8")[:MAX_PAYLOAD - 1])
+            return
+        if reply is None:
+            self.send(RSP_ACK, bytes((command,)))
+        else:
+            self.send(reply[0], reply[1])
+
+    def send(self, command, payload = b""):
+        if self.port is not None:
+            self.port.write(encodeFrame(command, payload))
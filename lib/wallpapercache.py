@@ -0,0 +1,69 @@
+import gc
+from constants import *
+
+# Keeps the displayio groups built by the wallpaper functions in
+# picodisplay.py (getAndroid, getTeams, ...) so that swapping layouts shows
+# an existing group instead of reading and decoding the BMP again.
+#
+# The RAM each wallpaper takes is measured with gc.mem_free() while it is
+# built. When the cached wallpapers go over `budgetBytes` the least
+# recently shown ones are dropped and rebuilt the next time they are needed.
+class WallpaperCache():
+    def __init__(self, factories, budgetBytes = WALLPAPER_CACHE_BYTES):
+        self.factories = factories
+        self.budgetBytes = budgetBytes
+        self.groups = [None] * len(factories)
+        self.sizes = [0] * len(factories)
+        self.lastUsed = [0] * len(factories)
+        self.useCount = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def memFree(self):
+        gc.collect()
+        # only CircuitPython and MicroPython can tell us
+        if hasattr(gc, "mem_free"):
+            return gc.mem_free()
+        return 0
+
+    def cachedBytes(self):
+        total = 0
+        for index in range(len(self.groups)):
+            if self.groups[index] is not None:
+                total += self.sizes[index]
+        return total
+
+    # the wallpaper group at index, built if it isn't cached
+    def get(self, index):
+        self.useCount += 1
+        self.lastUsed[index] = self.useCount
+        group = self.groups[index]
+        if group is not None:
+            self.hits += 1
+            return group
+        self.misses += 1
+        before = self.memFree()
+        group = self.factories[index]()
+        self.sizes[index] = max(0, before - self.memFree())
+        self.groups[index] = group
+        self.evict(index)
+        return group
+
+    # drops the least recently used wallpapers, other than `keep`, until
+    # the cache fits the budget
+    def evict(self, keep):
+        while self.cachedBytes() > self.budgetBytes:
+            oldest = -1
+            for index in range(len(self.groups)):
+                if index != keep and self.groups[index] is not None \
+                        and (oldest < 0 or self.lastUsed[index] < self.lastUsed[oldest]):
+                    oldest = index
+            if oldest < 0:
+                return
+            self.groups[oldest] = None
+            self.evictions += 1
+
+    def printStats(self):
+        print("  ~~> wallpapers: hits", self.hits, "misses", self.misses,
+              "evictions", self.evictions, "cached", self.cachedBytes(), "/", self.budgetBytes, "bytes")
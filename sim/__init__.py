@@ -0,0 +1,98 @@
+"""
+Runs the keypad firmware on a computer.
+
+The modules in sim/modules stand in for `board`, `busio`, `digitalio`,
+`pwmio`, `displayio`, `terminalio`, `usb_hid`, `micropython` and
+`adafruit_dotstar`, and `time` is swapped for a virtual clock, so the
+real `code.py` and everything in lib/ and keyconfig/ run unchanged with
+key presses played back from a trace:
+
+    python -m sim.run sim/traces/demo.txt
+
+or from Python:
+
+    from sim import simulate
+    from sim.trace import KeyTrace
+    hardware, firmware = simulate(KeyTrace().tap("X", 100).tap(0, 500), 2000)
+    print(len(hardware.keyboard.reports), firmware["scanner"].busReads)
+
+See sim/hardware.py for what is recorded.
+"""
+import os
+import sys
+
+from sim.clock import VirtualClock, SimulationFinished, installClock
+from sim import hardware as _hardware
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modules")
+BUNDLE = os.path.join(ROOT, "adafruit_circuitpython_libs", "adafruit-circuitpython-bundle-py-20210214", "lib")
+
+# the stand-ins go first so they shadow lib/adafruit_dotstar.py, and the
+# bundle goes last for adafruit_bus_device, which lib/ doesn't carry
+def setupPath():
+    for path in (BUNDLE, ROOT, os.path.join(ROOT, "lib"), MODULES):
+        if path in sys.path:
+            sys.path.remove(path)
+    sys.path.insert(0, os.path.join(ROOT, "lib"))
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, MODULES)
+    sys.path.append(BUNDLE)
+
+# names the firmware imports, dropped before each run so every run starts
+# from a fresh import with the new clock and hardware
+def forgetFirmwareModules():
+    for name in list(sys.modules):
+        module = sys.modules[name]
+        path = getattr(module, "__file__", None) or ""
+        if path.startswith(ROOT) and not name.startswith("sim"):
+            del sys.modules[name]
+        elif os.path.dirname(path) == MODULES:
+            del sys.modules[name]
+
+# installs a fresh simulated board playing `trace`, stopping the clock
+# after `untilMillis`. Returns the SimHardware.
+def install(trace = None, untilMillis = None, tickNs = 100000):
+    setupPath()
+    forgetFirmwareModules()
+    limitNs = None if untilMillis is None else untilMillis * 1000000
+    clock = VirtualClock(tickNs, limitNs)
+    installClock(clock)
+    return _hardware.install(_hardware.SimHardware(clock, trace))
+
+def runScript(path, namespace):
+    with open(path) as source:
+        code = compile(source.read(), path, "exec")
+    exec(code, namespace)
+
+# runs boot.py, if there is one, and then code.py (or another script)
+# until the clock stops. Returns the hardware along with the script's
+# globals. `hostBootProtocol` 1 plays a host that asks for the boot
+# keyboard, as a BIOS does.
+def simulate(trace, untilMillis, tickNs = 100000, script = "code.py", quiet = True, boot = "boot.py", serialFd = None,
+             hostBootProtocol = 0):
+    import time as hostTime
+    hostModule = sys.modules.get("time")
+    board = install(trace, untilMillis, tickNs)
+    board.serialFd = serialFd
+    board.hostBootProtocol = hostBootProtocol
+    path = os.path.join(ROOT, script)
+    firmware = { "__name__": "__main__", "__file__": path }
+    workingDirectory = os.getcwd()
+    stdout = sys.stdout
+    os.chdir(ROOT)
+    try:
+        if quiet:
+            sys.stdout = open(os.devnull, "w")
+        if boot is not None and os.path.exists(os.path.join(ROOT, boot)):
+            runScript(os.path.join(ROOT, boot), { "__name__": "__main__" })
+        runScript(path, firmware)
+    except SimulationFinished:
+        pass
+    finally:
+        if quiet:
+            sys.stdout.close()
+            sys.stdout = stdout
+        os.chdir(workingDirectory)
+        sys.modules["time"] = hostModule if hostModule is not None else hostTime
+    return board, firmware
@@ -0,0 +1,61 @@
+"""
+A virtual monotonic clock for running the firmware on a computer.
+
+Every read of the clock moves it on by `tickNs`, which stands in for the
+time the code between two reads took on the Pico. `sleep()` moves it on
+by however long was asked for without waiting. Once `limitNs` is passed
+the next read raises SimulationFinished, which is how a run of the
+never-ending main loop is brought to a stop.
+"""
+import sys
+import time as hostTime
+import types
+
+class SimulationFinished(BaseException):
+    # a BaseException so `except Exception` in the firmware can't swallow it
+    pass
+
+class VirtualClock():
+    def __init__(self, tickNs = 100000, limitNs = None):
+        self.nowNs = 0
+        self.tickNs = tickNs
+        self.limitNs = limitNs
+        self.reads = 0
+
+    def advance(self, ns):
+        self.nowNs += ns
+        if self.limitNs is not None and self.nowNs > self.limitNs:
+            raise SimulationFinished()
+
+    def monotonic_ns(self):
+        self.reads += 1
+        self.advance(self.tickNs)
+        return self.nowNs
+
+    def monotonic(self):
+        return self.monotonic_ns() / 1000000000
+
+    def sleep(self, seconds):
+        self.advance(int(seconds * 1000000000))
+
+    # the time now, without counting as a read
+    def millis(self):
+        return self.nowNs // 1000000
+
+# a copy of the host's time module with the monotonic clock and sleep
+# swapped for the virtual ones
+def timeModule(clock):
+    module = types.ModuleType("time")
+    for name in dir(hostTime):
+        if not name.startswith("__"):
+            setattr(module, name, getattr(hostTime, name))
+    module.monotonic = clock.monotonic
+    module.monotonic_ns = clock.monotonic_ns
+    module.sleep = clock.sleep
+    module.clock = clock
+    return module
+
+def installClock(clock):
+    previous = sys.modules.get("time")
+    sys.modules["time"] = timeModule(clock)
+    return previous
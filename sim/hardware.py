@@ -0,0 +1,178 @@
+"""
+The state behind the simulator's stand-in modules: the pins, the keypad's
+I2C expander, and everything the firmware sent out over USB, SPI and PWM.
+
+The stand-ins in sim/modules look the running simulation up with `get()`,
+so `import board` in the firmware and `hardware.get()` in a test or
+benchmark see the same pins and devices.
+
+Bus transfers move the virtual clock on by roughly what they take on the
+Pico (`I2C_BYTE_NS`, `SPI_BYTE_NS`, `HID_REPORT_NS`), so a loop that reads
+the expander every pass is measurably slower than one that doesn't.
+"""
+from sim.clock import VirtualClock
+from sim.trace import KeyTrace
+
+# 9 clocks a byte at 100kHz
+I2C_BYTE_NS = 90000
+# 8 clocks a byte at the DotStar's 1MHz
+SPI_BYTE_NS = 8000
+# a full speed USB HID endpoint is polled once a millisecond
+HID_REPORT_NS = 1000000
+
+EXPANDER_ADDRESS = 0x20
+INTERRUPT_PIN = "GP3"
+DISPLAY_BUTTON_PINS = ("GP14", "GP15")
+
+# the usage page, usage and report length of each device usb_hid.devices
+# offers by default
+HID_KEYBOARD = (0x01, 0x06, 8)
+HID_MOUSE    = (0x01, 0x02, 4)
+HID_CONSUMER = (0x0C, 0x01, 2)
+
+# A TCA9555 with the keypad on its 16 inputs. Pressed keys pull their
+# input low, and INT is held low from an input changing until the input
+# registers are next read, as on the real chip.
+class Expander():
+    def __init__(self, hardware):
+        self.hardware = hardware
+        self.registers = bytearray([0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0xFF, 0xFF])
+        self.pointer = 0
+        # the inputs as they were when last read, INT is low until they match
+        self.latched = 0xFFFF
+        self.reads = 0
+        self.writes = 0
+
+    def inputs(self):
+        return ~self.hardware.keyMask() & 0xFFFF
+
+    def interruptPending(self):
+        return self.inputs() != self.latched
+
+    def write(self, data):
+        self.writes += 1
+        if not data:
+            return
+        self.pointer = data[0] & 0x07
+        for value in data[1:]:
+            self.registers[self.pointer] = value
+            self.pointer ^= 1
+
+    def readInto(self, buffer, start, end):
+        self.reads += 1
+        inputs = self.inputs()
+        self.registers[0] = inputs & 0xFF
+        self.registers[1] = inputs >> 8
+        if self.pointer < 2:
+            self.latched = inputs
+        for index in range(start, end):
+            buffer[index] = self.registers[self.pointer]
+            self.pointer ^= 1
+
+# Keeps every report sent to one of usb_hid.devices, with the virtual
+# time it was sent at. Reports of the wrong length are refused, as
+# CircuitPython does.
+class HidDevice():
+    def __init__(self, hardware, usagePage, usage, reportLength, name):
+        self.hardware = hardware
+        self.usage_page = usagePage
+        self.usage = usage
+        self.reportLength = reportLength
+        self.name = name
+        self.reports = []
+        self.last_received_report = None
+
+    def send_report(self, report, report_id = None):
+        if len(report) != self.reportLength:
+            raise ValueError("Buffer incorrect size. Should be " + str(self.reportLength) + " bytes.")
+        self.hardware.clock.advance(HID_REPORT_NS)
+        self.reports.append((self.hardware.clock.millis(), bytes(report)))
+
+    def __repr__(self):
+        return "<sim HidDevice " + self.name + ">"
+
+class SimHardware():
+    def __init__(self, clock = None, trace = None):
+        self.clock = clock if clock is not None else VirtualClock()
+        self.trace = trace if trace is not None else KeyTrace()
+        self.expander = Expander(self)
+        self.i2cDevices = { EXPANDER_ADDRESS: self.expander }
+        self.keyboard = HidDevice(self, *HID_KEYBOARD, "keyboard")
+        self.mouse = HidDevice(self, *HID_MOUSE, "mouse")
+        self.consumer = HidDevice(self, *HID_CONSUMER, "consumer")
+        # what usb_hid.devices holds, boot.py can change it with usb_hid.enable
+        self.hidDevices = [ self.keyboard, self.mouse, self.consumer ]
+        # the boot device boot.py offered, and what the host asked for, 1
+        # for a boot keyboard as a BIOS would
+        self.bootDeviceOffered = 0
+        self.hostBootProtocol = 0
+        # levels forced onto input pins by name, e.g. a rotary encoder
+        self.pinLevels = {}
+        # a file descriptor usb_cdc.data reads and writes, e.g. one end of a
+        # pty, or None for no data port
+        self.serialFd = None
+        # the last value written to each output pin
+        self.outputs = {}
+        self.dotstars = []
+        self.displays = []
+        self.pwms = []
+        self.spiBytes = 0
+        self.i2cBytes = 0
+        self.lastMillis = -1
+
+    #--- INPUTS ---
+    def state(self):
+        return self.trace.stateAt(self.clock.millis())
+
+    def keyMask(self):
+        return self.state()[0]
+
+    def displayMask(self):
+        return self.state()[1]
+
+    def readPin(self, name, pullUp):
+        if name in self.pinLevels:
+            level = self.pinLevels[name]
+            return level() if callable(level) else level
+        if name == INTERRUPT_PIN:
+            return not self.expander.interruptPending()
+        if name in DISPLAY_BUTTON_PINS:
+            return not self.displayMask() & (1 << DISPLAY_BUTTON_PINS.index(name))
+        return pullUp
+    #--------------
+
+    #--- BUSES ---
+    def i2cTransfer(self, byteCount):
+        self.i2cBytes += byteCount
+        self.clock.advance(I2C_BYTE_NS * (byteCount + 1))
+
+    def spiTransfer(self, byteCount):
+        self.spiBytes += byteCount
+        self.clock.advance(SPI_BYTE_NS * byteCount)
+    #-------------
+
+    def summary(self):
+        lines = [
+            "virtual time      " + str(self.clock.millis()) + " ms (" + str(self.clock.reads) + " clock reads)",
+            "expander          " + str(self.expander.reads) + " reads, " + str(self.i2cBytes) + " I2C bytes",
+        ]
+        for device in self.hidDevices:
+            lines.append("%-18s" % (device.name + " reports") + str(len(device.reports)))
+        for index, strip in enumerate(self.dotstars):
+            lines.append("dotstar " + str(index) + "         " + str(strip.shows) + " frames, " + str(self.spiBytes) + " SPI bytes")
+        for index, display in enumerate(self.displays):
+            lines.append("display " + str(index) + "         " + str(display.shows) + " shows, " + str(display.rotations) + " rotations")
+        return "\n".join(lines)
+
+current = None
+
+def install(hardware):
+    global current
+    current = hardware
+    return hardware
+
+# the running simulation, or an idle one if nothing has been installed
+def get():
+    if current is None:
+        install(SimHardware())
+    return current
@@ -0,0 +1,54 @@
+# Stand-in for the adafruit_dotstar library. Colours are kept as given and
+# every `show()` is counted, along with the SPI bytes it would have taken.
+from sim import hardware
+
+START_HEADER_SIZE = 4
+
+class DotStar():
+    def __init__(self, clock, data, n, *, brightness = 1.0, auto_write = True, pixel_order = None, baudrate = 4000000):
+        self.n = n
+        self.brightness = brightness
+        self.auto_write = auto_write
+        self.pixels = [0] * n
+        self.shows = 0
+        # the colours at each show
+        self.frames = []
+        self.keepFrames = False
+        hardware.get().dotstars.append(self)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, index):
+        return self.pixels[index]
+
+    def __setitem__(self, index, colour):
+        if isinstance(index, slice):
+            for position, value in zip(range(*index.indices(self.n)), colour):
+                self.pixels[position] = value
+        else:
+            self.pixels[index] = colour
+        if self.auto_write:
+            self.show()
+
+    def fill(self, colour):
+        for index in range(self.n):
+            self.pixels[index] = colour
+        if self.auto_write:
+            self.show()
+
+    def show(self):
+        self.shows += 1
+        if self.keepFrames:
+            self.frames.append((hardware.get().clock.millis(), list(self.pixels)))
+        # a start frame, 4 bytes a pixel and an end frame
+        hardware.get().spiTransfer(START_HEADER_SIZE + 4 * self.n + (self.n + 15) // 16)
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.deinit()
@@ -0,0 +1,16 @@
+# Stand-in for CircuitPython's `board` on a Raspberry Pi Pico.
+
+class Pin():
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "board." + self.name
+
+for _number in range(30):
+    globals()["GP" + str(_number)] = Pin("GP" + str(_number))
+
+LED = GP25
+SMPS_MODE = GP23
+VBUS_SENSE = GP24
+VOLTAGE_MONITOR = GP29
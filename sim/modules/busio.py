@@ -0,0 +1,82 @@
+# Stand-in for CircuitPython's `busio`. I2C talks to the simulated devices
+# in `hardware.i2cDevices`, SPI only counts what is written.
+from sim import hardware
+
+class I2C():
+    def __init__(self, scl, sda, *, frequency = 100000, timeout = 255):
+        self.scl = scl
+        self.sda = sda
+        self.frequency = frequency
+        self.locked = False
+
+    def try_lock(self):
+        if self.locked:
+            return False
+        self.locked = True
+        return True
+
+    def unlock(self):
+        self.locked = False
+
+    def scan(self):
+        return sorted(hardware.get().i2cDevices)
+
+    def device(self, address):
+        device = hardware.get().i2cDevices.get(address)
+        if device is None:
+            raise OSError(19, "No such device")
+        return device
+
+    def writeto(self, address, buffer, *, start = 0, end = None):
+        if end is None:
+            end = len(buffer)
+        self.device(address).write(bytes(buffer[start:end]))
+        hardware.get().i2cTransfer(end - start)
+
+    def readfrom_into(self, address, buffer, *, start = 0, end = None):
+        if end is None:
+            end = len(buffer)
+        self.device(address).readInto(buffer, start, end)
+        hardware.get().i2cTransfer(end - start)
+
+    def writeto_then_readfrom(self, address, outBuffer, inBuffer, *, out_start = 0, out_end = None, in_start = 0, in_end = None):
+        self.writeto(address, outBuffer, start=out_start, end=out_end)
+        self.readfrom_into(address, inBuffer, start=in_start, end=in_end)
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.deinit()
+
+class SPI():
+    def __init__(self, clock, MOSI = None, MISO = None):
+        self.clock = clock
+        self.MOSI = MOSI
+        self.MISO = MISO
+        self.locked = False
+        self.bytesWritten = 0
+
+    def try_lock(self):
+        if self.locked:
+            return False
+        self.locked = True
+        return True
+
+    def unlock(self):
+        self.locked = False
+
+    def configure(self, *, baudrate = 100000, polarity = 0, phase = 0, bits = 8):
+        self.baudrate = baudrate
+
+    def write(self, buffer, *, start = 0, end = None):
+        if end is None:
+            end = len(buffer)
+        self.bytesWritten += end - start
+        hardware.get().spiTransfer(end - start)
+
+    def deinit(self):
+        pass
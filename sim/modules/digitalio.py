@@ -0,0 +1,54 @@
+# Stand-in for CircuitPython's `digitalio`. Inputs read the simulated pin
+# levels, outputs are recorded in `hardware.outputs`.
+from sim import hardware
+
+class Direction():
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+class Pull():
+    UP = "UP"
+    DOWN = "DOWN"
+
+class DriveMode():
+    PUSH_PULL = "PUSH_PULL"
+    OPEN_DRAIN = "OPEN_DRAIN"
+
+class DigitalInOut():
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.drive_mode = DriveMode.PUSH_PULL
+        self._value = False
+
+    def switch_to_input(self, pull = None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def switch_to_output(self, value = False, drive_mode = DriveMode.PUSH_PULL):
+        self.direction = Direction.OUTPUT
+        self.drive_mode = drive_mode
+        self.value = value
+
+    @property
+    def value(self):
+        if self.direction == Direction.OUTPUT:
+            return self._value
+        return bool(hardware.get().readPin(self.pin.name, self.pull == Pull.UP))
+
+    @value.setter
+    def value(self, value):
+        if self.direction != Direction.OUTPUT:
+            raise AttributeError("Cannot set value when direction is input.")
+        self._value = bool(value)
+        hardware.get().outputs[self.pin.name] = self._value
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.deinit()
@@ -0,0 +1,254 @@
+# Stand-in for CircuitPython's `displayio`, without a screen. Groups,
+# TileGrids, Bitmaps and Palettes behave as on the Pico (including Group's
+# max_size), and a Display can draw what it shows into a framebuffer of
+# 0xRRGGBB values with `framebuffer()`, or save it with `savePpm()`.
+from sim import hardware
+
+def release_displays():
+    pass
+
+class Bitmap():
+    def __init__(self, width, height, value_count):
+        if value_count < 1:
+            raise ValueError("value_count must be > 0")
+        self.width = width
+        self.height = height
+        self.value_count = value_count
+        self.data = bytearray(width * height) if value_count <= 256 else [0] * (width * height)
+
+    def offset(self, index):
+        if isinstance(index, tuple):
+            x, y = index
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                raise IndexError("pixel coordinates out of bounds")
+            return y * self.width + x
+        return index
+
+    def __getitem__(self, index):
+        return self.data[self.offset(index)]
+
+    def __setitem__(self, index, value):
+        if value >= self.value_count:
+            raise ValueError("pixel value requires too many bits")
+        self.data[self.offset(index)] = value
+
+    def fill(self, value):
+        for index in range(len(self.data)):
+            self.data[index] = value
+
+class Palette():
+    def __init__(self, color_count):
+        self.colours = [0] * color_count
+        self.transparent = [False] * color_count
+
+    def __len__(self):
+        return len(self.colours)
+
+    def __getitem__(self, index):
+        return self.colours[index]
+
+    def __setitem__(self, index, colour):
+        if isinstance(colour, (bytes, bytearray, tuple, list)):
+            colour = (colour[0] << 16) | (colour[1] << 8) | colour[2]
+        self.colours[index] = colour & 0xFFFFFF
+
+    def make_transparent(self, index):
+        self.transparent[index] = True
+
+    def make_opaque(self, index):
+        self.transparent[index] = False
+
+    def is_transparent(self, index):
+        return self.transparent[index]
+
+class TileGrid():
+    def __init__(self, bitmap, *, pixel_shader, width = 1, height = 1, tile_width = None, tile_height = None, default_tile = 0, x = 0, y = 0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.width = width
+        self.height = height
+        self.tile_width = bitmap.width if tile_width is None else tile_width
+        self.tile_height = bitmap.height if tile_height is None else tile_height
+        self.tiles = bytearray([default_tile] * (width * height))
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self.flip_x = False
+        self.flip_y = False
+        self.transpose_xy = False
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        return self.tiles[index]
+
+    def __setitem__(self, index, tile):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        self.tiles[index] = tile
+
+    def draw(self, frame, left, top, scale):
+        if self.hidden:
+            return
+        bitmap = self.bitmap
+        tilesAcross = max(1, bitmap.width // self.tile_width)
+        palette = self.pixel_shader
+        left += self.x * scale
+        top += self.y * scale
+        for tileIndex, tile in enumerate(self.tiles):
+            tileLeft = left + (tileIndex % self.width) * self.tile_width * scale
+            tileTop = top + (tileIndex // self.width) * self.tile_height * scale
+            sourceX = (tile % tilesAcross) * self.tile_width
+            sourceY = (tile // tilesAcross) * self.tile_height
+            for y in range(self.tile_height):
+                for x in range(self.tile_width):
+                    value = bitmap.data[(sourceY + y) * bitmap.width + sourceX + x]
+                    if value >= len(palette.colours) or palette.transparent[value]:
+                        continue
+                    frame.fill(tileLeft + x * scale, tileTop + y * scale, scale, palette.colours[value])
+
+class Group():
+    def __init__(self, *, max_size = 4, scale = 1, x = 0, y = 0):
+        self.max_size = max_size
+        # kept apart from the x, y and scale properties, which subclasses
+        # such as adafruit_display_text's Label override
+        self._groupScale = scale
+        self._groupX = x
+        self._groupY = y
+        self.hidden = False
+        self.layers = []
+
+    @property
+    def x(self):
+        return self._groupX
+
+    @x.setter
+    def x(self, value):
+        self._groupX = value
+
+    @property
+    def y(self):
+        return self._groupY
+
+    @y.setter
+    def y(self, value):
+        self._groupY = value
+
+    @property
+    def scale(self):
+        return self._groupScale
+
+    @scale.setter
+    def scale(self, value):
+        if value < 1:
+            raise ValueError("scale must be >= 1")
+        self._groupScale = value
+
+    def append(self, layer):
+        self.insert(len(self.layers), layer)
+
+    def insert(self, index, layer):
+        if len(self.layers) >= self.max_size:
+            raise RuntimeError("Group full")
+        self.layers.insert(index, layer)
+
+    def index(self, layer):
+        return self.layers.index(layer)
+
+    def remove(self, layer):
+        self.layers.remove(layer)
+
+    def pop(self, index = -1):
+        return self.layers.pop(index)
+
+    def __len__(self):
+        return len(self.layers)
+
+    def __getitem__(self, index):
+        return self.layers[index]
+
+    def __setitem__(self, index, layer):
+        self.layers[index] = layer
+
+    def __delitem__(self, index):
+        del self.layers[index]
+
+    def draw(self, frame, left, top, scale):
+        if self.hidden:
+            return
+        left += self._groupX * scale
+        top += self._groupY * scale
+        scale *= self._groupScale
+        for layer in self.layers:
+            layer.draw(frame, left, top, scale)
+
+class FourWire():
+    def __init__(self, spi_bus, *, command, chip_select, reset = None, baudrate = 24000000, polarity = 0, phase = 0):
+        self.spi_bus = spi_bus
+
+    def reset(self):
+        pass
+
+class Frame():
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.pixels = [0] * (width * height)
+
+    def fill(self, left, top, size, colour):
+        for y in range(max(0, top), min(self.height, top + size)):
+            row = y * self.width
+            for x in range(max(0, left), min(self.width, left + size)):
+                self.pixels[row + x] = colour
+
+class Display():
+    def __init__(self, display_bus, init_sequence, *, width, height, colstart = 0, rowstart = 0, rotation = 0, auto_refresh = True, **kwargs):
+        self.bus = display_bus
+        self.physicalWidth = width
+        self.physicalHeight = height
+        self._rotation = rotation
+        self.auto_refresh = auto_refresh
+        self.group = None
+        self.shows = 0
+        self.rotations = 0
+        hardware.get().displays.append(self)
+
+    @property
+    def rotation(self):
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, value):
+        if value % 90:
+            raise ValueError("Display rotation must be in 90 degree increments")
+        self._rotation = value % 360
+        self.rotations += 1
+
+    @property
+    def width(self):
+        return self.physicalHeight if self._rotation % 180 else self.physicalWidth
+
+    @property
+    def height(self):
+        return self.physicalWidth if self._rotation % 180 else self.physicalHeight
+
+    def show(self, group):
+        self.group = group
+        self.shows += 1
+
+    def refresh(self, *, target_frames_per_second = 60, minimum_frames_per_second = 1):
+        return True
+
+    # what the screen shows, as width x height 0xRRGGBB values in rows
+    def framebuffer(self):
+        frame = Frame(self.width, self.height)
+        if self.group is not None:
+            self.group.draw(frame, 0, 0, 1)
+        return frame
+
+    def savePpm(self, fileName):
+        frame = self.framebuffer()
+        with open(fileName, "wb") as image:
+            image.write(("P6 " + str(frame.width) + " " + str(frame.height) + " 255\n").encode())
+            for colour in frame.pixels:
+                image.write(bytes(((colour >> 16) & 0xFF, (colour >> 8) & 0xFF, colour & 0xFF)))
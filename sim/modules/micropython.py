@@ -0,0 +1,10 @@
+# Stand-in for MicroPython's `micropython` module.
+
+def const(value):
+    return value
+
+def native(function):
+    return function
+
+def viper(function):
+    return function
@@ -0,0 +1,25 @@
+# Stand-in for CircuitPython's `pwmio`. Each PWMOut counts the writes to
+# its duty cycle.
+from sim import hardware
+
+class PWMOut():
+    def __init__(self, pin, *, duty_cycle = 0, frequency = 500, variable_frequency = False):
+        self.pin = pin
+        self.frequency = frequency
+        self._duty_cycle = duty_cycle
+        self.writes = 0
+        hardware.get().pwms.append(self)
+
+    @property
+    def duty_cycle(self):
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 65535:
+            raise ValueError("duty_cycle must be 0-65535")
+        self._duty_cycle = value
+        self.writes += 1
+
+    def deinit(self):
+        pass
@@ -0,0 +1,40 @@
+# Stand-in for CircuitPython's `terminalio`. FONT has the 6x12 cells of
+# the built in font, with each printable character drawn as a solid block
+# so text shows up in a simulated framebuffer.
+import displayio
+
+GLYPH_WIDTH = 6
+GLYPH_HEIGHT = 12
+FIRST_CHAR = 32
+LAST_CHAR = 126
+
+class Glyph():
+    def __init__(self, bitmap, tileIndex):
+        self.bitmap = bitmap
+        self.tile_index = tileIndex
+        self.width = GLYPH_WIDTH
+        self.height = GLYPH_HEIGHT
+        self.dx = 0
+        self.dy = 0
+        self.shift_x = GLYPH_WIDTH
+        self.shift_y = 0
+
+class BuiltinFont():
+    def __init__(self):
+        count = LAST_CHAR - FIRST_CHAR + 1
+        self.bitmap = displayio.Bitmap(GLYPH_WIDTH * count, GLYPH_HEIGHT, 2)
+        for tile in range(1, count):
+            for y in range(2, GLYPH_HEIGHT - 2):
+                for x in range(1, GLYPH_WIDTH - 1):
+                    self.bitmap[tile * GLYPH_WIDTH + x, y] = 1
+        self.glyphs = [Glyph(self.bitmap, tile) for tile in range(count)]
+
+    def get_bounding_box(self):
+        return (GLYPH_WIDTH, GLYPH_HEIGHT)
+
+    def get_glyph(self, codepoint):
+        if FIRST_CHAR <= codepoint <= LAST_CHAR:
+            return self.glyphs[codepoint - FIRST_CHAR]
+        return self.glyphs[ord("?") - FIRST_CHAR]
+
+FONT = BuiltinFont()
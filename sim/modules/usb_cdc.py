@@ -0,0 +1,34 @@
+# Stand-in for CircuitPython's `usb_cdc`. `data` is a Serial over the
+# simulated board's `serialFd` (see `python -m sim.run --serial`), or None
+# as on a board where boot.py didn't turn the data port on.
+import fcntl
+import os
+import struct
+import termios
+from sim import hardware
+
+class Serial():
+    def __init__(self, fd):
+        self.fd = fd
+        self.timeout = 0
+        os.set_blocking(fd, False)
+
+    @property
+    def in_waiting(self):
+        return struct.unpack("i", fcntl.ioctl(self.fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+
+    def read(self, size = 1):
+        try:
+            return os.read(self.fd, size)
+        except BlockingIOError:
+            return b""
+
+    def write(self, buffer):
+        return os.write(self.fd, buffer)
+
+console = None
+data = None if hardware.get().serialFd is None else Serial(hardware.get().serialFd)
+serials = []
+
+def enable(console = True, data = False):
+    pass
@@ -0,0 +1,26 @@
+# Stand-in for CircuitPython's `usb_hid`: a keyboard, mouse and consumer
+# control device that record every report sent to them. `enable()` and
+# `Device` work as on CircuitPython 7, for boot.py.
+from sim import hardware
+
+devices = hardware.get().hidDevices
+
+class Device():
+    KEYBOARD = hardware.get().keyboard
+    MOUSE = hardware.get().mouse
+    CONSUMER_CONTROL = hardware.get().consumer
+
+    def __new__(cls, *, report_descriptor, usage_page, usage, report_ids, in_report_lengths, out_report_lengths):
+        return hardware.HidDevice(hardware.get(), usage_page, usage, in_report_lengths[0], "device " + str(report_ids[0]))
+
+def enable(enabled, boot_device = 0):
+    devices[:] = list(enabled)
+    hardware.get().bootDeviceOffered = boot_device
+
+# the host only asks for the boot keyboard if boot.py offered one
+def get_boot_device():
+    current = hardware.get()
+    return current.hostBootProtocol if current.bootDeviceOffered else 0
+
+def disable():
+    devices[:] = []
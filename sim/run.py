@@ -0,0 +1,73 @@
+"""
+Plays a key trace through code.py and prints what came out.
+
+    python -m sim.run TRACE [--until MILLIS] [--tick-us MICROS] [--verbose] [--screen FILE.ppm] [--serial]
+
+`--until` defaults to a second after the trace's last change. `--tick-us`
+is how far the virtual clock moves on each read, standing in for the
+time the code between reads takes on the Pico.
+
+`--serial` gives the board a USB data port on one end of a pty and prints
+the path of the other end, for host/keypadclient.py to connect to. The
+virtual clock doesn't wait for the host, so give a long `--until`.
+"""
+import argparse
+import os
+import sys
+import time
+
+from sim import simulate
+from sim.trace import KeyTrace
+
+def describeReport(report):
+    if len(report) > 8:
+        # an N key rollover bitmap
+        keys = [str(code) for code in range(8 * (len(report) - 1)) if report[1 + (code >> 3)] & (1 << (code & 7))]
+    else:
+        keys = [str(code) for code in report[2:] if code]
+    if not report[0] and not keys:
+        return "release"
+    modifier = ("mod=0x%02x " % report[0]) if report[0] else ""
+    return (modifier + "keys=" + ",".join(keys)) if keys else modifier.strip()
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description="Run code.py against a simulated keypad")
+    parser.add_argument("trace")
+    parser.add_argument("--until", type=int, default=None, help="virtual millis to run for")
+    parser.add_argument("--tick-us", type=int, default=100, help="virtual micros per clock read")
+    parser.add_argument("--verbose", action="store_true", help="show the firmware's own output and every report")
+    parser.add_argument("--screen", default=None, help="save the display as a PPM image at the end")
+    parser.add_argument("--serial", action="store_true", help="connect the USB data port to a pty")
+    options = parser.parse_args(arguments)
+
+    trace = KeyTrace.load(options.trace)
+    until = options.until if options.until is not None else trace.endMillis() + 1000
+    serialFd = None
+    if options.serial:
+        import pty
+        import tty
+        serialFd, hostFd = pty.openpty()
+        tty.setraw(serialFd)
+        print("serial port       " + os.ttyname(hostFd), flush=True)
+    start = time.perf_counter()
+    hardware, firmware = simulate(trace, until, options.tick_us * 1000, quiet=not options.verbose, serialFd=serialFd)
+    wallSeconds = time.perf_counter() - start
+
+    print(hardware.summary())
+    scanner = firmware.get("scanner")
+    if scanner is not None:
+        print("scanner           " + str(scanner.busReads) + " bus reads, " + str(scanner.skippedReads) + " skipped")
+    print("wall time         %.2f s" % wallSeconds)
+    if options.verbose:
+        for device in hardware.hidDevices:
+            for millis, report in device.reports:
+                if device.usage == 0x06:
+                    print("%8d ms  %-9s %s" % (millis, device.name, describeReport(report)))
+                else:
+                    print("%8d ms  %-9s %s" % (millis, device.name, report.hex()))
+    if options.screen and hardware.displays:
+        hardware.displays[0].savePpm(options.screen)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
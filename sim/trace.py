@@ -0,0 +1,94 @@
+"""
+Scripted key presses for the simulator.
+
+A trace is a text file with one change per line:
+
+    # millis  action  key
+    0         down    0
+    80        up      0
+    500       down    X
+
+Keys 0 - 15 are the keypad, X and Y (or A and B) are the buttons on the
+Pico display. Blank lines and anything after a `#` are ignored. Traces
+can also be built in code:
+
+    trace = KeyTrace().tap(3, 100).hold(8, 400, 1500)
+"""
+
+DISPLAY_KEYS = { "X": 0, "Y": 1, "A": 2, "B": 3 }
+
+class KeyTrace():
+    def __init__(self, changes = ()):
+        # (millis, down, keypad key or -1, display key or -1), kept sorted
+        self.changes = []
+        for change in changes:
+            self.add(*change)
+        self.rewind()
+
+    @staticmethod
+    def parse(text):
+        trace = KeyTrace()
+        for number, line in enumerate(text.splitlines()):
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) != 3 or parts[1] not in ("down", "up"):
+                raise ValueError("line " + str(number + 1) + ": expected 'millis down|up key', got " + repr(line))
+            trace.add(int(parts[0]), parts[1] == "down", parts[2])
+        return trace
+
+    @staticmethod
+    def load(fileName):
+        with open(fileName) as traceFile:
+            return KeyTrace.parse(traceFile.read())
+
+    def add(self, millis, down, key):
+        key = str(key).upper()
+        if key in DISPLAY_KEYS:
+            change = (millis, down, -1, DISPLAY_KEYS[key])
+        elif key.isdigit() and int(key) < 16:
+            change = (millis, down, int(key), -1)
+        else:
+            raise ValueError("unknown key " + repr(key))
+        self.changes.append(change)
+        self.changes.sort(key=lambda change: change[0])
+        return self
+
+    def hold(self, key, atMillis, forMillis):
+        return self.add(atMillis, True, key).add(atMillis + forMillis, False, key)
+
+    def tap(self, key, atMillis, forMillis = 60):
+        return self.hold(key, atMillis, forMillis)
+
+    def endMillis(self):
+        return self.changes[-1][0] if self.changes else 0
+
+    def format(self):
+        names = dict((index, name) for name, index in DISPLAY_KEYS.items() if name in "XY")
+        lines = []
+        for millis, down, key, displayKey in self.changes:
+            name = str(key) if key >= 0 else names.get(displayKey, "AB"[displayKey - 2])
+            lines.append("%-8d %-5s %s" % (millis, "down" if down else "up", name))
+        return "\n".join(lines) + "\n"
+
+    #--- PLAYBACK ---
+    def rewind(self):
+        self.next = 0
+        self.keyMask = 0
+        self.displayMask = 0
+
+    # the keys held at `millis`. Time only goes forward during a run.
+    def stateAt(self, millis):
+        changes = self.changes
+        while self.next < len(changes) and changes[self.next][0] <= millis:
+            _, down, key, displayKey = changes[self.next]
+            if key >= 0:
+                bit = 1 << key
+                self.keyMask = (self.keyMask | bit) if down else (self.keyMask & ~bit)
+            else:
+                bit = 1 << displayKey
+                self.displayMask = (self.displayMask | bit) if down else (self.displayMask & ~bit)
+            self.next += 1
+        return self.keyMask, self.displayMask
+    #----------------
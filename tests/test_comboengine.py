@@ -0,0 +1,108 @@
+"""
+Tests for lib/comboengine.py, feeding ComboEngine key masks and times and
+checking what reaches the KeyStateMachine after it.
+
+    pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from constants import *
+from comboengine import *
+from keystatemachine import *
+
+# a keyconfig with combos, remembering the combo events it is given
+class Combos():
+    def __init__(self, masks):
+        self.masks = masks
+        self.comboEvents = []
+
+    def comboMasks(self):
+        return self.masks
+
+    def handleCombo(self, mask, event):
+        self.comboEvents.append((mask, event))
+
+    # every key fires on the way down, so anything let through shows at once
+    def handledEvents(self, key):
+        return EVENT_SINGLE_PRESS
+
+# runs `scans`, a list of (millis, down mask), through a ComboEngine set up
+# for `keyconfig` and a KeyStateMachine, and returns what the state machine
+# saw on each scan and the (millis, key, event) it produced
+def run(keyconfig, scans):
+    engine = ComboEngine()
+    engine.configureFor(keyconfig)
+    keys = KeyStateMachine(BUTTON_COUNT)
+    keys.configureFor(keyconfig)
+    seen = []
+    events = []
+    for currentTime, downMask in scans:
+        keyState = engine.update(downMask, currentTime)
+        seen.append(keyState)
+        eventMask = keys.update(keyState, currentTime)
+        for key in range(BUTTON_COUNT):
+            if eventMask & (1 << key):
+                events.append((currentTime, key, keys.events[key]))
+    return engine, seen, events
+
+def test_combo_fires_and_hides_its_keys():
+    keyconfig = Combos((0b11,))
+    scans = [(1000, 0), (1000, 0b01), (1010, 0b11), (1100, 0b11), (1200, 0b10), (1210, 0)]
+    engine, seen, events = run(keyconfig, scans)
+    assert keyconfig.comboEvents == [(0b11, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS), (0b11, EVENT_KEY_UP)]
+    assert engine.combosFired == 1
+    # neither key's own action fires
+    assert seen == [0] * len(scans)
+    assert events == []
+
+def test_combo_up_waits_for_all_its_keys():
+    keyconfig = Combos((0b11,))
+    run(keyconfig, [(1000, 0b11), (1100, 0b01)])
+    assert keyconfig.comboEvents == [(0b11, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS)]
+
+def test_single_key_is_let_through_after_the_window():
+    keyconfig = Combos((0b11,))
+    scans = [(1000, 0b01), (1000 + COMBO_WINDOW_MILLIS - 1, 0b01), (1000 + COMBO_WINDOW_MILLIS, 0b01)]
+    engine, seen, events = run(keyconfig, scans)
+    assert seen == [0, 0, 0b01]
+    assert events == [(1000 + COMBO_WINDOW_MILLIS, 0, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS)]
+    assert keyconfig.comboEvents == []
+    assert engine.combosFired == 0
+
+def test_keys_in_no_combo_are_not_held_back():
+    keyconfig = Combos((0b11,))
+    engine, seen, events = run(keyconfig, [(1000, 0b100)])
+    assert seen == [0b100]
+
+def test_early_release_flashes_the_key_for_one_scan():
+    keyconfig = Combos((0b11,))
+    scans = [(1000, 0b01), (1020, 0), (1021, 0), (1022, 0)]
+    engine, seen, events = run(keyconfig, scans)
+    assert seen == [0, 0b01, 0, 0]
+    assert (1020, 0, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS) in events
+    assert (1021, 0, EVENT_KEY_UP) in events
+    assert keyconfig.comboEvents == []
+
+def test_bigger_combo_is_preferred():
+    keyconfig = Combos((0b011, 0b111))
+    scans = [(1000, 0b001), (1010, 0b011), (1020, 0b111), (1100, 0b111), (1200, 0)]
+    engine, seen, events = run(keyconfig, scans)
+    assert keyconfig.comboEvents == [(0b111, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS), (0b111, EVENT_KEY_UP)]
+    assert events == []
+
+def test_smaller_combo_fires_once_the_window_is_out():
+    keyconfig = Combos((0b011, 0b111))
+    scans = [(1000, 0b001), (1010, 0b011), (1000 + COMBO_WINDOW_MILLIS, 0b011)]
+    engine, seen, events = run(keyconfig, scans)
+    # the bigger combo could still be made until the window runs out
+    assert keyconfig.comboEvents == [(0b011, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS)]
+    assert seen == [0, 0, 0]
+
+def test_no_combos_hands_the_mask_back():
+    engine = ComboEngine()
+    engine.configureFor(object())
+    assert engine.update(0b101, 1000) == 0b101
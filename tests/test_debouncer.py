@@ -0,0 +1,117 @@
+"""
+Tests for lib/debouncer.py, feeding Debouncer raw key masks and times and
+checking what KeyStateMachine makes of the debounced keys.
+
+    pytest tests
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from constants import *
+from debouncer import *
+from keystatemachine import *
+
+# the events key 0 gets from `scans`, a list of (millis, raw mask)
+def eventsFor(debouncer, scans):
+    keys = KeyStateMachine(BUTTON_COUNT)
+    events = []
+    for currentTime, raw in scans:
+        if keys.update(debouncer.update(raw, currentTime), currentTime) & 1:
+            events.append((currentTime, keys.events[0]))
+    return events
+
+# what Debouncer should give, key by key with a timestamp each
+def slowDebounce(millis, scans):
+    state = 0
+    upMillis = {}
+    states = []
+    for currentTime, raw in scans:
+        state |= raw
+        for key in range(BUTTON_COUNT):
+            bit = 1 << key
+            if not state & bit or raw & bit:
+                upMillis.pop(key, None)
+                continue
+            upMillis.setdefault(key, currentTime)
+            if currentTime - upMillis[key] >= millis:
+                state &= ~bit
+                del upMillis[key]
+        states.append(state)
+    return states
+
+def test_press_goes_through_at_once():
+    debouncer = Debouncer(5)
+    assert debouncer.update(0, 10000) == 0
+    assert debouncer.update(1, 10001) == 1
+    events = eventsFor(Debouncer(5), [(10000, 0), (10001, 1)])
+    assert events == [(10001, EVENT_KEY_DOWN)]
+
+def test_bouncing_release_is_one_key_up():
+    # let go at 10100, bouncing back down for a scan every couple of
+    # milliseconds until 10108
+    scans = [(10000, 0), (10001, 1), (10050, 1), (10100, 0), (10101, 1),
+             (10102, 0), (10104, 1), (10106, 0), (10107, 1), (10108, 0)]
+    scans += [(time, 0) for time in range(10109, 10400)]
+    events = eventsFor(Debouncer(5), scans)
+    keyEvents = [event & (EVENT_KEY_DOWN | EVENT_KEY_UP) for _, event in events]
+    assert keyEvents.count(EVENT_KEY_UP) == 1
+    assert keyEvents.count(EVENT_KEY_DOWN) == 1
+    # let go 5 ms after the last bounce, and still a single press
+    assert (10113, EVENT_KEY_UP) in events
+    assert [event for _, event in events if event & EVENT_DOUBLE_PRESS] == []
+    assert [event for _, event in events if event & EVENT_SINGLE_PRESS] != []
+
+def test_bouncing_release_without_debounce_is_a_double_press():
+    scans = [(10000, 0), (10001, 1), (10100, 0), (10101, 1), (10102, 0)]
+    scans += [(time, 0) for time in range(10103, 10400)]
+    events = eventsFor(Debouncer(0), scans)
+    assert [event for _, event in events if event & EVENT_DOUBLE_PRESS] != []
+
+def test_release_is_timed_by_the_clock():
+    debouncer = Debouncer(5)
+    debouncer.update(1, 10000)
+    # scans 20 ms apart let go on the first scan past the debounce time
+    assert debouncer.update(0, 10020) == 1
+    assert debouncer.update(0, 10040) == 0
+    debouncer.update(1, 10060)
+    # however many scans come within it
+    for time in range(10061, 10066):
+        assert debouncer.update(0, time) == 1
+    assert debouncer.update(0, 10066) == 0
+
+def test_zero_millis_lets_go_at_once():
+    debouncer = Debouncer(0)
+    assert debouncer.update(3, 10000) == 3
+    assert debouncer.update(1, 10000) == 1
+    assert not debouncer.isSettling(1)
+    assert debouncer.update(0, 10001) == 0
+
+def test_is_settling_until_let_go():
+    debouncer = Debouncer(5)
+    debouncer.update(1, 10000)
+    assert not debouncer.isSettling(1)
+    debouncer.update(0, 10001)
+    assert debouncer.isSettling(0)
+    debouncer.update(0, 10006)
+    assert not debouncer.isSettling(0)
+    debouncer.reset(2)
+    assert debouncer.state == 2
+    assert debouncer.isSettling(0)
+
+def test_matches_key_by_key_debounce():
+    for seed in range(100):
+        rng = random.Random(seed)
+        millis = rng.choice((0, 1, 5, 7, 20))
+        scans = []
+        time = 10000
+        raw = 0
+        for _ in range(400):
+            time += rng.choice((0, 1, 1, 2, 3, 8, 40))
+            raw ^= rng.getrandbits(BUTTON_COUNT) & rng.getrandbits(BUTTON_COUNT)
+            scans.append((time, raw))
+        debouncer = Debouncer(millis)
+        assert [debouncer.update(raw, time) for time, raw in scans] == slowDebounce(millis, scans), seed
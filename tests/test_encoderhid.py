@@ -0,0 +1,133 @@
+"""
+Tests for lib/encoderhid.py with an encoder that turns as much as it is
+told to, and a ConsumerControl and Mouse that record what they send.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from adafruit_hid.consumer_control_code import ConsumerControlCode
+from encoderhid import *
+
+UP = ConsumerControlCode.VOLUME_INCREMENT
+DOWN = ConsumerControlCode.VOLUME_DECREMENT
+
+class Encoder():
+    def __init__(self):
+        self.delta = 0
+
+    def timeInMillis(self):
+        return 0
+
+    def update(self, currentTime):
+        return 0
+
+    def takeDelta(self):
+        delta = self.delta
+        self.delta = 0
+        return delta
+
+class ConsumerControl():
+    def __init__(self):
+        self.sent = []
+
+    def send(self, code):
+        self.sent.append(code)
+
+class Mouse():
+    def __init__(self):
+        self.wheels = []
+
+    def move(self, x = 0, y = 0, wheel = 0):
+        self.wheels.append(wheel)
+
+def makeEncoderHid(mode):
+    encoder = Encoder()
+    consumerControl = ConsumerControl()
+    mouse = Mouse()
+    return encoder, consumerControl, mouse, EncoderHid(encoder, consumerControl, mouse, mode)
+
+# runs a loop every millisecond from `start` to `end`
+def run(encoderHid, start, end):
+    for millis in range(start, end):
+        encoderHid.loop(millis)
+
+def test_volume_sends_a_step_a_report_period():
+    encoder, consumerControl, mouse, encoderHid = makeEncoderHid(ENCODER_VOLUME)
+    encoder.delta = 3
+    run(encoderHid, 0, 100)
+    assert consumerControl.sent == [ UP ] * 3
+    assert encoderHid.reports == 3
+    encoder.delta = -2
+    run(encoderHid, 100, 200)
+    assert consumerControl.sent == [ UP ] * 3 + [ DOWN ] * 2
+
+def test_volume_backlog_is_capped():
+    encoder, consumerControl, mouse, encoderHid = makeEncoderHid(ENCODER_VOLUME)
+    encoder.delta = 100
+    encoderHid.loop(0)
+    assert encoderHid.pending == VOLUME_BACKLOG - 1
+    # turned more while waiting for the next report, still no more than
+    # the backlog left to send
+    encoder.delta = 50
+    encoderHid.loop(1)
+    assert encoderHid.pending == VOLUME_BACKLOG
+    run(encoderHid, 2, 1000)
+    assert consumerControl.sent == [ UP ] * (1 + VOLUME_BACKLOG)
+    assert encoderHid.pending == 0
+
+    encoder.delta = -100
+    run(encoderHid, 1000, 2000)
+    assert consumerControl.sent[1 + VOLUME_BACKLOG:] == [ DOWN ] * VOLUME_BACKLOG
+
+def test_scroll_is_clamped_and_carries_over():
+    encoder, consumerControl, mouse, encoderHid = makeEncoderHid(ENCODER_SCROLL)
+    # clockwise scrolls down
+    encoder.delta = 300
+    run(encoderHid, 0, 100)
+    assert mouse.wheels == [ -WHEEL_MAX, -WHEEL_MAX, -46 ]
+    encoder.delta = -130
+    run(encoderHid, 100, 200)
+    assert mouse.wheels[3:] == [ WHEEL_MAX, 3 ]
+    assert encoderHid.pending == 0
+
+def test_scroll_backlog_is_capped():
+    encoder, consumerControl, mouse, encoderHid = makeEncoderHid(ENCODER_SCROLL)
+    encoder.delta = 1000
+    encoderHid.loop(0)
+    assert encoderHid.pending == -SCROLL_BACKLOG + WHEEL_MAX
+    # turned more while waiting for the next report
+    encoder.delta = 1000
+    encoderHid.loop(1)
+    assert encoderHid.pending == -SCROLL_BACKLOG
+    run(encoderHid, 2, 1000)
+    assert sum(mouse.wheels) == -WHEEL_MAX - SCROLL_BACKLOG
+    assert encoderHid.pending == 0
+
+    encoder.delta = -1000
+    run(encoderHid, 1000, 2000)
+    assert sum(mouse.wheels) == -WHEEL_MAX
+    assert encoderHid.pending == 0
+
+def test_scroll_reports_are_spaced_out():
+    encoder, consumerControl, mouse, encoderHid = makeEncoderHid(ENCODER_SCROLL)
+    for millis in range(0, 40):
+        encoder.delta = 1
+        encoderHid.loop(millis)
+    # one report every ENCODER_REPORT_MILLIS, adding up the steps between
+    assert len(mouse.wheels) == 40 // ENCODER_REPORT_MILLIS
+    assert mouse.wheels[0] == -1
+    assert mouse.wheels[1:] == [ -ENCODER_REPORT_MILLIS ] * (len(mouse.wheels) - 1)
+    run(encoderHid, 40, 60)
+    assert sum(mouse.wheels) == -40
+
+@pytest.mark.parametrize("mode", (ENCODER_VOLUME, ENCODER_SCROLL))
+def test_mode_needs_its_device(mode):
+    with pytest.raises(ValueError):
+        EncoderHid(Encoder(), None, None, mode)
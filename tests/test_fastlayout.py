@@ -0,0 +1,64 @@
+"""
+Tests for lib/fastlayout.py with a keyboard that records what it is asked
+to press and release.
+
+    pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+sim.setupPath()
+
+from adafruit_hid.keycode import Keycode
+from fastlayout import *
+
+# CircuitPython raises NotImplementedError for `int in bytearray`, slices
+# of it included
+class BoardBytearray(bytearray):
+    def __contains__(self, value):
+        raise NotImplementedError("only bytes are supported")
+
+    def __getitem__(self, index):
+        item = bytearray.__getitem__(self, index)
+        return BoardBytearray(item) if isinstance(index, slice) else item
+
+class Keyboard():
+    def __init__(self):
+        self.calls = []
+
+    def press(self, *keycodes):
+        self.calls.append(("press", tuple(keycodes)))
+
+    def release(self, *keycodes):
+        self.calls.append(("release", tuple(keycodes)))
+
+    def release_all(self):
+        self.calls.append(("release_all",))
+
+def test_fast_write_packs_keys_without_int_in_bytearray():
+    keyboard = Keyboard()
+    layout = FastKeyboardLayout(keyboard)
+    layout.batch = BoardBytearray(MAX_BATCH)
+    layout.write("abba ABC", True)
+    A, B, C = Keycode.A, Keycode.B, Keycode.C
+    assert keyboard.calls == [
+        # the second b can't share a report with the first
+        ("press", (A, B)), ("release_all",),
+        ("press", (B, A, Keycode.SPACE)), ("release_all",),
+        # SHIFT held over the shifted run
+        ("press", (Keycode.SHIFT, A, B, C)), ("release_all",),
+    ]
+    # 8 characters, 3 of them shifted, one report each to press and release
+    # and one more for each SHIFT
+    assert layout.reportsSaved == 8 * 2 + 3 - 6
+
+def test_slow_write_is_unchanged():
+    keyboard = Keyboard()
+    layout = FastKeyboardLayout(keyboard)
+    layout.write("ab")
+    assert keyboard.calls == [ ("press", (Keycode.A,)), ("release_all",), ("press", (Keycode.B,)), ("release_all",) ]
+    assert layout.reportsSaved == 0
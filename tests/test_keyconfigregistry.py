@@ -0,0 +1,123 @@
+"""
+Tests for lib/keyconfigregistry.py with keyconfigs that count how often
+they are built, suspended and resumed, and with the shipped DotA keyconfig.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+class Keyboard():
+    def __init__(self):
+        self.calls = []
+
+    def press(self, *keycodes):
+        self.calls.append(("press", keycodes))
+
+    def release(self, *keycodes):
+        self.calls.append(("release", keycodes))
+
+    def release_all(self):
+        self.calls.append(("release_all",))
+
+    def send(self, *keycodes):
+        self.calls.append(("send", keycodes))
+
+# every keyconfig built, suspended and resumed, in order
+calls = []
+
+class Keyconfig():
+    def __init__(self, keyboard, keyboardLayout, setKeyColour, macros = None):
+        self.keyboard = keyboard
+        calls.append(("built", type(self).__name__))
+
+    def suspend(self):
+        calls.append(("suspend", type(self).__name__))
+
+    def resume(self):
+        calls.append(("resume", type(self).__name__))
+
+class First(Keyconfig):
+    pass
+
+class Second(Keyconfig):
+    pass
+
+# no suspend() or resume(), which are optional
+class Plain():
+    def __init__(self, keyboard, keyboardLayout, setKeyColour, macros = None):
+        calls.append(("built", "Plain"))
+
+@pytest.fixture
+def board():
+    hostTime = sys.modules["time"]
+    hardware = sim.install()
+    del calls[:]
+    yield hardware
+    sys.modules["time"] = hostTime
+
+# DotA has a macro on key 7, so it needs a MacroScheduler
+def makeRegistry(interfaces, lazy = False):
+    from keyconfigregistry import KeyconfigRegistry
+    from macroscheduler import MacroScheduler
+    keyboard = Keyboard()
+    return keyboard, KeyconfigRegistry(interfaces, (keyboard, None, None, MacroScheduler(keyboard, None)), lazy)
+
+@pytest.mark.parametrize("lazy", (False, True))
+def test_each_keyconfig_is_built_once(board, lazy):
+    keyboard, registry = makeRegistry((First, Second, Plain), lazy)
+    selected = [ registry.selectNext() for swap in range(7) ]
+    assert [ call for call in calls if call[0] == "built" ] == [ ("built", "First"), ("built", "Second"), ("built", "Plain") ]
+    # the same instances come round again
+    assert selected[3] is selected[0]
+    assert selected[4] is selected[1]
+    assert selected[5] is selected[2]
+    assert registry.get(0) is selected[0]
+
+def test_lazy_keyconfig_is_imported_when_first_selected(board):
+    keyboard, registry = makeRegistry((First, ("keyconfig.dota", "DotAKeypad")), True)
+    assert calls == []
+    registry.select(0)
+    assert "keyconfig.dota" not in sys.modules
+    dota = registry.select(1)
+    assert "keyconfig.dota" in sys.modules
+    assert type(dota).__name__ == "DotAKeypad"
+    assert registry.select(0) is not dota
+    assert registry.select(1) is dota
+
+def test_eager_keyconfig_is_imported_straight_away(board):
+    keyboard, registry = makeRegistry((First, ("keyconfig.dota", "DotAKeypad")))
+    assert "keyconfig.dota" in sys.modules
+    assert calls == [ ("built", "First") ]
+    assert type(registry.instances[1]).__name__ == "DotAKeypad"
+
+def test_swaps_suspend_the_old_keyconfig_and_resume_the_new(board):
+    keyboard, registry = makeRegistry((First, Second, Plain))
+    del calls[:]
+    registry.select(0)
+    assert calls == [ ("resume", "First") ]
+    # selecting the current keyconfig again is not a swap
+    registry.select(0)
+    assert calls == [ ("resume", "First") ]
+    registry.select(1)
+    registry.select(2)
+    registry.select(0)
+    assert calls == [ ("resume", "First"), ("suspend", "First"), ("resume", "Second"),
+                      ("suspend", "Second"), ("resume", "First") ]
+
+def test_dota_lets_go_of_held_shift_when_swapped_out(board):
+    from constants import EVENT_HOLD
+    from adafruit_hid.keycode import Keycode
+    keyboard, registry = makeRegistry((("keyconfig.dota", "DotAKeypad"), First))
+    dota = registry.select(0)
+    dota.handleEvent(8, EVENT_HOLD)
+    assert keyboard.calls == [ ("press", (Keycode.SHIFT,)) ]
+    registry.select(1)
+    assert keyboard.calls == [ ("press", (Keycode.SHIFT,)), ("release", (Keycode.SHIFT,)) ]
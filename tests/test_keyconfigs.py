@@ -0,0 +1,65 @@
+"""
+Runs the shipped keyconfigs in the simulator and checks what they send.
+
+    pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sim import simulate
+from sim.trace import KeyTrace
+
+SHIFT_BIT = 0x02
+KEY_Q = 0x14
+KEY_T = 0x17
+KEY_FOUR = 0x21
+
+# X swaps layouts: ADB, then Teams, then DotA
+def dotaTrace():
+    return KeyTrace().tap("X", 200).tap("X", 400).tap("X", 600)
+
+def keyboardReports(hardware):
+    return [ (millis, report) for device in hardware.hidDevices if device.usage_page == 0x01 and device.usage == 0x06
+             for millis, report in device.reports ]
+
+def keysDown(report):
+    if len(report) == 8:
+        return [ keycode for keycode in report[2:] if keycode ]
+    return [ keycode for keycode in range(128) if report[1 + (keycode >> 3)] & (1 << (keycode & 7)) ]
+
+# key 8 held past the tapping term is SHIFT, and key 7's double T and key
+# 0's Q have to go out with it still held
+def test_dota_keys_keep_held_shift():
+    trace = dotaTrace().add(2000, True, 8).tap(7, 2500).tap(0, 2800).add(3200, False, 8)
+    hardware, firmware = simulate(trace, 4000)
+    held = [ (millis, report) for millis, report in keyboardReports(hardware) if 2000 <= millis < 3200 ]
+    assert held
+    for millis, report in held:
+        assert report[0] & SHIFT_BIT, "SHIFT let go at " + str(millis) + " ms"
+    pressed = [ keysDown(report) for millis, report in held if keysDown(report) ]
+    assert pressed == [ [KEY_T], [KEY_T], [KEY_Q] ]
+
+# Y puts the keypad in help mode. The next key pressed prints its help,
+# and none of its events reach the keyconfig, up to and including the
+# tap key 8 only sends once it is let go.
+def test_help_mode_swallows_the_whole_press():
+    trace = dotaTrace().tap("Y", 1000).tap(8, 1600).tap(8, 2400)
+    hardware, firmware = simulate(trace, 3000)
+    pressed = [ (millis, keysDown(report)) for millis, report in keyboardReports(hardware) if keysDown(report) ]
+    assert [ keys for millis, keys in pressed ] == [ [KEY_FOUR] ]
+    assert pressed[0][0] >= 2400
+
+# ADB's key 1 types a terminal command over about a second. Swapping
+# layouts part way through stops it and lets go of every key.
+def test_swapping_layouts_cancels_a_running_macro():
+    trace = KeyTrace().tap("X", 200).tap(1, 1500).tap("X", 1710)
+    hardware, firmware = simulate(trace, 4000)
+    reports = keyboardReports(hardware)
+    assert [ report for millis, report in reports if 1500 <= millis < 1710 and keysDown(report) ]
+    after = [ report for millis, report in reports if millis >= 1710 ]
+    assert after
+    for report in after:
+        assert not keysDown(report) and not report[0]
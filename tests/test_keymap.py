@@ -0,0 +1,179 @@
+"""
+Tests for lib/keymap.py with a keyboard that records what it is asked to
+press and release.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from constants import *
+from keymap import *
+from keystatemachine import *
+
+class Keyboard():
+    def __init__(self):
+        self.calls = []
+
+    def press(self, *keycodes):
+        self.calls.append(("press", keycodes))
+
+    def release(self, *keycodes):
+        self.calls.append(("release", keycodes))
+
+    def release_all(self):
+        self.calls.append(("release_all",))
+
+    def send(self, *keycodes):
+        self.calls.append(("send", keycodes))
+
+# a keyconfig that answers handledEvents from its keymap
+class Keyconfig():
+    def __init__(self, keymap):
+        self.keymap = keymap
+
+    def handledEvents(self, key):
+        return self.keymap.handledEvents(key)
+
+def makeKeymap(bindings = ()):
+    keyboard = Keyboard()
+    return keyboard, Keymap(keyboard, None, None, bindings)
+
+@pytest.mark.parametrize("binding", [
+    (BUTTON_COUNT, EVENT_SINGLE_PRESS, keys(4)),
+    (-1, EVENT_SINGLE_PRESS, keys(4)),
+    (0, 0, keys(4)),
+    (0, 0x100, keys(4)),
+    (0, EVENT_SINGLE_PRESS, 4),
+    (0, EVENT_SINGLE_PRESS, (ACTION_KEYS, (4,), "extra")),
+    (0, EVENT_SINGLE_PRESS, consumer(0xE9)),
+    (0, EVENT_SINGLE_PRESS, macro("text")),
+    (0, EVENT_SINGLE_PRESS, call("not a function")),
+    (0, EVENT_SINGLE_PRESS, momentary(0)),
+    (0, EVENT_SINGLE_PRESS, toggle(MAX_LAYERS)),
+    (0, EVENT_SINGLE_PRESS, (99, (4,))),
+])
+def test_bad_bindings_are_rejected_when_loaded(binding):
+    with pytest.raises(ValueError):
+        makeKeymap([ binding ])
+
+def test_load_replaces_every_binding():
+    keyboard, keymap = makeKeymap([
+        (0, EVENT_SINGLE_PRESS, keys(4)),
+        (1, EVENT_DOUBLE_PRESS, keys(5)),
+        (2, EVENT_SINGLE_PRESS, keys(6), 1),
+    ])
+    keymap.load([ (3, EVENT_LONG_PRESS, keys(7)) ])
+    assert [ keymap.handledEvents(key) for key in range(4) ] == [ 0, 0, 0, EVENT_LONG_PRESS ]
+    assert len(keymap.layerActions) == 1
+    keymap.handleEvent(0, EVENT_SINGLE_PRESS)
+    keymap.handleEvent(1, EVENT_DOUBLE_PRESS)
+    assert keyboard.calls == []
+    keymap.handleEvent(3, EVENT_LONG_PRESS)
+    assert keyboard.calls == [ ("press", (7,)), ("release", (7,)) ]
+
+def test_keys_press_then_release_without_letting_go_of_held_keys():
+    keyboard, keymap = makeKeymap([
+        (0, EVENT_SINGLE_PRESS, keys(4, 5)),
+        (8, EVENT_KEY_DOWN, press(225)),
+        (8, EVENT_KEY_UP, release(225)),
+    ])
+    keymap.handleEvent(8, EVENT_KEY_DOWN)
+    keymap.handleEvent(0, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS)
+    keymap.handleEvent(8, EVENT_KEY_UP)
+    assert keyboard.calls == [ ("press", (225,)), ("press", (4, 5)), ("release", (4, 5)), ("release", (225,)) ]
+
+def test_handled_events_pick_the_key_policies():
+    keyboard, keymap = makeKeymap([
+        (0, EVENT_SINGLE_PRESS, keys(4)),
+        (1, EVENT_SINGLE_PRESS, keys(4)),
+        (1, EVENT_DOUBLE_PRESS, keys(5)),
+        (2, EVENT_SINGLE_PRESS, keys(4)),
+        (2, EVENT_LONG_PRESS, keys(5)),
+        (3, EVENT_SINGLE_PRESS, keys(4)),
+        (3, EVENT_HOLD, press(225)),
+        (3, EVENT_HOLD_RELEASE, release(225)),
+        (4, EVENT_KEY_DOWN | EVENT_KEY_UP, momentary(1)),
+    ])
+    machine = KeyStateMachine(BUTTON_COUNT)
+    machine.configureFor(Keyconfig(keymap))
+    assert [ machine.getPolicy(key) for key in range(6) ] == [
+        POLICY_ON_DOWN, POLICY_WAIT_DOUBLE, POLICY_ON_UP, POLICY_TAP_HOLD, POLICY_ON_DOWN, POLICY_ON_DOWN ]
+
+#--- LAYERS ---
+LAYERED = (
+    (0,  EVENT_SINGLE_PRESS, keys(4)),
+    (1,  EVENT_SINGLE_PRESS, keys(5)),
+    (0,  EVENT_SINGLE_PRESS, keys(6), 1),
+    (0,  EVENT_SINGLE_PRESS, keys(7), 2),
+    (14, EVENT_SINGLE_PRESS, toggle(2)),
+    (15, EVENT_KEY_DOWN | EVENT_KEY_UP, momentary(1)),
+)
+
+def tap(keymap, key):
+    keymap.handleEvent(key, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS)
+    keymap.handleEvent(key, EVENT_KEY_UP)
+
+def pressed(keyboard):
+    return [ call[1] for call in keyboard.calls if call[0] == "press" ]
+
+@pytest.mark.parametrize("layer", (-1, MAX_LAYERS))
+def test_layers_out_of_range_are_rejected(layer):
+    keyboard, keymap = makeKeymap()
+    with pytest.raises(ValueError):
+        keymap.bind(0, EVENT_SINGLE_PRESS, keys(4), layer)
+    with pytest.raises(ValueError):
+        keymap.unbind(0, EVENT_SINGLE_PRESS, layer)
+    # a layer that could exist but has nothing on it
+    keymap.unbind(0, EVENT_SINGLE_PRESS, MAX_LAYERS - 1)
+
+def test_momentary_layer_is_on_while_held():
+    keyboard, keymap = makeKeymap(LAYERED)
+    tap(keymap, 0)
+    keymap.handleEvent(15, EVENT_KEY_DOWN)
+    assert keymap.isLayerActive(1)
+    tap(keymap, 0)
+    keymap.handleEvent(15, EVENT_KEY_UP)
+    assert not keymap.isLayerActive(1)
+    tap(keymap, 0)
+    assert pressed(keyboard) == [ (4,), (6,), (4,) ]
+
+def test_toggle_layer_stays_on_until_tapped_again():
+    keyboard, keymap = makeKeymap(LAYERED)
+    tap(keymap, 14)
+    assert keymap.isLayerActive(2)
+    tap(keymap, 0)
+    tap(keymap, 0)
+    tap(keymap, 14)
+    assert not keymap.isLayerActive(2)
+    tap(keymap, 0)
+    assert pressed(keyboard) == [ (7,), (7,), (4,) ]
+
+def test_highest_active_layer_wins_and_unbound_keys_fall_through():
+    keyboard, keymap = makeKeymap(LAYERED)
+    tap(keymap, 14)
+    keymap.handleEvent(15, EVENT_KEY_DOWN)
+    # both layers bind key 0, layer 2 is higher. Neither binds key 1.
+    tap(keymap, 0)
+    tap(keymap, 1)
+    assert pressed(keyboard) == [ (7,), (5,) ]
+
+def test_key_lets_go_on_the_layer_it_was_pressed_on():
+    keyboard, keymap = makeKeymap((
+        (0,  EVENT_KEY_DOWN, press(4)),
+        (0,  EVENT_KEY_UP,   release(4)),
+        (0,  EVENT_KEY_DOWN, press(6), 1),
+        (0,  EVENT_KEY_UP,   release(6), 1),
+        (15, EVENT_KEY_DOWN | EVENT_KEY_UP, momentary(1)),
+    ))
+    keymap.handleEvent(15, EVENT_KEY_DOWN)
+    keymap.handleEvent(0, EVENT_KEY_DOWN)
+    keymap.handleEvent(15, EVENT_KEY_UP)
+    keymap.handleEvent(0, EVENT_KEY_UP)
+    assert keyboard.calls == [ ("press", (6,)), ("release", (6,)) ]
+#----------------
@@ -0,0 +1,75 @@
+"""
+Drives host/keypadclient.py against the firmware running in the simulator,
+with the keypad's USB data port on a pty (`python -m sim.run --serial`).
+
+    pytest tests
+"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "host"))
+
+from keypadclient import KeypadClient, KeypadError
+
+if not hasattr(os, "openpty"):
+    pytest.skip("needs a pty", allow_module_level = True)
+
+# long enough in simulated time to outlast the test
+SIMULATED_MILLIS = 3600000
+
+@pytest.fixture
+def client(tmp_path):
+    trace = tmp_path / "idle.txt"
+    trace.write_text("# nothing pressed, the host does the talking\n")
+    board = subprocess.Popen([ sys.executable, "-m", "sim.run", str(trace), "--until", str(SIMULATED_MILLIS), "--serial" ],
+                             cwd = ROOT, stdout = subprocess.PIPE, text = True)
+    try:
+        line = board.stdout.readline()
+        assert line.startswith("serial port"), line
+        client = KeypadClient.open(line.split()[-1], timeout = 5.0)
+        client.ping()
+        yield client
+        client.close()
+    finally:
+        board.kill()
+        board.wait()
+
+# waits for the keypad to have typed everything queued
+def waitForMacros(client):
+    deadline = time.monotonic() + 5.0
+    while client.stats()["macroQueue"]:
+        assert time.monotonic() < deadline, "macro never finished"
+        time.sleep(0.05)
+
+def test_commands(client):
+    client.selectLayout(2)
+    assert client.stats()["layout"] == 2
+    # counted with the loop profiler off too, once a second has gone by
+    deadline = time.monotonic() + 5.0
+    while not client.stats()["loopsPerSecond"]:
+        assert time.monotonic() < deadline, "loops never counted"
+        time.sleep(0.05)
+    client.setColours({ 0: 0xFF0000, 15: 0x00FF00 })
+    client.pushMacro("hello World")
+    waitForMacros(client)
+
+@pytest.mark.parametrize("command, reason", [
+    (lambda client: client.setColours({ 20: 0xFFFFFF }), "No key 20"),
+    (lambda client: client.selectLayout(9), "No layout 9"),
+    (lambda client: client.request(0x55), "unknown command"),
+    (lambda client: client.pushMacro("héllo"), "ASCII"),
+    (lambda client: client.pushMacro("a\x01b"), "keycode"),
+    (lambda client: client.request(0x12, b"\xff\xfe"), "utf-8"),
+], ids = ("key", "layout", "command", "not-ascii", "no-keycode", "not-utf-8"))
+def test_refused(client, command, reason):
+    with pytest.raises(KeypadError, match = reason):
+        command(client)
+    # the main loop is still running and still types good macros
+    client.pushMacro("ok")
+    waitForMacros(client)
+    client.ping()
@@ -0,0 +1,122 @@
+"""
+Tests for lib/keyscanner.py against a stand-in for the keypad's TCA9555
+expander and its INT line.
+
+    pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from constants import *
+from keyscanner import *
+
+# the expander's inputs are active low. INT goes low when an input changes
+# and high again once the inputs have been read.
+class Expander():
+    def __init__(self):
+        self.down = 0
+        self.latched = 0
+        self.reads = 0
+
+    def press(self, key, down = True):
+        if down:
+            self.down |= 1 << key
+        else:
+            self.down &= ~(1 << key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *arguments):
+        return False
+
+    def write(self, buffer):
+        pass
+
+    def readinto(self, buffer):
+        inputs = ~self.down & 0xFFFF
+        buffer[0] = inputs & 0xFF
+        buffer[1] = inputs >> 8
+        self.latched = self.down
+        self.reads += 1
+
+class InterruptPin():
+    def __init__(self, expander):
+        self.expander = expander
+        # set to hold INT high, as if an edge was lost
+        self.stuckHigh = False
+
+    @property
+    def value(self):
+        return self.stuckHigh or self.expander.down == self.expander.latched
+
+def makeScanner():
+    expander = Expander()
+    return expander, KeyScanner(expander, InterruptPin(expander))
+
+def test_no_bus_read_while_int_is_high():
+    expander, scanner = makeScanner()
+    scanner.read(0)
+    reads = expander.reads
+    for millis in range(1, SCAN_WATCHDOG_MILLIS):
+        assert scanner.read(millis) == 0
+    assert expander.reads == reads
+    assert scanner.skippedReads == SCAN_WATCHDOG_MILLIS - 1
+
+def test_edge_reads_the_bus_and_reports_only_flipped_bits():
+    expander, scanner = makeScanner()
+    scanner.read(0)
+    reads = expander.reads
+
+    expander.press(2)
+    expander.press(9)
+    assert scanner.read(10) == (1 << 2) | (1 << 9)
+    assert scanner.changed == (1 << 2) | (1 << 9)
+    assert expander.reads == reads + 1
+    # INT went high again with the read, so nothing changes until the next edge
+    assert scanner.read(11) == (1 << 2) | (1 << 9)
+    assert scanner.changed == 0
+    assert expander.reads == reads + 1
+
+    expander.press(5)
+    assert scanner.read(20) == (1 << 2) | (1 << 9) | (1 << 5)
+    assert scanner.changed == 1 << 5
+    expander.press(2, False)
+    assert scanner.read(30) == (1 << 9) | (1 << 5)
+    assert scanner.changed == 1 << 2
+    assert expander.reads == reads + 3
+
+def test_watchdog_reads_after_the_timeout():
+    expander, scanner = makeScanner()
+    scanner.read(0)
+    reads = expander.reads
+    scanner.read(SCAN_WATCHDOG_MILLIS - 1)
+    assert expander.reads == reads
+    scanner.read(SCAN_WATCHDOG_MILLIS)
+    assert expander.reads == reads + 1
+    scanner.read(2 * SCAN_WATCHDOG_MILLIS - 1)
+    assert expander.reads == reads + 1
+    scanner.read(2 * SCAN_WATCHDOG_MILLIS)
+    assert expander.reads == reads + 2
+
+def test_watchdog_catches_a_missed_edge():
+    expander = Expander()
+    pin = InterruptPin(expander)
+    scanner = KeyScanner(expander, pin)
+    scanner.read(0)
+    pin.stuckHigh = True
+    expander.press(4)
+    assert scanner.read(60) == 0
+    assert scanner.read(SCAN_WATCHDOG_MILLIS) == 1 << 4
+    assert scanner.changed == 1 << 4
+
+def test_polls_without_an_interrupt_pin():
+    expander = Expander()
+    scanner = KeyScanner(expander)
+    for millis in range(5):
+        scanner.read(millis)
+    assert expander.reads == 5
+    assert scanner.skippedReads == 0
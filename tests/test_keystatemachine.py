@@ -0,0 +1,234 @@
+"""
+Tests for lib/keystatemachine.py, driving KeyStateMachine with key masks
+and times directly.
+
+    pytest tests
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+import constants
+from constants import *
+from keystatemachine import *
+
+# a keyconfig that only says which events each key handles
+class Handles():
+    def __init__(self, handled, timings = None, keyTimings = None):
+        self.handled = handled
+        if timings is not None:
+            self.TIMINGS = timings
+        if keyTimings is not None:
+            self.KEY_TIMINGS = keyTimings
+
+    def handledEvents(self, key):
+        return self.handled.get(key, 0)
+
+#--- checkButton ---
+# random scans of `keyCount` keys: (millis, downMask) at uneven gaps, with
+# presses from a few milliseconds to past EXTRA_LONG_HOLD
+def randomScans(seed, keyCount = BUTTON_COUNT, changes = 40):
+    generator = random.Random(seed)
+    scans = []
+    millis = 1
+    mask = 0
+    for _ in range(changes):
+        # a few keys flip, then the keys sit for a while
+        for _ in range(generator.choice((1, 1, 1, 2, 3))):
+            mask ^= 1 << generator.randrange(keyCount)
+        scans.append((millis, mask))
+        hold = generator.choice((5, 40, 120, 240, 260, 600, 1100, 3200))
+        end = millis + generator.randrange(1, hold + 1)
+        while millis < end:
+            millis += generator.randrange(1, 40)
+            scans.append((millis, mask))
+    for step in range(EXTRA_LONG_HOLD // 20):
+        millis += 20
+        scans.append((millis, 0))
+    return scans
+
+def checkButtonEvents(scans, monkeypatch):
+    states = [ [-1] * BUTTON_COUNT, [-1] * BUTTON_COUNT, [False] * BUTTON_COUNT ]
+    events = []
+    for millis, mask in scans:
+        monkeypatch.setattr(constants, "timeInMillis", lambda: millis)
+        events.append([ constants.checkButton(key, (mask >> key) & 1, states, lambda *arguments: None)
+                        for key in range(BUTTON_COUNT) ])
+    return events
+
+def stateMachineEvents(scans):
+    keys = KeyStateMachine(BUTTON_COUNT)
+    events = []
+    for millis, mask in scans:
+        eventMask = keys.update(mask, millis)
+        events.append([ keys.events[key] if eventMask & (1 << key) else EVENT_NONE for key in range(BUTTON_COUNT) ])
+    return events
+
+def test_matches_checkButton_on_random_traces(monkeypatch):
+    for seed in range(300):
+        scans = randomScans(seed)
+        assert stateMachineEvents(scans) == checkButtonEvents(scans, monkeypatch), "seed " + str(seed)
+#-------------------
+
+#--- policies ---
+# like checkButton, a first tap within DOUBLE_GAP of 0 ms counts as a
+# double press, so the scans are run this far in and the times given back
+# relative to it
+START_MILLIS = 10000
+
+# the (millis, key, event) a KeyStateMachine gives for scans every
+# millisecond, `presses` being (key, downMillis, upMillis)
+def eventsFor(keys, presses, untilMillis):
+    events = []
+    for millis in range(untilMillis):
+        mask = 0
+        for key, down, up in presses:
+            if down <= millis < up:
+                mask |= 1 << key
+        eventMask = keys.update(mask, START_MILLIS + millis)
+        for key in range(keys.keyCount):
+            if eventMask & (1 << key):
+                events.append((millis, key, keys.events[key]))
+    return events
+
+def machineWith(policy, key = 0):
+    keys = KeyStateMachine(BUTTON_COUNT)
+    keys.setPolicy(key, policy)
+    return keys
+
+def test_policy_choice():
+    assert policyFor(EVENT_SINGLE_PRESS) == POLICY_ON_DOWN
+    assert policyFor(EVENT_SINGLE_PRESS | EVENT_LONG_PRESS) == POLICY_ON_UP
+    assert policyFor(EVENT_SINGLE_PRESS | EVENT_DOUBLE_PRESS | EVENT_LONG_PRESS) == POLICY_WAIT_DOUBLE
+    assert policyFor(EVENT_SINGLE_PRESS | EVENT_HOLD) == POLICY_TAP_HOLD
+
+def test_wait_double_holds_single_press_for_the_gap():
+    events = eventsFor(machineWith(POLICY_WAIT_DOUBLE), [ (0, 10, 60) ], 400)
+    assert events == [ (10, 0, EVENT_KEY_DOWN), (60, 0, EVENT_KEY_UP), (60 + DOUBLE_GAP, 0, EVENT_SINGLE_PRESS) ]
+    events = eventsFor(machineWith(POLICY_WAIT_DOUBLE), [ (0, 10, 60), (0, 100, 150) ], 500)
+    assert events == [ (10, 0, EVENT_KEY_DOWN), (60, 0, EVENT_KEY_UP),
+                       (100, 0, EVENT_KEY_DOWN), (150, 0, EVENT_KEY_UP | EVENT_DOUBLE_PRESS) ]
+
+def test_on_up_fires_on_release():
+    keys = machineWith(POLICY_ON_UP)
+    events = eventsFor(keys, [ (0, 10, 60), (0, 100, 150) ], 400)
+    assert events == [ (10, 0, EVENT_KEY_DOWN), (60, 0, EVENT_KEY_UP | EVENT_SINGLE_PRESS),
+                       (100, 0, EVENT_KEY_DOWN), (150, 0, EVENT_KEY_UP | EVENT_SINGLE_PRESS) ]
+    events = eventsFor(machineWith(POLICY_ON_UP), [ (0, 10, 10 + LONG_HOLD), (0, 2000, 2000 + EXTRA_LONG_HOLD) ], 6000)
+    assert [ event for _, _, event in events ] == [ EVENT_KEY_DOWN, EVENT_KEY_UP | EVENT_LONG_PRESS,
+                                                    EVENT_KEY_DOWN, EVENT_KEY_UP | EVENT_EXTRA_LONG_PRESS ]
+
+def test_on_down_fires_with_key_down():
+    events = eventsFor(machineWith(POLICY_ON_DOWN), [ (0, 10, 10 + LONG_HOLD * 2), (0, 2100, 2150) ], 2500)
+    assert events == [ (10, 0, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS), (10 + LONG_HOLD * 2, 0, EVENT_KEY_UP),
+                       (2100, 0, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS), (2150, 0, EVENT_KEY_UP) ]
+
+def test_tap_hold_tap_and_hold():
+    events = eventsFor(machineWith(POLICY_TAP_HOLD), [ (0, 10, 60) ], 300)
+    assert events == [ (10, 0, EVENT_KEY_DOWN), (60, 0, EVENT_KEY_UP | EVENT_SINGLE_PRESS) ]
+    events = eventsFor(machineWith(POLICY_TAP_HOLD), [ (0, 10, 500) ], 600)
+    assert events == [ (10, 0, EVENT_KEY_DOWN), (10 + TAPPING_TERM, 0, EVENT_HOLD),
+                       (500, 0, EVENT_KEY_UP | EVENT_HOLD_RELEASE) ]
+
+def test_tap_hold_turns_into_a_hold_when_another_key_goes_down():
+    keys = machineWith(POLICY_TAP_HOLD)
+    keys.setPolicy(3, POLICY_ON_DOWN)
+    holds = []
+    events = []
+    for millis in range(200):
+        mask = (1 if 10 <= millis < 150 else 0) | (1 << 3 if 50 <= millis < 80 else 0)
+        eventMask = keys.update(mask, START_MILLIS + millis)
+        if keys.holdMask:
+            holds.append((millis, keys.holdMask))
+        for key in (0, 3):
+            if eventMask & (1 << key):
+                events.append((millis, key, keys.events[key]))
+    assert holds == [ (50, 1) ]
+    assert events == [ (10, 0, EVENT_KEY_DOWN), (50, 0, EVENT_HOLD), (50, 3, EVENT_KEY_DOWN | EVENT_SINGLE_PRESS),
+                       (80, 3, EVENT_KEY_UP), (150, 0, EVENT_KEY_UP | EVENT_HOLD_RELEASE) ]
+
+    keys = machineWith(POLICY_TAP_HOLD)
+    keys.holdOnOtherKeyPress = False
+    events = eventsFor(keys, [ (0, 10, 150), (3, 50, 80) ], 200)
+    assert (150, 0, EVENT_KEY_UP | EVENT_SINGLE_PRESS) in events
+
+def test_policies_for_a_keyconfig():
+    class Keyconfig():
+        def handledEvents(self, key):
+            return (EVENT_SINGLE_PRESS, EVENT_SINGLE_PRESS | EVENT_LONG_PRESS, EVENT_SINGLE_PRESS | EVENT_DOUBLE_PRESS)[key % 3]
+    keys = KeyStateMachine(BUTTON_COUNT)
+    keys.usePoliciesFor(Keyconfig())
+    assert [ keys.getPolicy(key) for key in range(3) ] == [ POLICY_ON_DOWN, POLICY_ON_UP, POLICY_WAIT_DOUBLE ]
+    # without handledEvents every key waits for double presses
+    keys.usePoliciesFor(object())
+    assert keys.getPolicy(0) == POLICY_WAIT_DOUBLE
+#--------------
+
+#--- timings ---
+def test_per_key_timings():
+    keyconfig = Handles({ 0: EVENT_SINGLE_PRESS | EVENT_DOUBLE_PRESS | EVENT_LONG_PRESS,
+                          1: EVENT_SINGLE_PRESS | EVENT_DOUBLE_PRESS | EVENT_LONG_PRESS,
+                          2: EVENT_SINGLE_PRESS | EVENT_HOLD },
+                        timings = (100, 400, 900), keyTimings = { 1: (300, 600, 1200, 50), 2: (300, 600, 1200, 50) })
+    keys = KeyStateMachine(BUTTON_COUNT)
+    keys.configureFor(keyconfig)
+    assert (keys.doubleGap[0], keys.longHold[0], keys.extraLongHold[0], keys.tappingTerm[0]) == (100, 400, 900, TAPPING_TERM)
+    assert (keys.doubleGap[1], keys.longHold[1], keys.extraLongHold[1], keys.tappingTerm[1]) == (300, 600, 1200, 50)
+    assert keys.longHold[5] == 400
+
+    # a second tap 150 ms after the first is a double press on key 1 only
+    events = eventsFor(keys, [ (0, 10, 40), (0, 190, 220), (1, 10, 40), (1, 190, 220) ], 700)
+    assert (140, 0, EVENT_SINGLE_PRESS) in events
+    assert (220, 1, EVENT_KEY_UP | EVENT_DOUBLE_PRESS) in events
+    # 500 ms is a long press on key 0 but not on key 1
+    keys = KeyStateMachine(BUTTON_COUNT)
+    keys.configureFor(keyconfig)
+    events = eventsFor(keys, [ (0, 10, 510), (1, 10, 510), (2, 10, 100) ], 1000)
+    assert (510, 0, EVENT_KEY_UP | EVENT_LONG_PRESS) in events
+    assert (810, 1, EVENT_SINGLE_PRESS) in events
+    # key 2's tapping term is 50 ms
+    assert (60, 2, EVENT_HOLD) in events
+
+# the longHoldFeedback calls made while key 0 is held from 100 ms
+def feedbackFor(keyconfig, key = 0):
+    calls = []
+    keys = KeyStateMachine(BUTTON_COUNT, lambda *arguments: calls.append(arguments))
+    keys.configureFor(keyconfig)
+    keys.update(1 << key, 100)
+    keys.update(1 << key, 200)
+    return calls[-1]
+
+def test_feedback_uses_the_keys_own_hold_times():
+    keyconfig = Handles({ 0: EVENT_SINGLE_PRESS | EVENT_LONG_PRESS | EVENT_EXTRA_LONG_PRESS },
+                        keyTimings = { 0: (DOUBLE_GAP, 600, 1800) })
+    assert feedbackFor(keyconfig) == (100, 600, 1800)
+
+def test_feedback_leaves_out_presses_the_key_does_not_have():
+    keyconfig = Handles({ 0: EVENT_SINGLE_PRESS | EVENT_LONG_PRESS }, timings = (DOUBLE_GAP, 700, 2000))
+    assert feedbackFor(keyconfig) == (100, 700, 0)
+
+def test_feedback_quiet_for_keys_without_long_presses():
+    # POLICY_ON_DOWN and tap-hold keys never have a long press
+    assert feedbackFor(Handles({ 0: EVENT_SINGLE_PRESS })) == (0, 0, 0)
+    assert feedbackFor(Handles({ 0: EVENT_SINGLE_PRESS | EVENT_HOLD | EVENT_HOLD_RELEASE })) == (0, 0, 0)
+    assert feedbackFor(Handles({ 0: EVENT_SINGLE_PRESS | EVENT_DOUBLE_PRESS })) == (0, 0, 0)
+
+def test_feedback_follows_a_held_key_that_has_a_long_press():
+    calls = []
+    keys = KeyStateMachine(BUTTON_COUNT, lambda *arguments: calls.append(arguments))
+    keys.configureFor(Handles({ 0: EVENT_SINGLE_PRESS, 3: EVENT_SINGLE_PRESS | EVENT_LONG_PRESS }))
+    keys.update(0b0001, 100)
+    keys.update(0b1001, 150)
+    assert calls[-1] == (150, LONG_HOLD, 0)
+    keys.update(0b0001, 250)
+    assert calls[-1] == (0, 0, 0)
+
+def test_feedback_without_handled_events_is_checkButtons():
+    calls = []
+    keys = KeyStateMachine(BUTTON_COUNT, lambda *arguments: calls.append(arguments))
+    keys.update(1 << 5, 100)
+    assert calls[-1] == (100, LONG_HOLD, EXTRA_LONG_HOLD)
+#---------------
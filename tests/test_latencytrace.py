@@ -0,0 +1,166 @@
+"""
+Tests for lib/latencytrace.py on a clock the test moves by hand, with both
+the boot keyboard and the NKRO keyboard sending to devices that record
+their reports.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+class Device():
+    usage_page = 0x01
+    usage = 0x06
+
+    def __init__(self):
+        self.reports = []
+
+    def send_report(self, report, report_id = None):
+        self.reports.append(bytes(report))
+
+# just enough of a MacroScheduler for LatencyTrace to see steps queued
+class Macros():
+    def __init__(self):
+        self.depth = 0
+
+    def queueDepth(self):
+        return self.depth
+
+@pytest.fixture
+def modules():
+    hostTime = sys.modules["time"]
+    sim.install()
+    import latencytrace
+    yield latencytrace
+    sys.modules["time"] = hostTime
+
+def makeKeyboard(kind):
+    device = Device()
+    if kind == "nkro":
+        from nkrokeyboard import NkroKeyboard
+        return device, NkroKeyboard(device)
+    from adafruit_hid.keyboard import Keyboard
+    return device, Keyboard([ device ])
+
+# a LatencyTrace reading `clock[0]` as the time in microseconds
+def traceWith(modules, clock, macros = None, size = None):
+    trace = modules.LatencyTrace(macros) if size is None else modules.LatencyTrace(macros, size)
+    trace.now = lambda: clock[0]
+    return trace
+
+@pytest.mark.parametrize("kind", ("boot", "nkro"))
+def test_stages_split_key_to_report(modules, kind):
+    device, keyboard = makeKeyboard(kind)
+    clock = [ 1000 ]
+    trace = traceWith(modules, clock)
+    trace.wrapDevices(keyboard)
+    sent = len(device.reports)
+
+    clock[0] = 1100
+    trace.scanned(1 << 3, 1090)
+    clock[0] = 1150
+    trace.dispatching(3)
+    clock[0] = 1170
+    keyboard.press(4)
+    clock[0] = 1180
+    keyboard.release_all()
+    trace.dispatched(3)
+
+    # the reports still reach the device
+    assert len(device.reports) == sent + 2
+    assert [ trace.counts[stage] for stage in range(modules.STAGE_COUNT) ] == [ 1, 1, 1, 1 ]
+    assert trace.totals[modules.STAGE_SCAN] == 10
+    assert trace.totals[modules.STAGE_DETECT] == 50
+    assert trace.totals[modules.STAGE_DISPATCH] == 30
+    # from the key change to the first report
+    assert trace.totals[modules.STAGE_REPORT] == 70
+
+# a macro step queued by handleEvent is timed to its first report, and the
+# NKRO keyboard's reports made from a compiled macro go through the probe
+@pytest.mark.parametrize("kind", ("boot", "nkro"))
+def test_report_waits_for_a_queued_macro(modules, kind):
+    from fastlayout import FastKeyboardLayout
+    from macrocompiler import compileMacro, replayMacro
+    device, keyboard = makeKeyboard(kind)
+    macros = Macros()
+    clock = [ 0 ]
+    trace = traceWith(modules, clock, macros)
+    trace.wrapDevices(keyboard)
+
+    trace.scanned(1 << 5, 0)
+    clock[0] = 40
+    trace.dispatching(5)
+    macros.depth = 1
+    trace.dispatched(5)
+    assert trace.counts[modules.STAGE_REPORT] == 0
+    clock[0] = 900
+    replayMacro(keyboard, compileMacro("ab", FastKeyboardLayout(None)))
+    assert trace.counts[modules.STAGE_REPORT] == 1
+    assert trace.totals[modules.STAGE_REPORT] == 900
+
+def test_nothing_sent_is_not_a_report(modules):
+    device, keyboard = makeKeyboard("boot")
+    clock = [ 0 ]
+    trace = traceWith(modules, clock, Macros())
+    trace.wrapDevices(keyboard)
+    trace.scanned(1, 0)
+    trace.dispatching(0)
+    trace.dispatched(0)
+    # a later report, for something else, isn't put down to key 0
+    keyboard.press(4)
+    assert trace.counts[modules.STAGE_REPORT] == 0
+
+@pytest.mark.parametrize("micros, bucket", [ (0, 0), (1, 1), (2, 2), (3, 2), (4, 3), (1000, 10), (1 << 30, 23) ])
+def test_histogram_buckets_by_power_of_two(modules, micros, bucket):
+    trace = traceWith(modules, [ 0 ])
+    trace.record(modules.STAGE_SCAN, 0, micros)
+    assert trace.histograms[bucket] == 1
+    assert sum(trace.histograms) == 1
+
+def test_histogram_halves_once_full(modules):
+    trace = traceWith(modules, [ 0 ])
+    for sample in range(modules.ROLLING_SAMPLES - 1):
+        trace.record(modules.STAGE_DETECT, 0, 100)
+    assert trace.counts[modules.STAGE_DETECT] == modules.ROLLING_SAMPLES - 1
+    trace.record(modules.STAGE_DETECT, 0, 100)
+    base = modules.STAGE_DETECT * modules.HISTOGRAM_BUCKETS
+    assert trace.counts[modules.STAGE_DETECT] == modules.ROLLING_SAMPLES // 2
+    assert trace.totals[modules.STAGE_DETECT] == 100 * modules.ROLLING_SAMPLES // 2
+    assert trace.histograms[base + 7] == modules.ROLLING_SAMPLES // 2
+    # the worst isn't halved, and other stages are left alone
+    assert trace.worst[modules.STAGE_DETECT] == 100
+    assert trace.counts[modules.STAGE_SCAN] == 0
+
+def test_ring_buffer_keeps_the_latest(modules, capsys):
+    clock = [ 0 ]
+    trace = traceWith(modules, clock, size = 4)
+    for sample in range(6):
+        clock[0] = sample * 1000
+        trace.record(modules.STAGE_SCAN, sample, sample + 10)
+    assert trace.head == 2
+    assert trace.recorded == 6
+    trace.printRecent()
+    lines = capsys.readouterr().out.splitlines()
+    assert "last 4 measurements" in lines[0]
+    assert [ line.split()[1:] for line in lines[1:] ] == [
+        [ str(key), str(key + 10), str(key * 1000) ] for key in range(2, 6) ]
+
+def test_dump_prints_every_stage(modules, capsys):
+    trace = traceWith(modules, [ 0 ])
+    trace.record(modules.STAGE_SCAN, 0, 3)
+    trace.record(modules.STAGE_SCAN, 1, 5)
+    trace.dump()
+    out = capsys.readouterr().out
+    assert "scan : 2 samples, mean 4 us, worst 5 us" in out
+    assert "< 4 us : 1" in out
+    assert "< 8 us : 1" in out
+    for name in modules.STAGE_NAMES[1:]:
+        assert name + " : nothing recorded" in out
+    assert "last 2 measurements" in out
@@ -0,0 +1,82 @@
+"""
+Tests for lib/ledframe.py with a strip that records the colours it is
+given and how often it is shown.
+
+    pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from constants import *
+from ledframe import *
+
+class Pixels():
+    def __init__(self):
+        self.colours = {}
+        self.writes = 0
+        self.shows = 0
+
+    def __setitem__(self, pixel, colour):
+        self.colours[pixel] = colour
+        self.writes += 1
+
+    def show(self):
+        self.shows += 1
+
+def makeFrame():
+    pixels = Pixels()
+    return pixels, LedFrame(pixels)
+
+def test_nothing_dirty_is_not_shown():
+    pixels, frame = makeFrame()
+    for millis in range(0, 100, 10):
+        frame.commit(millis)
+    assert pixels.shows == 0
+    assert frame.framesPushed == 0
+    assert frame.framesSkipped == 10
+
+def test_unchanged_colour_does_not_dirty_the_frame():
+    pixels, frame = makeFrame()
+    frame.setKeyColour(3, COLOUR_RED)
+    frame.commit(0)
+    frame.setKeyColour(3, COLOUR_RED)
+    assert not frame.dirty
+    frame.commit(10)
+    assert pixels.writes == 1
+    assert pixels.shows == 1
+    assert frame.framesSkipped == 1
+
+def test_one_show_per_pass():
+    pixels, frame = makeFrame()
+    for key in range(BUTTON_COUNT):
+        frame.setKeyColour(key, COLOUR_BLUE)
+    frame.setKeyColour(0, COLOUR_RED)
+    assert pixels.shows == 0
+    frame.commit(0)
+    assert pixels.shows == 1
+    assert pixels.colours[0] == COLOUR_RED
+    assert pixels.colours[BUTTON_COUNT - 1] == COLOUR_BLUE
+    assert frame.framesPushed == 1
+
+# a frame on every 10 ms pass is 100 frames/s, and the frame that opens a
+# second is counted in that second, not the one before
+def test_frames_per_second():
+    pixels, frame = makeFrame()
+    for millis in range(0, 1000, 10):
+        frame.setKeyColour(0, millis)
+        frame.commit(millis)
+    assert frame.framesPerSecond == 0
+    frame.setKeyColour(0, -2)
+    frame.commit(1000)
+    assert frame.framesPerSecond == 100
+    # half as many in the next second, with idle passes in between
+    for millis in range(1010, 2000, 10):
+        if millis % 20 == 0:
+            frame.setKeyColour(0, millis)
+        frame.commit(millis)
+    frame.commit(2000)
+    assert frame.framesPerSecond == 50
+    assert frame.framesPushed == 150
@@ -0,0 +1,73 @@
+"""
+Tests for lib/loopprofiler.py on a monotonic_ns the test moves by hand.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+import loopprofiler
+from loopprofiler import *
+
+PHASES = ("keyconfig", "scan", "dispatch")
+
+class Stats():
+    def printStats(self):
+        print("  ~~> stats")
+
+@pytest.fixture
+def clock(monkeypatch):
+    nanos = [ 0 ]
+    monkeypatch.setattr(loopprofiler.time, "monotonic_ns", lambda: nanos[0])
+    return nanos
+
+# one pass of the main loop starting at `millis`, spending the given
+# microseconds in each phase
+def runPass(profiler, clock, millis, phaseMicros):
+    clock[0] = millis * 1000000
+    profiler.start()
+    for phase, micros in enumerate(phaseMicros):
+        clock[0] += micros * 1000
+        profiler.mark(phase)
+    profiler.end(millis)
+
+def test_summary_per_phase(clock, capsys):
+    profiler = LoopProfiler(PHASES, True)
+    profiler.addStats(Stats())
+    # a pass every 10 ms, one of them slow in the scan
+    for index in range(500):
+        runPass(profiler, clock, index * 10, (100, 12000 if index == 250 else 300, 50))
+    assert profiler.loops == 499
+    assert list(profiler.phaseMicros) == [ 100 * 499, 300 * 498 + 12000, 50 * 499 ]
+    assert list(profiler.phaseWorst) == [ 100, 12000, 50 ]
+    assert profiler.worstMicros == 12150
+    assert profiler.slowLoops == 1
+    assert capsys.readouterr().out == ""
+
+    # the pass at 0 ms only opened the window, so 500 passes in 5 s
+    runPass(profiler, clock, 5000, (100, 300, 50))
+    assert profiler.loopsPerSecond == 100
+    assert capsys.readouterr().out.splitlines() == [
+        "  ~~> loop: 100 loops/s, worst 12150 us, 1 slow | keyconfig 100/100 scan 323/12000 dispatch 50/50 us (mean/worst)",
+        "  ~~> stats",
+    ]
+    # and the next window starts from nothing
+    assert profiler.loops == 0
+    assert profiler.windowStart == 5000
+    assert list(profiler.phaseMicros) == [ 0, 0, 0 ]
+
+def test_disabled_profiler_counts_nothing(clock, capsys):
+    profiler = LoopProfiler(PHASES)
+    for index in range(1000):
+        runPass(profiler, clock, index * 10, (100, 300, 50))
+    assert profiler.loops == 0
+    assert list(profiler.phaseMicros) == [ 0, 0, 0 ]
+    assert capsys.readouterr().out == ""
+    profiler.toggle()
+    assert profiler.enabled
+    assert capsys.readouterr().out == "  ~~> loop profiler on\n"
@@ -0,0 +1,75 @@
+"""
+Compiles macros, saves them to a file and loads them back, and replays
+them on the simulator's keyboard device to check they type the text they
+were compiled from.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+TEXTS = [
+    "terminal",
+    "pkill scrcpy; sleep 0.1 && sh unlockWithSwipe -p 314159 && scrcpy -Sw &",
+    "sh okDialog -c \"sh listElements -a id\"",
+    "AAbb!!  ~Zz",
+]
+
+@pytest.fixture
+def board():
+    hostTime = sys.modules["time"]
+    hardware = sim.install()
+    yield hardware
+    sys.modules["time"] = hostTime
+
+# the text a host reading boot reports in slot order would see
+def typedText(device, layout):
+    characters = {}
+    for index, keycode in enumerate(layout.ASCII_TO_KEYCODE):
+        characters.setdefault((keycode & 0x7F, bool(keycode & 0x80)), chr(index))
+    text = []
+    held = []
+    for millis, report in device.reports:
+        keys = [ keycode for keycode in report[2:] if keycode ]
+        shifted = bool(report[0] & 0x22)
+        for keycode in keys:
+            if keycode not in held:
+                text.append(characters[(keycode, shifted)])
+        held = keys
+    return "".join(text)
+
+@pytest.mark.parametrize("fast", (False, True))
+def test_compile_save_load_replay(board, tmp_path, fast):
+    import usb_hid
+    from adafruit_hid.keyboard import Keyboard
+    from fastlayout import FastKeyboardLayout
+    from macrocompiler import compileMacro, saveMacro, loadMacro, replayMacro, reportCount
+
+    keyboard = Keyboard(usb_hid.devices)
+    layout = FastKeyboardLayout(keyboard)
+    for index, text in enumerate(TEXTS):
+        fileName = str(tmp_path / ("macro%d.bin" % index))
+        saveMacro(fileName, compileMacro(text, layout, fast))
+        stream = loadMacro(fileName)
+        assert stream == compileMacro(text, layout, fast)
+
+        board.keyboard.reports = []
+        assert replayMacro(keyboard, stream) == reportCount(stream)
+        assert len(board.keyboard.reports) == reportCount(stream)
+        assert typedText(board.keyboard, layout) == text
+        # nothing left held
+        assert board.keyboard.reports[-1][1] == bytes(8)
+
+        # fast streams are the very reports a fast write() sends
+        if fast:
+            board.keyboard.reports = []
+            layout.write(text, fast)
+            written = [ report for millis, report in board.keyboard.reports ]
+            assert written == [ stream[offset:offset + 8] for offset in range(0, len(stream), 8) ]
@@ -0,0 +1,136 @@
+"""
+Tests for lib/macroscheduler.py with a keyboard and layout that only
+record what they are asked to do.
+
+    pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from macroscheduler import *
+
+class Device():
+    def __init__(self, calls):
+        self.calls = calls
+
+    def send_report(self, report, report_id = None):
+        self.calls.append(("report", bytes(report)))
+
+class Keyboard():
+    def __init__(self, keepsKeyOrder = True):
+        self.calls = []
+        self.keepsKeyOrder = keepsKeyOrder
+        self._keyboard_device = Device(self.calls)
+
+    def press(self, *keycodes):
+        self.calls.append(("press", keycodes))
+
+    def release(self, *keycodes):
+        self.calls.append(("release", keycodes))
+
+    def release_all(self):
+        self.calls.append(("release_all",))
+
+    def send(self, *keycodes):
+        self.calls.append(("send", keycodes))
+
+class Layout():
+    def __init__(self):
+        self.written = []
+
+    def write(self, text, fast = False):
+        self.written.append((text, fast))
+
+def makeScheduler(**arguments):
+    keyboard = Keyboard(arguments.pop("keepsKeyOrder", True))
+    layout = Layout()
+    return keyboard, layout, MacroScheduler(keyboard, layout, **arguments)
+
+# report i of the stream is 8 bytes of i
+def makeStream(count):
+    stream = bytearray()
+    for index in range(count):
+        stream.extend(bytes([index]) * REPORT_LENGTH)
+    return bytes(stream)
+
+def test_delays_return_straight_away():
+    keyboard, layout, macros = makeScheduler()
+    macros.send(4).delay(100).send(5)
+    macros.loop(0)
+    assert keyboard.calls == [ ("send", (4,)) ]
+    for millis in range(0, 100):
+        macros.loop(millis)
+        assert keyboard.calls == [ ("send", (4,)) ]
+    assert macros.queueDepth() == 1
+    macros.loop(100)
+    assert keyboard.calls == [ ("send", (4,)), ("send", (5,)) ]
+
+def test_typing_is_spread_over_passes():
+    keyboard, layout, macros = makeScheduler(charsPerLoop = 3)
+    macros.write("abcdefgh").send(6)
+    macros.loop(0)
+    assert layout.written == [ ("abc", False) ]
+    assert macros.queueDepth() == 2
+    macros.loop(1)
+    assert layout.written == [ ("abc", False), ("def", False) ]
+    macros.loop(2)
+    assert [ text for text, fast in layout.written ] == [ "abc", "def", "gh" ]
+    assert keyboard.calls == []
+    macros.loop(3)
+    assert keyboard.calls == [ ("send", (6,)) ]
+
+def test_fast_typing_needs_a_keyboard_that_keeps_key_order():
+    keyboard, layout, macros = makeScheduler(fastType = True)
+    assert macros.fastType
+    macros.write("ab").loop(0)
+    assert layout.written == [ ("ab", True) ]
+
+    keyboard, layout, macros = makeScheduler(fastType = True, keepsKeyOrder = False)
+    assert not macros.fastType
+    macros.write("ab").loop(0)
+    assert layout.written == [ ("ab", False) ]
+
+def test_replay_resumes_where_the_last_pass_stopped():
+    keyboard, layout, macros = makeScheduler(charsPerLoop = 2)
+    stream = makeStream(5)
+    macros.replay(stream)
+    macros.loop(0)
+    assert macros.typeOffset == 2
+    macros.loop(1)
+    assert macros.typeOffset == 4
+    macros.loop(2)
+    assert macros.typeOffset == 0
+    assert macros.isIdle()
+    assert keyboard.calls == [ ("report", stream[index * REPORT_LENGTH:(index + 1) * REPORT_LENGTH]) for index in range(5) ]
+
+def test_queue_resets_once_drained():
+    keyboard, layout, macros = makeScheduler()
+    macros.send(4).delay(50).send(5)
+    for millis in range(0, 60):
+        macros.loop(millis)
+    assert macros.isIdle()
+    assert macros.steps == []
+    assert macros.head == 0
+    assert macros.dueMillis == -1
+    # a step queued long after isn't treated as running late
+    macros.send(6)
+    macros.loop(5000)
+    assert keyboard.calls[-1] == ("send", (6,))
+    assert macros.lastLatency == 0
+
+def test_cancel_drops_the_queue_and_lets_go():
+    keyboard, layout, macros = makeScheduler(charsPerLoop = 2)
+    macros.press(2).replay(makeStream(5)).send(6)
+    macros.loop(0)
+    macros.loop(1)
+    macros.cancel()
+    assert macros.isIdle()
+    assert macros.typeOffset == 0
+    assert keyboard.calls[-1] == ("release_all",)
+    calls = len(keyboard.calls)
+    for millis in range(2, 10):
+        macros.loop(millis)
+    assert len(keyboard.calls) == calls
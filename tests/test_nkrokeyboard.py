@@ -0,0 +1,132 @@
+"""
+Runs the firmware in the simulator with and without the NKRO keyboard and
+checks that the ADB layout's terminal macro (sim/traces/demo.txt, key 1)
+reaches the host as the text it was written as.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sim import simulate
+from sim.trace import KeyTrace
+
+# COMMAND-SPACE, the macro, RETURN and COMMAND-TAB back again. Modifiers
+# other than SHIFT aren't decoded, so the first and last are " " and "\t".
+ADB_TERMINAL = ' terminal\nsh okDialog -c "sh listElements -a id"\n\t'
+
+# swap to ADB and tap its terminal macro key
+def terminalTrace():
+    return KeyTrace().tap("X", 200).tap(1, 1500)
+
+# the characters a host would see from a keyboard device's reports: every
+# key that goes down, shifted if a SHIFT was held in that report
+def typedText(device):
+    from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
+    characters = {}
+    for index, keycode in enumerate(KeyboardLayoutUS.ASCII_TO_KEYCODE):
+        characters.setdefault((keycode & 0x7F, bool(keycode & 0x80)), chr(index))
+    text = []
+    held = []
+    for millis, report in device.reports:
+        if len(report) == 8:
+            # the host reads a boot report's keys in slot order
+            keys = [ keycode for keycode in report[2:] if keycode ]
+        else:
+            keys = [ keycode for keycode in range(128) if report[1 + (keycode >> 3)] & (1 << (keycode & 7)) ]
+        pressed = [ keycode for keycode in keys if keycode not in held ]
+        # a bitmap has no order, so more than one new key is ambiguous
+        assert len(report) == 8 or len(pressed) <= 1, "keys pressed together: " + str(pressed)
+        shifted = bool(report[0] & 0x22)
+        for keycode in pressed:
+            text.append(characters.get((keycode, shifted), "?"))
+        held = keys
+    return "".join(text)
+
+def keyboards(hardware):
+    return [ device for device in hardware.hidDevices if device.usage_page == 0x01 and device.usage == 0x06 ]
+
+# runs code.py with some of lib/constants.py changed. The modules that take
+# constants as default arguments are imported again, as boot.py has
+# already imported nkrokeyboard with the defaults bound.
+def simulateWith(tmp_path, **constants):
+    script = tmp_path / "code_with_constants.py"
+    lines = [ "import sys, constants" ]
+    lines += [ "constants.%s = %r" % (name, value) for name, value in constants.items() ]
+    lines += [ "for name in ('nkrokeyboard', 'macrocompiler', 'macroscheduler'):",
+               "    sys.modules.pop(name, None)",
+               "exec(compile(open('code.py').read(), 'code.py', 'exec'))" ]
+    script.write_text("\n".join(lines) + "\n")
+    return simulate(terminalTrace(), 12000, script = str(script))
+
+# with MACRO_FAST_TYPE the compiled macro has several keys a boot report,
+# which the NKRO keyboard has to send one at a time
+@pytest.mark.parametrize("fastType", (False, True))
+def test_nkro_types_macros_in_order(tmp_path, fastType):
+    hardware, firmware = simulateWith(tmp_path, MACRO_FAST_TYPE = fastType)
+    assert type(firmware["kbd"]).__name__ == "NkroKeyboard"
+    nkro = [ device for device in keyboards(hardware) if device is not hardware.keyboard ]
+    assert len(nkro) == 1
+    assert typedText(nkro[0]) == ADB_TERMINAL
+    assert not hardware.keyboard.reports
+
+@pytest.mark.parametrize("fastType", (False, True))
+def test_boot_keyboard_without_nkro(tmp_path, fastType):
+    hardware, firmware = simulateWith(tmp_path, USE_NKRO = False, MACRO_FAST_TYPE = fastType)
+    assert type(firmware["kbd"]).__name__ == "Keyboard"
+    assert typedText(hardware.keyboard) == ADB_TERMINAL
+    for device in keyboards(hardware):
+        if device is not hardware.keyboard:
+            assert not device.reports
+
+# CircuitPython raises NotImplementedError for `int in bytearray`
+class BoardBytearray(bytearray):
+    def __contains__(self, value):
+        raise NotImplementedError("only bytes are supported")
+
+class Device():
+    usage_page = 0x01
+    usage = 0x06
+
+    def __init__(self):
+        self.reports = []
+
+    def send_report(self, report, report_id = None):
+        self.reports.append(bytes(report))
+
+# compiled boot reports go through sendBootReport without any `in` on its
+# bytearrays, and give the same reports as before
+def test_boot_reports_without_int_in_bytearray():
+    import sim
+    hostTime = sys.modules["time"]
+    sim.install()
+    try:
+        from nkrokeyboard import NkroKeyboard
+        from fastlayout import FastKeyboardLayout
+        from macrocompiler import compileMacro, replayMacro
+        stream = compileMacro("aab ABBA abc", FastKeyboardLayout(None), True)
+        sent = []
+        for keysType in (bytearray, BoardBytearray):
+            device = Device()
+            keyboard = NkroKeyboard(device)
+            keyboard.bootKeys = keysType(6)
+            replayMacro(keyboard, stream)
+            sent.append(device.reports)
+        assert sent[0] == sent[1]
+        assert len(sent[1]) > 1
+    finally:
+        sys.modules["time"] = hostTime
+
+# boot.py offers the boot keyboard as the boot device, and a host that asks
+# for the boot protocol gets the macro typed on it rather than on NKRO
+def test_boot_protocol_host_gets_the_boot_keyboard():
+    hardware, firmware = simulate(terminalTrace(), 12000, hostBootProtocol = 1)
+    assert hardware.bootDeviceOffered == 1
+    assert hardware.hidDevices[0] is hardware.keyboard
+    assert type(firmware["kbd"]).__name__ == "Keyboard"
+    assert typedText(hardware.keyboard) == ADB_TERMINAL
@@ -0,0 +1,56 @@
+"""
+Tests for lib/rgbled.py on the simulator's PWM outputs, which count the
+writes to their duty cycles.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+@pytest.fixture
+def board():
+    hostTime = sys.modules["time"]
+    hardware = sim.install()
+    yield hardware
+    sys.modules["time"] = hostTime
+
+# the LED is common anode, so the time it is lit is what the duty cycle
+# leaves over
+def onTimes():
+    from rgbled import DUTY_CYCLES, COLOUR_MAX
+    return [ COLOUR_MAX - duty for duty in DUTY_CYCLES ]
+
+def test_duty_cycle_endpoints(board):
+    from rgbled import DUTY_CYCLES
+    assert len(DUTY_CYCLES) == 256
+    onTime = onTimes()
+    assert onTime[0] == 0
+    assert onTime[255] == 65535
+    assert DUTY_CYCLES[0] == 65535
+    assert DUTY_CYCLES[255] == 0
+
+def test_brighter_levels_are_never_dimmer(board):
+    onTime = onTimes()
+    for level in range(1, 256):
+        assert onTime[level] >= onTime[level - 1], "level " + str(level)
+
+def test_unchanged_colour_is_not_written_again(board):
+    from rgbled import RgbLed, DUTY_CYCLES
+    led = RgbLed()
+    red, green, blue = board.pwms[-3:]
+    led.setColour(0xFF8000)
+    assert [ red.duty_cycle, green.duty_cycle, blue.duty_cycle ] == [ DUTY_CYCLES[255], DUTY_CYCLES[128], DUTY_CYCLES[0] ]
+    # blue was off already
+    assert [ red.writes, green.writes, blue.writes ] == [ 1, 1, 0 ]
+    led.setColour(0xFF8000)
+    led.setColour(255, 128, 0)
+    assert [ red.writes, green.writes, blue.writes ] == [ 1, 1, 0 ]
+    led.setColour(0xFF8040)
+    assert [ red.writes, green.writes, blue.writes ] == [ 1, 1, 1 ]
@@ -0,0 +1,92 @@
+"""
+Tests for lib/rotaryencoder.py, turning the knob by setting the A and B
+pins of the simulator's board.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+# (A << 1) | B for each transition of one detent, ending back at rest
+CW_DETENT = (1, 0, 2, 3)
+CCW_DETENT = (2, 0, 1, 3)
+
+@pytest.fixture
+def board():
+    hostTime = sys.modules["time"]
+    hardware = sim.install()
+    yield hardware
+    sys.modules["time"] = hostTime
+
+def makeEncoder(board):
+    from rotaryencoder import RotaryEncoder
+    board.pinLevels["GP12"] = True
+    board.pinLevels["GP10"] = True
+    return RotaryEncoder()
+
+# sets the pins to each state in turn, `stepMillis` apart, and returns what
+# each update gave
+def turn(board, encoder, states, startMillis = 1000, stepMillis = 1):
+    results = []
+    for index, state in enumerate(states):
+        board.pinLevels["GP12"] = bool(state & 2)
+        board.pinLevels["GP10"] = bool(state & 1)
+        results.append(encoder.update(startMillis + index * stepMillis))
+    return results
+
+def test_starts_at_rest(board):
+    from rotaryencoder import REST_STATE
+    encoder = makeEncoder(board)
+    assert encoder.state == REST_STATE
+    assert encoder.update(0) == 0
+
+@pytest.mark.parametrize("states, direction", [ (CW_DETENT, 1), (CCW_DETENT, -1) ])
+def test_a_detent_counts_once_back_at_rest(board, states, direction):
+    encoder = makeEncoder(board)
+    assert turn(board, encoder, states) == [ 0, 0, 0, direction ]
+    assert encoder.position == direction
+    assert encoder.takeDelta() == direction
+
+@pytest.mark.parametrize("states", [
+    (1, 3, 1, 3, 1, 3),     # contact bounce on A
+    (2, 3, 2, 3),           # and on B
+    (1, 0, 1, 3),           # half a turn and back
+    (1, 0, 2, 0, 1, 3),     # most of a turn and back
+])
+def test_bounces_count_nothing(board, states):
+    encoder = makeEncoder(board)
+    assert turn(board, encoder, states) == [ 0 ] * len(states)
+    assert encoder.position == 0
+    assert encoder.takeDelta() == 0
+
+def test_fast_spin_keeps_every_detent(board):
+    encoder = makeEncoder(board)
+    turn(board, encoder, CW_DETENT * 50)
+    assert encoder.position == 50
+    # both pins changing between reads counts nothing, the detent still does
+    assert turn(board, encoder, (1, 2, 3), 2000) == [ 0, 0, 1 ]
+    assert encoder.position == 51
+    turn(board, encoder, CCW_DETENT * 20, 3000)
+    assert encoder.position == 31
+
+@pytest.mark.parametrize("detentMillis, steps", [ (100, 1), (45, 2), (20, 4), (10, 8) ])
+def test_acceleration_scales_the_delta(board, detentMillis, steps):
+    encoder = makeEncoder(board)
+    # the first detent comes after a pause, so is worth one step
+    turn(board, encoder, CW_DETENT, 1000, detentMillis // 4)
+    assert encoder.takeDelta() == 1
+    start = 1000 + 3 * (detentMillis // 4)
+    for detent in range(1, 6):
+        turn(board, encoder, CW_DETENT, start + detent * detentMillis - 3, 1)
+    assert encoder.takeDelta() == 5 * steps
+    assert encoder.velocity == 1000 // detentMillis
+    assert encoder.takeDelta() == 0
+    turn(board, encoder, CCW_DETENT, start + 6 * detentMillis - 3, 1)
+    assert encoder.takeDelta() == -steps
@@ -0,0 +1,118 @@
+"""
+Tests for the frame parsing in lib/serialprotocol.py, and for
+host/keypadclient.py against a port that hands back canned bytes.
+
+    pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+sys.path.insert(0, os.path.join(ROOT, "host"))
+
+from serialprotocol import *
+from keypadclient import KeypadClient, KeypadError
+
+# feeds `data` a byte at a time and returns the (command, payload) frames found
+def parse(data, parser = None, currentTime = 0):
+    parser = parser if parser is not None else FrameParser()
+    frames = []
+    for byte in data:
+        found = parser.feed(byte, currentTime)
+        while found:
+            frames.append((parser.command, bytes(parser.payloadView())))
+            found = parser.next(currentTime)
+    return frames
+
+def test_frames_round_trip():
+    data = encodeFrame(CMD_PING) + encodeFrame(CMD_PUSH_MACRO, b"hello") + encodeFrame(CMD_SET_COLOURS, bytes(range(255)))
+    assert parse(data) == [ (CMD_PING, b""), (CMD_PUSH_MACRO, b"hello"), (CMD_SET_COLOURS, bytes(range(255))) ]
+
+def test_noise_between_frames_is_skipped():
+    parser = FrameParser()
+    data = b"\x00\x13" + encodeFrame(CMD_PING) + b"\xff\x42" + encodeFrame(CMD_SELECT_LAYOUT, b"\x01")
+    assert parse(data, parser) == [ (CMD_PING, b""), (CMD_SELECT_LAYOUT, b"\x01") ]
+    assert parser.badFrames == 0
+
+# a stray SYNC claims the real frame's first bytes as its command and
+# length. With a short length its CRC fails straight away, with a long one
+# it times out, and either way the real frame after it is found.
+def test_false_sync_before_a_frame():
+    parser = FrameParser()
+    frame = encodeFrame(CMD_PING)
+    assert parse(bytes((SYNC,)) + frame, parser) == [ (CMD_PING, b"") ]
+    assert parser.badFrames == 1
+
+    parser = FrameParser()
+    frame = encodeFrame(CMD_PUSH_MACRO, b"abc")
+    assert parse(bytes((SYNC,)) + frame, parser, 0) == []
+    assert not parser.next(FRAME_TIMEOUT_MILLIS)
+    assert parser.next(FRAME_TIMEOUT_MILLIS + 1)
+    assert (parser.command, bytes(parser.payloadView())) == (CMD_PUSH_MACRO, b"abc")
+    assert not parser.next(FRAME_TIMEOUT_MILLIS + 1)
+
+# the stray SYNC's length covers the whole of the real frame and more
+def test_frame_inside_a_false_frame():
+    parser = FrameParser()
+    frames = encodeFrame(CMD_PING) + encodeFrame(CMD_SELECT_LAYOUT, b"\x02")
+    data = bytes((SYNC, CMD_PUSH_MACRO, 20)) + frames + bytes(12) + encodeFrame(CMD_QUERY_STATS)
+    assert parse(data, parser) == [ (CMD_PING, b""), (CMD_SELECT_LAYOUT, b"\x02"), (CMD_QUERY_STATS, b"") ]
+
+def test_corrupt_frame_is_dropped():
+    parser = FrameParser()
+    bad = bytearray(encodeFrame(CMD_PUSH_MACRO, b"hello"))
+    bad[4] ^= 0x01
+    assert parse(bytes(bad) + encodeFrame(CMD_PING), parser) == [ (CMD_PING, b"") ]
+    assert parser.badFrames >= 1
+
+def test_stalled_frame_is_dropped():
+    parser = FrameParser()
+    frame = encodeFrame(CMD_PUSH_MACRO, b"hello")
+    assert parse(frame[:4], parser, 0) == []
+    assert parse(frame[4:] + encodeFrame(CMD_PING), parser, FRAME_TIMEOUT_MILLIS + 1) == [ (CMD_PING, b"") ]
+    assert parser.badFrames == 1
+
+def test_long_streams_keep_parsing():
+    parser = FrameParser()
+    frame = encodeFrame(CMD_SET_COLOURS, bytes(range(200)))
+    noisy = (bytes((SYNC, 0x10)) + frame) * 10
+    assert parse(noisy, parser) == [ (CMD_SET_COLOURS, bytes(range(200))) ] * 10
+
+#--- CLIENT ---
+# hands back what it was loaded with, `chunk` bytes a read
+class Port():
+    def __init__(self, data, chunk = MAX_PAYLOAD):
+        self.data = data
+        self.chunk = chunk
+        self.written = b""
+
+    def write(self, data):
+        self.written += data
+
+    def read(self, size):
+        data = self.data[:min(size, self.chunk)]
+        self.data = self.data[len(data):]
+        return data
+
+def test_client_keeps_bytes_after_a_reply():
+    stats = packStats(1, 0, 900, 10, 20, 0)
+    port = Port(encodeFrame(RSP_ACK, bytes((CMD_PING,))) + encodeFrame(RSP_STATS, stats))
+    client = KeypadClient(port, timeout = 0.05)
+    assert client.request(CMD_PING) == (RSP_ACK, bytes((CMD_PING,)))
+    # both replies came in one read
+    assert port.data == b""
+    assert client.stats()["loopsPerSecond"] == 900
+    with pytest.raises(KeypadError, match = "No reply"):
+        client.ping()
+
+def test_client_finds_a_reply_after_a_false_sync():
+    port = Port(bytes((SYNC,)) + encodeFrame(RSP_NAK, bytes((CMD_SELECT_LAYOUT,)) + b"No layout 9"), chunk = 3)
+    # the false SYNC's length is RSP_NAK, so the reply is only found once
+    # that frame times out
+    client = KeypadClient(port, timeout = 1.0)
+    with pytest.raises(KeypadError, match = "No layout 9"):
+        client.selectLayout(9)
+#----------------
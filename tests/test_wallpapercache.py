@@ -0,0 +1,67 @@
+"""
+Tests for lib/wallpapercache.py, with wallpapers that take a set number
+of bytes of a pretend heap to build.
+
+    pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+
+from constants import *
+from wallpapercache import *
+
+# gc.mem_free() only exists on the board, so the cache is given a heap
+# that each wallpaper takes its size out of
+class Heap():
+    def __init__(self):
+        self.free = 10 * WALLPAPER_CACHE_BYTES
+        self.builds = []
+
+    def factory(self, index, size):
+        def build():
+            self.free -= size
+            self.builds.append(index)
+            return "wallpaper " + str(index)
+        return build
+
+def makeCache(sizes):
+    heap = Heap()
+    cache = WallpaperCache([ heap.factory(index, size) for index, size in enumerate(sizes) ])
+    cache.memFree = lambda: heap.free
+    return heap, cache
+
+def test_shown_wallpapers_are_kept():
+    heap, cache = makeCache([ 1000, 2000, 3000 ])
+    for index in (0, 1, 2, 0, 1, 2):
+        assert cache.get(index) == "wallpaper " + str(index)
+    assert heap.builds == [ 0, 1, 2 ]
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 3, 0)
+    assert cache.cachedBytes() == 6000
+
+def test_least_recently_shown_is_dropped_over_budget():
+    third = WALLPAPER_CACHE_BYTES // 3 + 1
+    heap, cache = makeCache([ third, third, third ])
+    cache.get(0)
+    cache.get(1)
+    # 0 was shown after 1, so 1 goes when 2 doesn't fit
+    cache.get(0)
+    cache.get(2)
+    assert cache.evictions == 1
+    assert cache.groups[1] is None
+    assert cache.cachedBytes() <= WALLPAPER_CACHE_BYTES
+    cache.get(0)
+    cache.get(2)
+    cache.get(1)
+    assert heap.builds == [ 0, 1, 2, 1 ]
+    assert cache.groups[0] is None
+    assert cache.cachedBytes() <= WALLPAPER_CACHE_BYTES
+
+def test_a_wallpaper_over_budget_on_its_own_is_still_shown():
+    heap, cache = makeCache([ 1000, WALLPAPER_CACHE_BYTES + 1 ])
+    cache.get(0)
+    assert cache.get(1) == "wallpaper 1"
+    assert cache.groups[0] is None
+    assert cache.groups[1] is not None